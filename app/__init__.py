@@ -1,15 +1,4 @@
 from .routes import create_app
-# from .middleware.jwtTokenValidator import JwtTokenValidatorMiddleware
 
-app = create_app()
-# app.wsgi_app = JwtTokenValidatorMiddleware(app.wsgi_app)
-#
-#
-# @app.before_request
-# def load_user_from_environ():
-#     from flask import g, request
-#     g.user_payload = request.environ.get('user_payload')
-
-
-if __name__ == "__main__":
-    app.run(debug=True)
+# The app is built by the entry point (wsgi.py, or `flask --app app run`),
+# never as a side effect of importing the package
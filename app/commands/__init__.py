@@ -0,0 +1 @@
+from .onboardSigners_command import onboard_signers_command
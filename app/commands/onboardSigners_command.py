@@ -0,0 +1,51 @@
+import click
+
+
+@click.command("onboard-signers")
+@click.argument("signers_file", type=click.Path(exists=True, dir_okay=False))
+@click.option("--workers", type=int, default=None,
+              help="Processes generating keys and certificates.  [default: ONBOARDING_WORKERS]")
+@click.option("--vault-concurrency", type=int, default=None,
+              help="Concurrent Vault writers.  [default: ONBOARDING_VAULT_CONCURRENCY]")
+def onboard_signers_command(signers_file, workers, vault_concurrency):
+    """Provision certificates for every signer in a CSV (name,email) or JSON file.
+
+    Signers that already have certificates in Vault are skipped, so an
+    interrupted run can be resumed by running it again.
+    """
+    # Imported here so registering the command does not load the signing stack
+    from ..services.bulkOnboarding_service import (
+        BulkOnboardingJob,
+        parse_signers,
+        ONBOARDING_WORKERS,
+        ONBOARDING_VAULT_CONCURRENCY
+    )
+    workers = workers or ONBOARDING_WORKERS
+    vault_concurrency = vault_concurrency or ONBOARDING_VAULT_CONCURRENCY
+
+    fmt = "json" if signers_file.lower().endswith(".json") else "csv"
+    with open(signers_file, "rb") as f:
+        signers = parse_signers(f.read(), fmt)
+
+    def progress(summary):
+        click.echo(
+            f"\r{summary['done']}/{summary['total']} "
+            f"created={summary['created']} skipped={summary['skipped']} failed={summary['failed']} "
+            f"({summary['signers_per_s']}/s)",
+            nl=False
+        )
+
+    job = BulkOnboardingJob(signers, workers=workers, vault_concurrency=vault_concurrency, progress=progress)
+    summary = job.run()
+    click.echo()
+    for result in job.results.values():
+        if result["status"] == "failed":
+            click.echo(f"FAILED {result['email']}: {result['message']}", err=True)
+    click.echo(f"Done in {summary['elapsed_s']}s: {summary['created']} created, "
+               f"{summary['skipped']} skipped, {summary['failed']} failed")
+    if summary["failed"]:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    onboard_signers_command()
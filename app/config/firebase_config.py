@@ -1,11 +1,30 @@
 # firebase_config.py
-import firebase_admin
-from firebase_admin import credentials, storage
-
-# Avoid re-initializing Firebase if already initialized
-if not firebase_admin._apps:
-    cred = credentials.Certificate("E:/Learning/testing_project_2/digitaly-sign-validate-service/app/config"
-                                   "/uvaexplore-firebase-adminsdk-fbsvc-9f8bd15cf5.json")
-    firebase_admin.initialize_app(cred, {
-        "storageBucket": "uvaexplore.firebasestorage.app"
-    })
+import os
+import threading
+
+FIREBASE_CREDENTIALS = os.getenv(
+    "FIREBASE_CREDENTIALS",
+    os.path.join(os.path.dirname(__file__), "uvaexplore-firebase-adminsdk-fbsvc-9f8bd15cf5.json")
+)
+FIREBASE_STORAGE_BUCKET = os.getenv("FIREBASE_STORAGE_BUCKET", "uvaexplore.firebasestorage.app")
+
+_init_lock = threading.Lock()
+
+
+def get_firebase_app():
+    """Initialize Firebase on first use instead of at import time."""
+    import firebase_admin
+    from firebase_admin import credentials
+
+    with _init_lock:
+        # Avoid re-initializing Firebase if already initialized
+        if not firebase_admin._apps:
+            firebase_admin.initialize_app(credentials.Certificate(FIREBASE_CREDENTIALS), {
+                "storageBucket": FIREBASE_STORAGE_BUCKET
+            })
+    return firebase_admin.get_app()
+
+
+def get_storage_bucket():
+    from firebase_admin import storage
+    return storage.bucket(app=get_firebase_app())
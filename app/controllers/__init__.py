@@ -1,4 +1,13 @@
-from .keyManage_controller import *
-from .documentSign_controller import *
-from .documentValidate_controller import *
-from .documentHandle_controller import *
+from ..utils.lazyModule import lazy_exports
+
+# Submodules are imported on first attribute access instead of all at once,
+# so importing one controller does not load the whole signing stack.
+# Code inside the app imports from the submodule directly.
+__getattr__ = lazy_exports(__name__, {
+    "keyManage_controller": ("generateKeys", "bulkGenerateKeys", "bulkOnboardingStatus"),
+    "documentSign_controller": ("signDocument", "signJobStatus", "signDocumentBatch", "presignDocument",
+                                "completeSignDocument"),
+    "documentValidate_controller": ("is_verbose", "documentVarify", "documentVarifyBatch"),
+    "documentHandle_controller": ("documentUpload",),
+    "health_controller": ("healthCheck", "readinessCheck", "metricsExport"),
+})
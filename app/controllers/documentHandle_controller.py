@@ -1,5 +1,7 @@
 from flask import Flask, request, jsonify
+from werkzeug.utils import secure_filename
 import os
+import uuid
 
 
 def documentUpload():
@@ -11,7 +13,9 @@ def documentUpload():
     if file.filename == '':
         return jsonify({"error": "No selected file"}), 400
 
-    file_path = os.path.join("uploads", file.filename)
+    # Prefix a unique id so concurrent uploads with the same name never overwrite each other
+    os.makedirs("uploads", exist_ok=True)
+    file_path = os.path.join("uploads", f"{uuid.uuid4().hex}_{secure_filename(file.filename)}")
     file.save(file_path)
 
     return jsonify({"message": f"PDF received and saved to {file_path}"}), 200
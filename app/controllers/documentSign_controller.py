@@ -1,7 +1,41 @@
+import os
+import json
+import time
+import base64
+import zipfile
 from flask import jsonify, request, send_file
 from io import BytesIO
-from ..utils import getTokenData
-from ..services.pdfDigitallySign_service import PDFDigitallySigner
+from werkzeug.utils import secure_filename
+from ..utils.getDetailsFromValidateToken import getTokenData
+from ..utils.workspace import RequestWorkspace
+from ..utils.fileUtills import new_pdf_buffer
+from ..utils.processPool import (
+    CPU_POOL_ENABLED,
+    CPU_POOL_WORKERS,
+    PoolQueueTimeout,
+    run_in_process_pool
+)
+from ..services.pdfDigitallySign_service import PDFDigitallySigner, sign_pdf_batch, sign_document_in_worker
+from ..services.signJobQueue_service import get_sign_job_queue
+from ..services.deferredSign_service import (
+    DeferredSigningError,
+    SessionNotFound,
+    presign_documents,
+    complete_deferred_signing,
+    decode_cms
+)
+
+SIGN_BATCH_MAX_ITEMS = int(os.getenv("SIGN_BATCH_MAX_ITEMS", "500"))
+# Seconds a batch may spend signing; keep it under GUNICORN_TIMEOUT
+SIGN_BATCH_DEADLINE = float(os.getenv("SIGN_BATCH_DEADLINE", "120"))
+# base64 JSON is built in memory, so larger batches must use the zip format
+SIGN_BATCH_JSON_MAX_BYTES = int(os.getenv("SIGN_BATCH_JSON_MAX_BYTES", str(32 * 1024 * 1024)))
+
+
+def _non_http_sources(sources):
+    """Sources that are not http(s) URLs; only the single-document sign reads server-local paths."""
+    return [source for source in sources
+            if not isinstance(source, str) or not source.startswith(("http://", "https://"))]
 
 
 def signDocument():
@@ -17,17 +51,26 @@ def signDocument():
         print("error: pdf_url required")
         return jsonify({"error": "pdf_url required"}), 400
 
+    if request.args.get("async", "").lower() in ("1", "true", "yes"):
+        if _non_http_sources([input_pdf_url]):
+            return jsonify({"error": "pdf_url must be an http(s) URL"}), 400
+        return _enqueue_sign_job(signer_email, input_pdf_url)
+    if CPU_POOL_ENABLED:
+        return _sign_in_process_pool(signer_email, input_pdf_url)
+
+    signer = None
+    workspace = RequestWorkspace("sign")
     try:
         signer = PDFDigitallySigner(
             input_pdf_url=input_pdf_url,
             signer_email=signer_email,
-            stamp_image_path="static/imgs/stamp.png"
+            workspace=workspace
         )
 
         # Run conversion first
         conversion_result = signer.convert_to_standard_pdf()
         if conversion_result["type"] == "error":
-            return jsonify({"error": conversion_result["message"]}), 400
+            return jsonify({"error": conversion_result["message"]}), conversion_result.get("code", 400)
 
         # Run signing — this returns either Flask response with PDF or error dict
         sign_response = signer.sign_pdf()
@@ -40,3 +83,265 @@ def signDocument():
     except Exception as e:
         print("error:", str(e))
         return jsonify({"error": str(e)}), 500
+
+    finally:
+        if signer is not None:
+            signer.close()
+        workspace.cleanup()
+
+
+def _sign_in_process_pool(signer_email, input_pdf_url):
+    try:
+        # Provision missing certificates here, where the request context is available
+        credentials, error = PDFDigitallySigner(
+            input_pdf_url=input_pdf_url,
+            signer_email=signer_email
+        ).load_credentials()
+        if error:
+            return jsonify({"error": error["message"]}), 500
+
+        # The worker signs with exactly these keys, whatever its own cache holds
+        outcome, _ = run_in_process_pool(
+            "cpu", sign_document_in_worker, input_pdf_url, signer_email, credentials.pem_secrets(),
+            max_workers=CPU_POOL_WORKERS
+        )
+    except PoolQueueTimeout as e:
+        return jsonify({"error": str(e)}), 503
+    except Exception as e:
+        print("error:", str(e))
+        return jsonify({"error": str(e)}), 500
+
+    if outcome["status"] == "error":
+        code = outcome["code"] or (400 if outcome["failed_stage"] == "convert" else 500)
+        return jsonify({"error": outcome["message"]}), code
+
+    response = send_file(
+        BytesIO(outcome["signed_pdf"]),
+        mimetype='application/pdf',
+        as_attachment=True,
+        download_name='signed_document.pdf'
+    )
+    response.headers.update(outcome["headers"])
+    return response
+
+
+def _enqueue_sign_job(signer_email, input_pdf_url):
+    try:
+        # Provision missing certificates now, while the request context is available
+        _, error = PDFDigitallySigner(
+            input_pdf_url=input_pdf_url,
+            signer_email=signer_email
+        ).load_credentials()
+        if error:
+            return jsonify({"error": error["message"]}), 500
+
+        job_id = get_sign_job_queue().submit(signer_email, input_pdf_url)
+        return jsonify({"job_id": job_id, "status": "pending", "status_url": f"/api/pdf/jobs/{job_id}"}), 202
+
+    except Exception as e:
+        print("error:", str(e))
+        return jsonify({"error": str(e)}), 500
+
+
+def signJobStatus(job_id):
+    payload = getTokenData()
+    if not payload or not payload.get('status'):
+        print("error: Invalid token")
+        return jsonify({"error": "Invalid token"}), 401
+
+    job = get_sign_job_queue().get(job_id)
+    # Jobs of other signers are reported as missing rather than forbidden
+    if job is None or job["signer_email"] != payload["signer_email"]:
+        return jsonify({"error": "Job not found"}), 404
+
+    if job["status"] == "done":
+        return send_file(
+            BytesIO(job["result"]),
+            mimetype="application/pdf",
+            as_attachment=True,
+            download_name="signed_document.pdf"
+        )
+
+    return jsonify({"job_id": job_id, "status": job["status"], "attempts": job["attempts"], "error": job["error"]}), 200
+
+
+def _batch_zip_response(results, labels):
+    # Spills to disk past PDF_SPOOL_THRESHOLD, so a large batch is never held in memory
+    archive = new_pdf_buffer()
+    manifest = []
+    # PDFs barely compress, so store them and keep the zip step cheap
+    with zipfile.ZipFile(archive, "w", compression=zipfile.ZIP_STORED) as zf:
+        for item, label in zip(results, labels):
+            entry = {k: v for k, v in item.items() if k != "signed_path"}
+            entry["source"] = label
+            if item["signed_path"] is not None:
+                entry["file"] = f"{item['index']:04d}_signed_document.pdf"
+                zf.write(item["signed_path"], entry["file"])
+            manifest.append(entry)
+        zf.writestr("manifest.json", json.dumps(manifest, indent=2))
+    archive.seek(0)
+    return send_file(
+        archive,
+        mimetype="application/zip",
+        as_attachment=True,
+        download_name="signed_documents.zip"
+    )
+
+
+def _batch_json_response(results, labels):
+    signed_bytes = sum(os.path.getsize(item["signed_path"]) for item in results if item["signed_path"])
+    if signed_bytes > SIGN_BATCH_JSON_MAX_BYTES:
+        return jsonify({"error": f"Signed documents exceed {SIGN_BATCH_JSON_MAX_BYTES} bytes; "
+                                 f"request format=zip instead"}), 413
+    items = []
+    for item, label in zip(results, labels):
+        entry = {k: v for k, v in item.items() if k != "signed_path"}
+        entry["source"] = label
+        if item["signed_path"] is not None:
+            with open(item["signed_path"], "rb") as f:
+                entry["signed_pdf"] = base64.b64encode(f.read()).decode("ascii")
+        items.append(entry)
+    succeeded = sum(1 for item in results if item["status"] == "success")
+    return jsonify({"total": len(results), "succeeded": succeeded,
+                    "failed": len(results) - succeeded, "items": items}), 200
+
+
+def signDocumentBatch():
+    payload = getTokenData()
+    if not payload or not payload.get('status'):
+        print("error: Invalid token")
+        return jsonify({"error": "Invalid token"}), 401
+
+    signer_email = payload["signer_email"]
+    workspace = RequestWorkspace("batch")
+    try:
+        # Either a multipart bundle of PDFs or a JSON list of URLs
+        uploads = request.files.getlist("pdfFiles")
+        if uploads:
+            if len(uploads) > SIGN_BATCH_MAX_ITEMS:
+                return jsonify({"error": f"At most {SIGN_BATCH_MAX_ITEMS} documents per batch"}), 400
+            labels, sources = [], []
+            for index, file in enumerate(uploads):
+                path = workspace.file_path(f"{index:04d}_{secure_filename(file.filename) or 'document.pdf'}")
+                file.save(path)
+                labels.append(file.filename)
+                sources.append(path)
+        else:
+            data = request.get_json(silent=True) or {}
+            sources = data.get("pdf_urls") or data.get("pdfUrls")
+            if not isinstance(sources, list) or not sources:
+                print("error: pdf_urls required")
+                return jsonify({"error": "pdf_urls (list) or pdfFiles required"}), 400
+            if len(sources) > SIGN_BATCH_MAX_ITEMS:
+                return jsonify({"error": f"At most {SIGN_BATCH_MAX_ITEMS} documents per batch"}), 400
+            if _non_http_sources(sources):
+                return jsonify({"error": "pdf_urls must be http(s) URLs"}), 400
+            labels = sources
+
+        # Load (or provision) the signer credentials once for the whole batch
+        credentials, error = PDFDigitallySigner(
+            input_pdf_url="",
+            signer_email=signer_email
+        ).load_credentials()
+        if error:
+            return jsonify({"error": error["message"]}), 500
+
+        results = sign_pdf_batch(
+            sources,
+            signer_email=signer_email,
+            credentials=credentials,
+            workspace=workspace,
+            deadline=time.monotonic() + SIGN_BATCH_DEADLINE
+        )
+
+        if not any(item["status"] == "success" for item in results):
+            response, _ = _batch_json_response(results, labels)
+            return response, 422
+        if request.args.get("format", "zip").lower() == "json":
+            return _batch_json_response(results, labels)
+        return _batch_zip_response(results, labels)
+
+    except Exception as e:
+        print("error:", str(e))
+        return jsonify({"error": str(e)}), 500
+
+    finally:
+        workspace.cleanup()
+
+
+def presignDocument():
+    payload = getTokenData()
+    if not payload or not payload.get('status'):
+        print("error: Invalid token")
+        return jsonify({"error": "Invalid token"}), 401
+
+    signer_email = payload["signer_email"]
+    data = request.get_json(silent=True) or {}
+    sources = data.get("pdf_urls") or data.get("pdfUrls")
+    single = data.get("pdf_url") or data.get("pdfUrl")
+    if single and not sources:
+        sources = [single]
+    if not isinstance(sources, list) or not sources:
+        print("error: pdf_url required")
+        return jsonify({"error": "pdf_url or pdf_urls (list) required"}), 400
+    if len(sources) > SIGN_BATCH_MAX_ITEMS:
+        return jsonify({"error": f"At most {SIGN_BATCH_MAX_ITEMS} documents per batch"}), 400
+    if _non_http_sources(sources):
+        return jsonify({"error": "pdf_url and pdf_urls must be http(s) URLs"}), 400
+
+    workspace = RequestWorkspace("presign")
+    try:
+        # Certificates are needed to size the signature and build the stamp; the key is not used
+        credentials, error = PDFDigitallySigner(
+            input_pdf_url="",
+            signer_email=signer_email
+        ).load_credentials()
+        if error:
+            return jsonify({"error": error["message"]}), 500
+
+        results = presign_documents(sources, signer_email, credentials, workspace=workspace)
+        if single and len(results) == 1:
+            result = results[0]
+            if result["status"] != "success":
+                return jsonify({"error": result["message"]}), 400
+            return jsonify(result), 200
+        succeeded = sum(1 for item in results if item["status"] == "success")
+        return jsonify({"total": len(results), "succeeded": succeeded,
+                        "failed": len(results) - succeeded, "items": results}), 200 if succeeded else 422
+
+    except Exception as e:
+        print("error:", str(e))
+        return jsonify({"error": str(e)}), 500
+
+    finally:
+        workspace.cleanup()
+
+
+def completeSignDocument():
+    payload = getTokenData()
+    if not payload or not payload.get('status'):
+        print("error: Invalid token")
+        return jsonify({"error": "Invalid token"}), 401
+
+    data = request.get_json(silent=True) or {}
+    session_id = data.get("session_id") or data.get("sessionId")
+    if not session_id:
+        return jsonify({"error": "session_id required"}), 400
+
+    try:
+        signature_cms = decode_cms(data.get("signature_cms") or data.get("signatureCms"))
+        signed = complete_deferred_signing(session_id, payload["signer_email"], signature_cms)
+    except SessionNotFound as e:
+        return jsonify({"error": str(e)}), 404
+    except DeferredSigningError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        print("error:", str(e))
+        return jsonify({"error": str(e)}), 500
+
+    return send_file(
+        BytesIO(signed),
+        mimetype="application/pdf",
+        as_attachment=True,
+        download_name="signed_document.pdf"
+    )
@@ -1,59 +1,22 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 from flask import jsonify, request
-from ..services.pdfValidate_service import PDFVerifier
-from ..dto.PDFSignatureInfo import PDFSignatureInfo  # import your DTO
-
-
-def parse_validation_result(res_text: str) -> PDFSignatureInfo:
-    """Parse PyHanko's validation output into PDFSignatureInfo DTO."""
-    info = PDFSignatureInfo()
-
-    # Signer details
-    if "Certificate subject:" in res_text:
-        subj_line = res_text.split("Certificate subject:")[1].split("\n")[0].strip()
-        if "Email Address:" in subj_line:
-            info.signer_email = subj_line.split("Email Address:")[1].split(",")[0].strip()
-        if "Common Name:" in subj_line:
-            info.signer_common_name = subj_line.split("Common Name:")[1].split(",")[0].strip()
-        if "Organization:" in subj_line:
-            info.signer_organization = subj_line.split("Organization:")[1].split(",")[0].strip()
-
-    # Trust details
-    if "Trust anchor:" in res_text:
-        info.trust_anchor = res_text.split("Trust anchor:")[1].split("\n")[0].strip()
-    if "the signer's certificate is trusted" in res_text.lower():
-        info.is_trusted = True
-
-    # Integrity details
-    if "cryptographically sound" in res_text.lower():
-        info.is_signature_valid = True
-    if "signature mechanism used was" in res_text.lower():
-        info.signature_mechanism = res_text.split("signature mechanism used was")[1] \
-            .split(".")[0].replace("'", "").strip()
-
-    # Signing time
-    if "Signing time as reported by signer:" in res_text:
-        info.signing_time = res_text.split("Signing time as reported by signer:")[1] \
-            .split("\n")[0].strip()
-
-    # File coverage
-    if "covers the entire file" in res_text.lower():
-        info.covers_entire_file = True
-
-    # Bottom line — handle both trusted and untrusted cases
-    if "Bottom line" in res_text:
-        # Trusted case
-        bottom_line_text = res_text.split("Bottom line")[1].strip()
-        if "\n" in bottom_line_text:
-            bottom_line_text = bottom_line_text.split("\n", 1)[1].strip()
-        info.bottom_line = bottom_line_text
-    else:
-        # Untrusted case — search for "The signature is judged"
-        for line in res_text.splitlines():
-            if "The signature is judged" in line:
-                info.bottom_line = line.strip()
-                break
-
-    return info
+from ..services.pdfValidate_service import PDFVerifier, validate_pdf_bytes
+from ..utils.workspace import RequestWorkspace
+from ..utils.metrics import bind_request_timings
+from ..utils.processPool import (
+    CPU_POOL_ENABLED,
+    CPU_POOL_WORKERS,
+    PoolQueueTimeout,
+    run_in_process_pool
+)
+
+VALIDATE_BATCH_MAX_ITEMS = int(os.getenv("VALIDATE_BATCH_MAX_ITEMS", "200"))
+
+
+def is_verbose():
+    return request.args.get("verbose", "").lower() in ("1", "true", "yes")
 
 
 def documentVarify():
@@ -65,11 +28,14 @@ def documentVarify():
         if file.filename.strip() == '':
             return jsonify({"error": "No file selected"}), 400
 
-        verifier = PDFVerifier(signed_pdf_file=file)
-        res_text = verifier.print_signature_status()
-        # Parse into DTO
-        dto = parse_validation_result(res_text)
-        return jsonify({"status": "success", "details": dto.to_dict()}), 200
+        if CPU_POOL_ENABLED:
+            return _validate_in_process_pool(file)
+
+        with RequestWorkspace("validate") as workspace:
+            verifier = PDFVerifier(signed_pdf_file=file, workspace=workspace)
+            signatures = [info.to_dict() for info in verifier.signature_infos(is_verbose())]
+        # "details" keeps the first signature for existing clients
+        return jsonify({"status": "success", "details": signatures[0], "signatures": signatures}), 200
 
     except ValueError as e:
         print("[VALIDATION ERROR]", str(e))
@@ -82,3 +48,63 @@ def documentVarify():
     except Exception as e:
         print("[UNEXPECTED ERROR]", str(e))
         return jsonify({"status": "error", "message": str(e)}), 500
+
+
+def _validate_in_process_pool(file):
+    try:
+        result, _ = run_in_process_pool(
+            "cpu", validate_pdf_bytes, file.read(), file.filename, is_verbose(), max_workers=CPU_POOL_WORKERS
+        )
+    except PoolQueueTimeout as e:
+        return jsonify({"status": "error", "message": str(e)}), 503
+
+    if result["status"] == "failed":
+        print("[VALIDATION ERROR]", result["error"])
+        return jsonify({"status": "failed", "error": result["error"]}), 400
+    if result["status"] == "error":
+        print("[RUNTIME ERROR]", result["error"])
+        return jsonify({"status": "error", "message": result["error"]}), 500
+    signatures = result["signatures"]
+    return jsonify({"status": "success", "details": signatures[0], "signatures": signatures}), 200
+
+
+def documentVarifyBatch():
+    try:
+        files = [file for file in request.files.getlist('pdfFiles') if file.filename.strip()]
+        if not files:
+            return jsonify({"error": "Missing files"}), 400
+        if len(files) > VALIDATE_BATCH_MAX_ITEMS:
+            return jsonify({"error": f"At most {VALIDATE_BATCH_MAX_ITEMS} files per batch"}), 400
+
+        # Validation is CPU-bound: each file goes to the shared "cpu" pool, which
+        # bounds the queue wait and run time like every other pooled request
+        start = time.perf_counter()
+        verbose = is_verbose()
+        uploads = [(file.read(), file.filename) for file in files]
+        with ThreadPoolExecutor(max_workers=max(1, min(len(uploads), CPU_POOL_WORKERS))) as pool:
+            results = list(pool.map(bind_request_timings(lambda upload: _validate_one(upload, verbose)), uploads))
+
+        return jsonify({
+            "status": "success",
+            "total": len(results),
+            "valid": sum(1 for item in results if item["status"] == "success"),
+            "elapsed_ms": round((time.perf_counter() - start) * 1000, 2),
+            "results": results
+        }), 200
+
+    except Exception as e:
+        print("[UNEXPECTED ERROR]", str(e))
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
+def _validate_one(upload, verbose):
+    pdf_bytes, filename = upload
+    if not CPU_POOL_ENABLED:
+        return validate_pdf_bytes(pdf_bytes, filename, verbose)
+    try:
+        result, _ = run_in_process_pool(
+            "cpu", validate_pdf_bytes, pdf_bytes, filename, verbose, max_workers=CPU_POOL_WORKERS
+        )
+        return result
+    except (PoolQueueTimeout, TimeoutError) as e:
+        return {"filename": filename, "status": "error", "error": str(e)}
@@ -0,0 +1,23 @@
+from flask import Response, jsonify
+from ..utils.metrics import render_metrics
+from ..services.warmup_service import warmup_state, start_warm_up
+
+
+def healthCheck():
+    # Liveness only: the process is up and serving requests
+    return jsonify({"status": "ok"}), 200
+
+
+def readinessCheck():
+    # Ready once warm-up has finished; a failed step is reported as "degraded"
+    if warmup_state.started_at is None:
+        # No launcher hook ran (e.g. `flask run`), so warm up now
+        start_warm_up()
+    state = warmup_state.to_dict()
+    return jsonify(state), 200 if warmup_state.ready else 503
+
+
+def metricsExport():
+    # Prometheus text format; with METRICS_DIR set (gunicorn.conf.py does) every
+    # worker's counters are merged, otherwise only this process's are reported
+    return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
@@ -1,6 +1,21 @@
+import os
+import time
 from flask import request, jsonify
-from ..utils import getTokenData
-from app.services import CertificateAuthorityService
+from ..utils.getDetailsFromValidateToken import getTokenData
+from ..utils.fileUtills import shared_ca_enabled
+from ..utils.processPool import CPU_POOL_ENABLED, CPU_POOL_WORKERS, PoolQueueTimeout, run_in_process_pool
+from ..services.genKeyCetificates_service import CertificateAuthorityService, CA_PROFILE
+from ..services.bulkOnboarding_service import (
+    onboarding_job_store,
+    start_onboarding_job,
+    parse_signers,
+    issue_signer_materials,
+    export_org_issuer
+)
+from ..services.keyPool_service import key_pool
+
+# Comma-separated emails allowed to run bulk onboarding; empty disables it
+ADMIN_EMAILS = {email.strip().lower() for email in os.getenv("ADMIN_EMAILS", "").split(",") if email.strip()}
 
 
 def generateKeys():
@@ -10,18 +25,73 @@ def generateKeys():
         signer_email = payload["signer_email"]
 
         genKeyService = CertificateAuthorityService(
-            vault_base_path="certs",  # Store under Vault path
-            country="LK",
-            state="Uva Province",
-            locality="Sri Lankan",
-            organization="Uva Wellassa University",
-            root_cn="Root CA",
-            intermediate_cn="Intermediate CA",
+            **CA_PROFILE,
             signer_cn=userName,
             signer_email=signer_email
         )
 
-        genKeyService.generate_all()
-        return jsonify({"message": "Successfully created"}), 201
+        stages = {}
+        start = time.perf_counter()
+        keys_needed = 1 if shared_ca_enabled() else 3
+        if CPU_POOL_ENABLED and key_pool.available() < keys_needed:
+            # No pre-generated keys to hand: generate on a worker instead of holding the GIL here
+            try:
+                materials, timings = run_in_process_pool(
+                    "cpu", issue_signer_materials, userName, signer_email, export_org_issuer(genKeyService),
+                    max_workers=CPU_POOL_WORKERS
+                )
+            except (PoolQueueTimeout, TimeoutError) as e:
+                # Nothing was stored, so the client can simply retry
+                return jsonify({"error": str(e)}), 503
+            stages.update(queue_ms=timings["queue_ms"], keygen_ms=timings["run_ms"])
+        else:
+            materials = genKeyService.build_signer_materials()
+            stages["keygen_ms"] = round((time.perf_counter() - start) * 1000, 2)
+
+        start = time.perf_counter()
+        genKeyService.store_materials(materials)
+        stages["store_ms"] = round((time.perf_counter() - start) * 1000, 2)
+        return jsonify({"message": "Successfully created", "timings": stages}), 201
     else:
         return jsonify(payload), 404
+
+
+def bulkGenerateKeys():
+    payload = getTokenData()
+    if not isinstance(payload, dict):
+        return payload
+    if payload["signer_email"].lower() not in ADMIN_EMAILS:
+        return jsonify({"error": "Admin privileges required"}), 403
+
+    try:
+        if 'signersFile' in request.files:
+            file = request.files['signersFile']
+            fmt = "json" if file.filename.lower().endswith(".json") else "csv"
+            signers = parse_signers(file.read(), fmt)
+        else:
+            signers = parse_signers(request.get_json(silent=True) or {})
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    if not signers:
+        return jsonify({"error": "No signers provided"}), 400
+
+    # Large intakes outlive a request, so the job runs in the background; the CLI runs it in the foreground
+    job_id = start_onboarding_job(signers, payload["signer_email"])
+    return jsonify({
+        "job_id": job_id, "status": "pending", "total": len(signers),
+        "status_url": f"/api/keys/bulkGenerateKeys/{job_id}"
+    }), 202
+
+
+def bulkOnboardingStatus(job_id):
+    payload = getTokenData()
+    if not isinstance(payload, dict):
+        return payload
+    if payload["signer_email"].lower() not in ADMIN_EMAILS:
+        return jsonify({"error": "Admin privileges required"}), 403
+
+    job = onboarding_job_store.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job), 200
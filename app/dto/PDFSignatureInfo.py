@@ -1,5 +1,5 @@
 from dataclasses import dataclass, asdict
-from typing import Optional
+from typing import List, Optional
 
 @dataclass
 class PDFSignatureInfo:
@@ -13,6 +13,10 @@ class PDFSignatureInfo:
     signing_time: Optional[str] = None
     covers_entire_file: bool = False
     bottom_line: Optional[str] = None  # <-- NEW FIELD
+    field_name: Optional[str] = None
+    byte_range: Optional[List[int]] = None  # [start1, length1, start2, length2] covered by the signature
+    details_text: Optional[str] = None  # full pyHanko report, only filled for verbose requests
+    error: Optional[str] = None  # why this signature could not be trusted or checked, e.g. an unknown signer
 
     def to_dict(self):
         return asdict(self)
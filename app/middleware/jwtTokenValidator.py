@@ -1,18 +1,32 @@
-import jwt
-from flask import Flask, request, jsonify, g
-from werkzeug.wrappers import Request, Response
+from flask import g, request, jsonify
+from ..utils.jwtTokenHandler import jwtTokenValidator
+from ..utils.getDetailsFromValidateToken import tokenData
 
-SECRET_KEY = "kasun1234"
 
+def authenticated(view):
+    """Mark a view as requiring a bearer token; the token is checked by init_jwt_auth."""
+    view.requires_auth = True
+    return view
 
-class JwtTokenValidatorMiddleware:
-    def __init__(self, app):
-        self.app = app
 
-    def __call__(self, environ, start_response):
-        request_obj = Request(environ)
-        print("🔍 Headers received by middleware:")
-        for key, value in request_obj.headers.items():
-            print(f"{key}: {value}")
+def init_jwt_auth(app):
+    """
+    Verify the bearer token once per request for views marked @authenticated
+    and put the caller on g.token_data. Runs before the view, so requests
+    with a missing, malformed or invalid token are rejected before their
+    body is parsed or an upload is buffered.
+    """
 
-        return self.app(environ, start_response)
+    @app.before_request
+    def authenticate_request():
+        view = app.view_functions.get(request.endpoint)
+        if not getattr(view, "requires_auth", False):
+            return None
+
+        result = jwtTokenValidator(request.headers.get("Authorization"))
+        if result["status"]:
+            g.token_data = tokenData(result["payload"])
+            if g.token_data is not None:
+                return None
+            result = {"error": "Token is missing userName or email", "status": False}
+        return jsonify(result), 401, {"WWW-Authenticate": "Bearer"}
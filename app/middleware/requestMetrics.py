@@ -0,0 +1,38 @@
+from flask import g, request
+from ..utils.metrics import (
+    SERVER_TIMING_ENABLED,
+    histogram,
+    begin_request_timings,
+    end_request_timings
+)
+
+HTTP_REQUEST_SECONDS = histogram(
+    "http_request_duration_seconds", "Request latency by route, method and status.", ("route", "method", "status")
+)
+
+
+def init_request_metrics(app):
+    """Time every request, record it, and report its stages in a Server-Timing header."""
+
+    @app.before_request
+    def start_request_timings():
+        g.stage_timings, g.stage_timings_token = begin_request_timings()
+
+    @app.after_request
+    def finish_request_timings(response):
+        timings = g.get("stage_timings")
+        if timings is None:
+            return response
+        route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        HTTP_REQUEST_SECONDS.observe(
+            timings.elapsed(), route=route, method=request.method, status=response.status_code
+        )
+        if SERVER_TIMING_ENABLED:
+            response.headers["Server-Timing"] = timings.server_timing()
+        return response
+
+    @app.teardown_request
+    def clear_request_timings(_):
+        token = g.pop("stage_timings_token", None)
+        if token is not None:
+            end_request_timings(token)
@@ -2,6 +2,10 @@ import os
 from flask import Flask
 from .pdfHandle_routes import pdfHandle_bp
 from .keys_routes import keys_bp
+from .health_routes import health_bp
+from ..commands import onboard_signers_command
+from ..middleware.requestMetrics import init_request_metrics
+from ..middleware.jwtTokenValidator import init_jwt_auth
 
 
 def create_app(test_config=None):
@@ -23,5 +27,9 @@ def create_app(test_config=None):
 
     app.register_blueprint(pdfHandle_bp, url_prefix="/api/pdf")
     app.register_blueprint(keys_bp, url_prefix="/api/keys")
+    app.register_blueprint(health_bp)
+    init_request_metrics(app)
+    init_jwt_auth(app)
+    app.cli.add_command(onboard_signers_command)
 
     return app
@@ -0,0 +1,19 @@
+from flask import Blueprint
+from ..controllers.health_controller import healthCheck, readinessCheck, metricsExport
+
+health_bp = Blueprint("health_bp", __name__)
+
+
+@health_bp.route('/health', methods=['GET'])
+def health():
+    return healthCheck()
+
+
+@health_bp.route('/ready', methods=['GET'])
+def ready():
+    return readinessCheck()
+
+
+@health_bp.route('/metrics', methods=['GET'])
+def metrics():
+    return metricsExport()
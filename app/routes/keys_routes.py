@@ -1,9 +1,27 @@
-from flask import Blueprint, request, jsonify
-from app.controllers import generateKeys
+from flask import Blueprint
+from ..middleware.jwtTokenValidator import authenticated
 
 keys_bp = Blueprint("keys_bp", __name__)
 
+# Controllers are imported on first use; see pdfHandle_routes
+
 
 @keys_bp.route('/generateKeys', methods=['POST'])
+@authenticated
 def initializeKeys():
+    from ..controllers.keyManage_controller import generateKeys
     return generateKeys()
+
+
+@keys_bp.route('/bulkGenerateKeys', methods=['POST'])
+@authenticated
+def bulkInitializeKeys():
+    from ..controllers.keyManage_controller import bulkGenerateKeys
+    return bulkGenerateKeys()
+
+
+@keys_bp.route('/bulkGenerateKeys/<job_id>', methods=['GET'])
+@authenticated
+def bulkInitializeKeysStatus(job_id):
+    from ..controllers.keyManage_controller import bulkOnboardingStatus
+    return bulkOnboardingStatus(job_id)
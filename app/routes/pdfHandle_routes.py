@@ -1,19 +1,60 @@
 from flask import Blueprint
-from ..controllers import signDocument, documentVarify, documentUpload
+from ..middleware.jwtTokenValidator import authenticated
 
 pdfHandle_bp = Blueprint("sign_bp", __name__)
 
+# Controllers are imported on first use so that creating the app does not
+# load pyHanko, PyPDF2 and hvac; the WSGI launcher preloads them before fork
+
 
 @pdfHandle_bp.route('/signPdf', methods=['post'])
+@authenticated
 def sign_pdf():
+    from ..controllers.documentSign_controller import signDocument
     return signDocument()
 
 
+@pdfHandle_bp.route('/signBatch', methods=['post'])
+@authenticated
+def sign_batch():
+    from ..controllers.documentSign_controller import signDocumentBatch
+    return signDocumentBatch()
+
+
+@pdfHandle_bp.route('/presign', methods=['post'])
+@authenticated
+def presign_pdf():
+    from ..controllers.documentSign_controller import presignDocument
+    return presignDocument()
+
+
+@pdfHandle_bp.route('/completeSign', methods=['post'])
+@authenticated
+def complete_sign_pdf():
+    from ..controllers.documentSign_controller import completeSignDocument
+    return completeSignDocument()
+
+
+@pdfHandle_bp.route('/jobs/<job_id>', methods=['get'])
+@authenticated
+def sign_job_status(job_id):
+    from ..controllers.documentSign_controller import signJobStatus
+    return signJobStatus(job_id)
+
+
 @pdfHandle_bp.route('/validatePdf', methods=['post'])
 def validate_Pdf():
+    from ..controllers.documentValidate_controller import documentVarify
     return documentVarify()
 
 
+@pdfHandle_bp.route('/validateBatch', methods=['post'])
+def validate_batch():
+    from ..controllers.documentValidate_controller import documentVarifyBatch
+    return documentVarifyBatch()
+
+
 @pdfHandle_bp.route('/upload-pdf', methods=['POST'])
 def upload_pdf():
+    from ..controllers.documentHandle_controller import documentUpload
     return documentUpload()
@@ -1,3 +1,19 @@
-from .genKeyCetificates_service import *
-from .pdfDigitallySign_service import *
-from .pdfValidate_service import *
+from ..utils.lazyModule import lazy_exports
+
+# Submodules are imported on first attribute access instead of all at once,
+# so importing one service does not load every other service's dependencies.
+# Code inside the app imports from the submodule directly.
+__getattr__ = lazy_exports(__name__, {
+    "keyPool_service": ("generate_rsa_key", "generate_rsa_key_der", "RSAKeyPool", "key_pool"),
+    "genKeyCetificates_service": ("generate_cert", "private_key_pem", "CertificateAuthorityService"),
+    "bulkOnboarding_service": ("parse_signers", "issue_signer_materials", "export_org_issuer", "BulkOnboardingJob",
+                               "OnboardingJobStore", "onboarding_job_store", "start_onboarding_job"),
+    "pdfDigitallySign_service": ("PDFDigitallySigner", "sign_document_in_worker", "sign_pdf_batch"),
+    "signJobQueue_service": ("TransientJobError", "new_job", "InMemoryJobStore", "SQLiteJobStore", "SignJobQueue",
+                             "get_sign_job_queue"),
+    "deferredSign_service": ("DeferredSigningError", "SessionNotFound", "DeferredSigningStore", "deferred_store", "presign_document",
+                             "presign_documents", "complete_deferred_signing", "decode_cms"),
+    "pdfValidate_service": ("save_uploaded_file", "build_signature_info", "load_known_trust_roots",
+                            "get_validation_context", "PDFVerifier", "validate_pdf_bytes"),
+    "warmup_service": ("WarmupState", "warmup_state", "warm_up", "start_warm_up"),
+})
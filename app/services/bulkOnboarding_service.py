@@ -0,0 +1,272 @@
+import os
+import io
+import csv
+import json
+import time
+import uuid
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from cryptography import x509
+from cryptography.hazmat.primitives import serialization
+from ..utils.fileUtills import findCertAvailability, shared_ca_enabled
+from ..utils.processPool import submit_to_process_pool
+from .genKeyCetificates_service import CertificateAuthorityService, CA_PROFILE
+from .keyPool_service import generate_rsa_key
+
+logger = logging.getLogger(__name__)
+
+ONBOARDING_WORKERS = int(os.getenv("ONBOARDING_WORKERS", str(os.cpu_count() or 1)))
+ONBOARDING_VAULT_CONCURRENCY = int(os.getenv("ONBOARDING_VAULT_CONCURRENCY", "4"))
+# Status of jobs started over HTTP, one JSON file each, shared by every worker process on the host
+ONBOARDING_JOB_DIR = os.getenv("ONBOARDING_JOB_DIR", os.path.join("instance", "onboarding_jobs"))
+# A running job that has not reported progress for this long died with its worker process
+ONBOARDING_JOB_STALE = float(os.getenv("ONBOARDING_JOB_STALE", "300"))
+ONBOARDING_JOB_RESULT_TTL = float(os.getenv("ONBOARDING_JOB_RESULT_TTL", "86400"))
+
+
+def parse_signers(content, fmt=None):
+    """Parse a CSV (name,email header) or JSON list of {"name", "email"} into signer dicts."""
+    if isinstance(content, bytes):
+        content = content.decode("utf-8-sig")
+    if isinstance(content, str):
+        fmt = fmt or ("json" if content.lstrip().startswith(("[", "{")) else "csv")
+        if fmt == "json":
+            content = json.loads(content)
+        else:
+            content = list(csv.DictReader(io.StringIO(content)))
+    if isinstance(content, dict):
+        content = content.get("signers", [])
+
+    signers, seen = [], set()
+    for row in content:
+        name = (row.get("name") or row.get("userName") or "").strip()
+        email = (row.get("email") or row.get("signer_email") or "").strip()
+        if not name or not email:
+            raise ValueError(f"Each signer needs a name and an email: {row}")
+        if email.lower() not in seen:
+            seen.add(email.lower())
+            signers.append({"name": name, "email": email})
+    return signers
+
+
+def issue_signer_materials(name, email, org_issuer_pems=None):
+    """Runs in a worker process: generate one signer's keys and certs, no Vault access."""
+    service = CertificateAuthorityService(**CA_PROFILE, signer_cn=name, signer_email=email,
+                                          key_source=generate_rsa_key)
+    org_issuer = None
+    if org_issuer_pems is not None:
+        org_issuer = (
+            serialization.load_pem_private_key(org_issuer_pems[0], password=None),
+            x509.load_pem_x509_certificate(org_issuer_pems[1])
+        )
+    return service.build_signer_materials(org_issuer)
+
+
+def export_org_issuer(service):
+    """The org intermediate as (key PEM, cert PEM) for worker processes, or None in per-signer mode."""
+    if not shared_ca_enabled():
+        return None
+    issuer_key, issuer_cert = service.load_org_issuer()
+    return (
+        issuer_key.private_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PrivateFormat.PKCS8,
+            encryption_algorithm=serialization.NoEncryption()
+        ),
+        issuer_cert.public_bytes(serialization.Encoding.PEM)
+    )
+
+
+class BulkOnboardingJob:
+    """
+    Provision certificates for many signers. Key generation runs on a process
+    pool, Vault writes on a bounded thread pool, and signers whose secrets
+    already exist are skipped so an interrupted job can simply be re-run.
+    """
+
+    def __init__(self, signers, workers=ONBOARDING_WORKERS,
+                 vault_concurrency=ONBOARDING_VAULT_CONCURRENCY, progress=None):
+        self.signers = signers
+        self.workers = workers
+        self.vault_concurrency = vault_concurrency
+        self.progress = progress
+        self.results = {}
+        self.counts = {"total": len(signers), "skipped": 0, "created": 0, "failed": 0}
+        self._started_at = None
+
+    def _report(self, email, status, message=None):
+        self.results[email] = {"email": email, "status": status, "message": message}
+        self.counts[status] += 1
+        if self.progress is not None:
+            self.progress(self.summary())
+
+    def _pending_signers(self, vault_pool):
+        checks = {
+            vault_pool.submit(findCertAvailability, signer["email"], CA_PROFILE["vault_base_path"]): signer
+            for signer in self.signers
+        }
+        pending = []
+        for future in as_completed(checks):
+            signer = checks[future]
+            try:
+                available, _ = future.result()
+            except Exception:
+                available = False
+            if available:
+                self._report(signer["email"], "skipped", "Certificates already exist")
+            else:
+                pending.append(signer)
+        return pending
+
+    def _store(self, signer, materials):
+        service = CertificateAuthorityService(**CA_PROFILE, signer_cn=signer["name"], signer_email=signer["email"])
+        service.store_materials(materials)
+
+    def run(self):
+        self._started_at = time.monotonic()
+        with ThreadPoolExecutor(max_workers=max(1, self.vault_concurrency)) as vault_pool:
+            pending = self._pending_signers(vault_pool)
+            if not pending:
+                return self.summary()
+
+            # Load (or bootstrap) the org intermediate once and hand it to the workers as PEM
+            org_issuer_pems = export_org_issuer(CertificateAuthorityService(
+                **CA_PROFILE, signer_cn=pending[0]["name"], signer_email=pending[0]["email"]
+            ))
+
+            generated = {
+                submit_to_process_pool("onboarding", issue_signer_materials, signer["name"], signer["email"],
+                                       org_issuer_pems, max_workers=self.workers): signer
+                for signer in pending
+            }
+            stored = {}
+            for future in as_completed(generated):
+                signer = generated[future]
+                try:
+                    materials = future.result()
+                except Exception as e:
+                    logger.exception("Certificate generation failed for %s", signer["email"])
+                    self._report(signer["email"], "failed", f"Generation failed: {e}")
+                    continue
+                stored[vault_pool.submit(self._store, signer, materials)] = signer
+
+            for future in as_completed(stored):
+                signer = stored[future]
+                try:
+                    future.result()
+                    self._report(signer["email"], "created")
+                except Exception as e:
+                    logger.exception("Vault write failed for %s", signer["email"])
+                    self._report(signer["email"], "failed", f"Vault write failed: {e}")
+
+        return self.summary()
+
+    def summary(self):
+        elapsed = time.monotonic() - self._started_at if self._started_at else 0.0
+        done = self.counts["skipped"] + self.counts["created"] + self.counts["failed"]
+        return {
+            **self.counts,
+            "done": done,
+            "elapsed_s": round(elapsed, 2),
+            "signers_per_s": round(self.counts["created"] / elapsed, 2) if elapsed else 0.0,
+        }
+
+
+class OnboardingJobStore:
+    """
+    Status of background onboarding jobs as one JSON file per job, so a
+    status poll can land on any worker process. Files are replaced
+    atomically; finished jobs are removed after ONBOARDING_JOB_RESULT_TTL.
+    """
+
+    def __init__(self, root=ONBOARDING_JOB_DIR, stale_after=ONBOARDING_JOB_STALE):
+        self.root = root
+        self.stale_after = stale_after
+
+    def _path(self, job_id):
+        # Job ids are uuid4 hex; anything else never names a file
+        if len(job_id) != 32 or not all(c in "0123456789abcdef" for c in job_id):
+            return None
+        return os.path.join(self.root, f"{job_id}.json")
+
+    def save(self, record):
+        os.makedirs(self.root, exist_ok=True)
+        record["updated_at"] = time.time()
+        path = self._path(record["id"])
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(record, f)
+        os.replace(tmp, path)
+
+    def get(self, job_id):
+        path = self._path(job_id)
+        try:
+            with open(path) as f:
+                record = json.load(f)
+        except (TypeError, FileNotFoundError, ValueError):
+            return None
+        if record["status"] in ("pending", "running") and time.time() - record["updated_at"] > self.stale_after:
+            # Signers already created are skipped, so submitting the same list again resumes it
+            record.update(status="interrupted", error="The worker running this job stopped; submit it again to resume")
+        return record
+
+    def purge(self, older_than):
+        if not os.path.isdir(self.root):
+            return
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            try:
+                if name.endswith(".json") and os.path.getmtime(path) < older_than:
+                    os.remove(path)
+            except OSError:
+                pass
+
+
+onboarding_job_store = OnboardingJobStore()
+_onboarding_runner = None
+_onboarding_runner_lock = threading.Lock()
+
+
+def _get_onboarding_runner():
+    # One job at a time per process; each job already fans out to the onboarding pool
+    global _onboarding_runner
+    if _onboarding_runner is None:
+        with _onboarding_runner_lock:
+            if _onboarding_runner is None:
+                _onboarding_runner = ThreadPoolExecutor(max_workers=1, thread_name_prefix="onboarding-job")
+    return _onboarding_runner
+
+
+def start_onboarding_job(signers, requested_by):
+    """Queue a BulkOnboardingJob in the background and return its id."""
+    onboarding_job_store.purge(time.time() - ONBOARDING_JOB_RESULT_TTL)
+    record = {
+        "id": uuid.uuid4().hex, "status": "pending", "requested_by": requested_by,
+        "created_at": time.time(), "summary": None, "results": None, "error": None,
+    }
+    onboarding_job_store.save(record)
+    _get_onboarding_runner().submit(_run_onboarding_job, record, signers)
+    return record["id"]
+
+
+def _run_onboarding_job(record, signers):
+    last_saved = [0.0]
+
+    def progress(summary):
+        # Progress doubles as the heartbeat that keeps the job from looking stale
+        if time.monotonic() - last_saved[0] >= 1.0:
+            last_saved[0] = time.monotonic()
+            record.update(status="running", summary=summary)
+            onboarding_job_store.save(record)
+
+    job = BulkOnboardingJob(signers, progress=progress)
+    record.update(status="running", summary=job.summary())
+    onboarding_job_store.save(record)
+    try:
+        record.update(status="done", summary=job.run())
+    except Exception as e:
+        logger.exception("Onboarding job %s failed", record["id"])
+        record.update(status="failed", summary=job.summary(), error=str(e))
+    record["results"] = list(job.results.values())
+    onboarding_job_store.save(record)
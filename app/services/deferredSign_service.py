@@ -0,0 +1,215 @@
+import os
+import json
+import time
+import uuid
+import base64
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from asn1crypto import cms, x509
+from pyhanko.sign.signers.pdf_byterange import PreparedByteRangeDigest
+from pyhanko.sign.signers.pdf_signer import PdfTBSDocument
+from pyhanko.sign.validation.generic_cms import validate_sig_integrity
+from ..utils.metrics import bind_request_timings
+from .pdfDigitallySign_service import PDFDigitallySigner, SIGN_BATCH_WORKERS
+
+logger = logging.getLogger(__name__)
+
+DEFERRED_SIGN_DIR = os.getenv("DEFERRED_SIGN_DIR", os.path.join("instance", "deferred"))
+DEFERRED_SIGN_TTL = float(os.getenv("DEFERRED_SIGN_TTL", "900"))
+# Room reserved in the PDF for the DER CMS (written as hex, so twice this many bytes)
+DEFERRED_SIGNATURE_BYTES = int(os.getenv("DEFERRED_SIGNATURE_BYTES", "16384"))
+
+
+class DeferredSigningError(Exception):
+    pass
+
+
+class SessionNotFound(DeferredSigningError):
+    """No session with this id for this signer; other signers' sessions are reported the same way."""
+
+
+class DeferredSigningStore:
+    """
+    Prepared documents waiting for their external signature. Each session is
+    a prepared PDF plus a small JSON record on local disk, so nothing is held
+    in memory between the two phases.
+    """
+
+    def __init__(self, root=DEFERRED_SIGN_DIR, ttl=DEFERRED_SIGN_TTL):
+        self.root = root
+        self.ttl = ttl
+
+    def _paths(self, session_id):
+        if not session_id or not session_id.isalnum():
+            raise DeferredSigningError("Invalid session id")
+        base = os.path.join(self.root, session_id)
+        return base + ".pdf", base + ".json"
+
+    def create(self):
+        os.makedirs(self.root, exist_ok=True)
+        session_id = uuid.uuid4().hex
+        return session_id, self._paths(session_id)[0]
+
+    def save(self, session_id, record):
+        _, meta_path = self._paths(session_id)
+        with open(meta_path, "w", encoding="utf-8") as f:
+            json.dump(record, f)
+
+    def load(self, session_id, signer_email):
+        pdf_path, meta_path = self._paths(session_id)
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                record = json.load(f)
+        except OSError:
+            raise SessionNotFound("Signing session not found")
+        # Sessions of other signers are reported as missing
+        if record["signer_email"] != signer_email:
+            raise SessionNotFound("Signing session not found")
+        if record["expires_at"] < time.time():
+            self.discard(session_id)
+            raise DeferredSigningError("Signing session expired")
+        return pdf_path, record
+
+    def discard(self, session_id):
+        for path in self._paths(session_id):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def purge_expired(self):
+        if not os.path.isdir(self.root):
+            return
+        cutoff = time.time() - self.ttl
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
+
+
+deferred_store = DeferredSigningStore()
+
+
+def presign_document(source, signer_email, credentials, workspace=None, **signer_options):
+    """Phase one for one document: returns the session record including the digest to sign."""
+    signer = PDFDigitallySigner(input_pdf_url=source, signer_email=signer_email,
+                                workspace=workspace, **signer_options)
+    try:
+        result = signer.convert_to_standard_pdf()
+        if result["type"] == "error":
+            raise DeferredSigningError(result["message"])
+
+        session_id, pdf_path = deferred_store.create()
+        try:
+            with open(pdf_path, "wb") as output:
+                prepared, md_algorithm = signer.presign(credentials, output, DEFERRED_SIGNATURE_BYTES)
+            now = time.time()
+            record = {
+                "session_id": session_id,
+                "signer_email": signer_email,
+                "source": source,
+                "digest_algorithm": md_algorithm,
+                "document_digest": prepared.document_digest.hex(),
+                # Only a CMS made with this certificate's key may complete the session
+                "signer_cert": base64.b64encode(credentials.signing_cert.dump()).decode("ascii"),
+                "reserved_region_start": prepared.reserved_region_start,
+                "reserved_region_end": prepared.reserved_region_end,
+                "created_at": now,
+                "expires_at": now + deferred_store.ttl,
+            }
+            deferred_store.save(session_id, record)
+            return record
+        except Exception:
+            deferred_store.discard(session_id)
+            raise
+    finally:
+        signer.close()
+
+
+def presign_documents(sources, signer_email, credentials, workspace=None, max_workers=SIGN_BATCH_WORKERS):
+    """Phase one for many documents concurrently; one result dict per source, in order."""
+    deferred_store.purge_expired()
+
+    def prepare_one(source):
+        try:
+            return {"status": "success", **presign_document(source, signer_email, credentials, workspace)}
+        except Exception as e:
+            logger.exception("Pre-sign failed for %s", source)
+            return {"status": "error", "source": source, "message": str(e)}
+
+    if workspace is not None:
+        workspace.open()
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        return list(pool.map(bind_request_timings(prepare_one), sources))
+
+
+def _check_cms(signature_cms, record):
+    """
+    Refuse a CMS unless it names the session signer's certificate, its
+    signature over the signed attributes verifies with that certificate's
+    key, and its signed messageDigest is this document's digest.
+    """
+    if not record.get("signer_cert"):
+        raise DeferredSigningError("Signing session has no signer certificate; pre-sign the document again")
+    signer_cert = x509.Certificate.load(base64.b64decode(record["signer_cert"]))
+    try:
+        content_info = cms.ContentInfo.load(signature_cms)
+        signer_info = content_info["content"]["signer_infos"][0]
+        sid = signer_info["sid"]
+        if sid.name == "issuer_and_serial_number":
+            names_signer = (sid.chosen["issuer"] == signer_cert.issuer
+                            and sid.chosen["serial_number"].native == signer_cert.serial_number)
+        else:
+            names_signer = sid.chosen.native == signer_cert.key_identifier
+    except Exception as e:
+        raise DeferredSigningError(f"Malformed CMS signature: {e}")
+    if not names_signer:
+        raise DeferredSigningError("CMS signature was not made with the session signer's certificate")
+
+    try:
+        intact, valid = validate_sig_integrity(signer_info, signer_cert, "data",
+                                               bytes.fromhex(record["document_digest"]))
+    except Exception as e:
+        raise DeferredSigningError(f"Malformed CMS signature: {e}")
+    if not intact:
+        raise DeferredSigningError("CMS signature does not cover this document's digest")
+    if not valid:
+        raise DeferredSigningError("CMS signature does not verify with the session signer's certificate")
+
+
+def complete_deferred_signing(session_id, signer_email, signature_cms):
+    """
+    Phase two: embed an externally computed CMS (DER bytes) into the prepared
+    document and return the signed PDF bytes. The session is consumed.
+    """
+    pdf_path, record = deferred_store.load(session_id, signer_email)
+    _check_cms(signature_cms, record)
+
+    prepared = PreparedByteRangeDigest(
+        document_digest=bytes.fromhex(record["document_digest"]),
+        reserved_region_start=record["reserved_region_start"],
+        reserved_region_end=record["reserved_region_end"]
+    )
+    reserved = (prepared.reserved_region_end - prepared.reserved_region_start - 2) // 2
+    if len(signature_cms) > reserved:
+        raise DeferredSigningError(f"CMS signature is {len(signature_cms)} bytes; only {reserved} were reserved")
+
+    with open(pdf_path, "r+b") as output:
+        PdfTBSDocument.finish_signing(output, prepared, signature_cms)
+        output.seek(0)
+        signed = output.read()
+    deferred_store.discard(session_id)
+    return signed
+
+
+def decode_cms(value):
+    """Accept base64 (standard or URL-safe) DER for the CMS signature."""
+    if not value:
+        raise DeferredSigningError("signature_cms required")
+    try:
+        return base64.b64decode(value, altchars=b"-_" if ("-" in value or "_" in value) else None, validate=True)
+    except Exception:
+        raise DeferredSigningError("signature_cms must be base64-encoded DER")
@@ -1,39 +1,46 @@
-import hvac
 from cryptography.hazmat._oid import ExtendedKeyUsageOID
-from cryptography.hazmat.primitives.asymmetric import rsa
 from cryptography.hazmat.primitives import serialization, hashes
 from cryptography import x509
 from cryptography.x509.oid import NameOID
 from cryptography.x509 import BasicConstraints, KeyUsage, ExtendedKeyUsage
 from datetime import datetime, timedelta
-from ..utils import genIdByEmail
+import threading
+import hvac
+from ..utils.generateIdByEmail import genIdByEmail
+from ..utils.credentialCache import invalidate_signer
+from ..utils.fileUtills import shared_ca_enabled, load_org_ca, reset_org_ca, ORG_CA_PATH
+from ..utils.vaultClient import write_secret
+from ..utils.metrics import counter, stage
+from .keyPool_service import key_pool
 import os
 import logging
 
 logger = logging.getLogger(__name__)
 
+CERTIFICATES_ISSUED = counter("signer_certificates_issued", "Signer certificate sets issued by CA mode.", ("ca_mode",))
 
-# -----------------
-# Vault Connection
-# -----------------
-def get_vault_client():
-    vault_addr = os.getenv("VAULT_ADDR", "http://127.0.0.1:8200")
-    vault_token = os.getenv("VAULT_TOKEN")
-    print(f"[DEBUG] Connecting to Vault at {vault_addr}")
-    if not vault_token:
-        raise ValueError("VAULT_TOKEN environment variable not set!")
+ORG_CA_VALIDITY_DAYS = int(os.getenv("ORG_CA_VALIDITY_DAYS", "3650"))
+
+# Subject fields shared by every certificate this service issues
+CA_PROFILE = {
+    "vault_base_path": "certs",  # Store under Vault path
+    "country": "LK",
+    "state": "Uva Province",
+    "locality": "Sri Lankan",
+    "organization": "Uva Wellassa University",
+    "root_cn": "Root CA",
+    "intermediate_cn": "Intermediate CA",
+}
 
-    client = hvac.Client(url=vault_addr, token=vault_token)
-    if not client.is_authenticated():
-        raise ValueError("Vault authentication failed!")
-    print("[DEBUG] Vault authentication successful")
-    return client
+# Parsed organizational intermediate (key, cert) per mount, loaded once per process
+_org_issuer = {}
+_org_issuer_lock = threading.Lock()
 
 
 # -----------------
 # Cert Generation
 # -----------------
-def generate_cert(subject_name, issuer_name, public_key, issuer_key, is_ca=False):
+def generate_cert(subject_name, issuer_name, public_key, issuer_key, is_ca=False, days=365):
     # print(f"[DEBUG] Generating certificate for {subject_name.get_attributes_for_oid(NameOID.COMMON_NAME)[0].value}")
     builder = (
         x509.CertificateBuilder()
@@ -42,7 +49,7 @@ def generate_cert(subject_name, issuer_name, public_key, issuer_key, is_ca=False
         .public_key(public_key)
         .serial_number(x509.random_serial_number())
         .not_valid_before(datetime.utcnow())
-        .not_valid_after(datetime.utcnow() + timedelta(days=365))
+        .not_valid_after(datetime.utcnow() + timedelta(days=days))
         .add_extension(BasicConstraints(ca=is_ca, path_length=None), critical=True)
         .add_extension(KeyUsage(
             digital_signature=True,
@@ -69,12 +76,21 @@ def generate_cert(subject_name, issuer_name, public_key, issuer_key, is_ca=False
     return cert
 
 
+def private_key_pem(key):
+    return key.private_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PrivateFormat.PKCS8,
+        encryption_algorithm=serialization.NoEncryption()
+    )
+
+
 # -----------------
 # Certificate Service
 # -----------------
 class CertificateAuthorityService:
     def __init__(self, vault_base_path, country, state, locality, signer_email,
-                 organization, signer_cn, root_cn="Root CA", intermediate_cn="Intermediate CA"):
+                 organization, signer_cn, root_cn="Root CA", intermediate_cn="Intermediate CA",
+                 key_source=None):
         self.vault_base_path = vault_base_path.rstrip("/")
         self.country = country
         self.state = state
@@ -85,7 +101,8 @@ class CertificateAuthorityService:
         self.signer_cn = signer_cn
         self.signer_email = signer_email
         self.unique_id = genIdByEmail(signer_email)
-        self.client = get_vault_client()
+        # Pooled keys by default; worker processes pass generate_rsa_key instead
+        self.new_key = key_source or key_pool.take
 
     def build_name(self, common_name):
         return x509.Name([
@@ -97,68 +114,149 @@ class CertificateAuthorityService:
             x509.NameAttribute(NameOID.EMAIL_ADDRESS, self.signer_email)
         ])
 
+    def build_org_name(self, common_name):
+        return x509.Name([
+            x509.NameAttribute(NameOID.COUNTRY_NAME, self.country),
+            x509.NameAttribute(NameOID.STATE_OR_PROVINCE_NAME, self.state),
+            x509.NameAttribute(NameOID.LOCALITY_NAME, self.locality),
+            x509.NameAttribute(NameOID.ORGANIZATION_NAME, self.organization),
+            x509.NameAttribute(NameOID.COMMON_NAME, common_name)
+        ])
+
     def store_in_vault(self, name, pem_bytes):
         """Store PEM data securely in Vault using KV v2"""
         pem_str = pem_bytes.decode("utf-8")
         vault_path = f"{self.unique_id}/{name}"  # KV v2 path is relative to mount
-        self.client.secrets.kv.v2.create_or_update_secret(
-            path=vault_path,
-            secret={"value": pem_str},
-            mount_point=self.vault_base_path  # Specify mount point explicitly
+        write_secret(vault_path, {"value": pem_str}, self.vault_base_path)  # Specify mount point explicitly
+
+    def bootstrap_org_ca(self):
+        """
+        Create the shared organizational Root and Intermediate CA. The root key
+        is discarded once the intermediate is signed; only the intermediate key
+        is kept online. Check-and-set makes concurrent bootstraps converge on
+        whichever CA was written first.
+        """
+        root_key = self.new_key()
+        root_subject = self.build_org_name(self.root_cn)
+        root_cert = generate_cert(root_subject, root_subject, root_key.public_key(), root_key,
+                                  is_ca=True, days=ORG_CA_VALIDITY_DAYS)
+
+        intermediate_key = self.new_key()
+        intermediate_subject = self.build_org_name(self.intermediate_cn)
+        intermediate_cert = generate_cert(
+            intermediate_subject, root_subject,
+            intermediate_key.public_key(), root_key, is_ca=True, days=ORG_CA_VALIDITY_DAYS
         )
 
-    def generate_all(self):
+        root_pem = root_cert.public_bytes(serialization.Encoding.PEM).decode("utf-8")
+        intermediate_pem = intermediate_cert.public_bytes(serialization.Encoding.PEM).decode("utf-8")
+        try:
+            write_secret(ORG_CA_PATH, {
+                "root_cert": root_pem,
+                "intermediate_cert": intermediate_pem,
+                "intermediate_key": private_key_pem(intermediate_key).decode("utf-8"),
+                "ca_chain": intermediate_pem + root_pem
+            }, self.vault_base_path, cas=0)
+            logger.info("Bootstrapped organizational CA at %s/%s", self.vault_base_path, ORG_CA_PATH)
+        except hvac.exceptions.InvalidRequest:
+            logger.info("Organizational CA was created concurrently; using the stored one")
+        reset_org_ca()
+
+    def load_org_issuer(self):
+        """Organizational intermediate key and cert, bootstrapping the CA on first use."""
+        issuer = _org_issuer.get(self.vault_base_path)
+        if issuer is None:
+            with _org_issuer_lock:
+                issuer = _org_issuer.get(self.vault_base_path)
+                if issuer is None:
+                    org_ca = load_org_ca(self.vault_base_path)
+                    if org_ca is None:
+                        self.bootstrap_org_ca()
+                        org_ca = load_org_ca(self.vault_base_path)
+                    if org_ca is None:
+                        raise RuntimeError("Organizational CA could not be loaded from Vault")
+                    issuer = (
+                        serialization.load_pem_private_key(org_ca["intermediate_key"].encode("utf-8"), password=None),
+                        x509.load_pem_x509_certificate(org_ca["intermediate_cert"].encode("utf-8"))
+                    )
+                    _org_issuer[self.vault_base_path] = issuer
+        return issuer
+
+    def build_signer_materials(self, org_issuer=None):
+        """
+        Generate the signer's keys and certificates without touching Vault.
+        Returns {secret name: PEM bytes} in the order they should be stored.
+        """
+        with stage("keygen"):
+            materials = self._build_signer_materials(org_issuer)
+        CERTIFICATES_ISSUED.inc(ca_mode="shared" if shared_ca_enabled() else "per_signer")
+        return materials
+
+    def _build_signer_materials(self, org_issuer):
+        if shared_ca_enabled():
+            # One key generation: the signer's cert is issued by the org intermediate
+            intermediate_key, intermediate_cert = org_issuer or self.load_org_issuer()
+            signer_key = self.new_key()
+            signer_cert = generate_cert(
+                self.build_name(self.signer_cn), intermediate_cert.subject,
+                signer_key.public_key(), intermediate_key, is_ca=False
+            )
+            return {
+                "private_key": private_key_pem(signer_key),
+                "cert": signer_cert.public_bytes(serialization.Encoding.PEM)
+            }
+
         # Root CA
-        root_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        root_key = self.new_key()
         root_subject = self.build_name(self.root_cn)
         root_cert = generate_cert(root_subject, root_subject, root_key.public_key(), root_key, is_ca=True)
 
-        self.store_in_vault("root_key", root_key.private_bytes(
-            encoding=serialization.Encoding.PEM,
-            format=serialization.PrivateFormat.PKCS8,
-            encryption_algorithm=serialization.NoEncryption()
-        ))
-        self.store_in_vault("root_cert", root_cert.public_bytes(serialization.Encoding.PEM))
-
         # Intermediate CA
-        intermediate_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        intermediate_key = self.new_key()
         intermediate_subject = self.build_name(self.intermediate_cn)
         intermediate_cert = generate_cert(
             intermediate_subject, root_subject,
             intermediate_key.public_key(), root_key, is_ca=True
         )
 
-        self.store_in_vault("intermediate_key", intermediate_key.private_bytes(
-            encoding=serialization.Encoding.PEM,
-            format=serialization.PrivateFormat.PKCS8,
-            encryption_algorithm=serialization.NoEncryption()
-        ))
-        self.store_in_vault("intermediate_cert", intermediate_cert.public_bytes(serialization.Encoding.PEM))
-
         # Signer Certificate
-        signer_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        signer_key = self.new_key()
         signer_subject = self.build_name(self.signer_cn)
         signer_cert = generate_cert(
             signer_subject, intermediate_subject,
             signer_key.public_key(), intermediate_key, is_ca=False
         )
 
-        self.store_in_vault("private_key", signer_key.private_bytes(
-            encoding=serialization.Encoding.PEM,
-            format=serialization.PrivateFormat.PKCS8,
-            encryption_algorithm=serialization.NoEncryption()
-        ))
-        self.store_in_vault("cert", signer_cert.public_bytes(serialization.Encoding.PEM))
-
         # CA Chain
         ca_chain_pem = (
                 intermediate_cert.public_bytes(serialization.Encoding.PEM) +
                 root_cert.public_bytes(serialization.Encoding.PEM)
         )
-        self.store_in_vault("ca_chain", ca_chain_pem)
 
+        return {
+            "root_key": private_key_pem(root_key),
+            "root_cert": root_cert.public_bytes(serialization.Encoding.PEM),
+            "intermediate_key": private_key_pem(intermediate_key),
+            "intermediate_cert": intermediate_cert.public_bytes(serialization.Encoding.PEM),
+            "private_key": private_key_pem(signer_key),
+            "cert": signer_cert.public_bytes(serialization.Encoding.PEM),
+            "ca_chain": ca_chain_pem
+        }
+
+    def store_materials(self, materials):
+        with stage("vault_store"):
+            for name, pem_bytes in materials.items():
+                self.store_in_vault(name, pem_bytes)
+
+        # Keys were rotated, drop any credentials cached for this signer
+        invalidate_signer(self.unique_id, self.vault_base_path)
+
+        ca_chain_path = ORG_CA_PATH if shared_ca_enabled() else f"{self.unique_id}/ca_chain"
         return {
             "private_key": f"{self.vault_base_path}/{self.unique_id}/private_key",
             "certificate": f"{self.vault_base_path}/{self.unique_id}/cert",
-            "ca_chain": f"{self.vault_base_path}/{self.unique_id}/ca_chain"
+            "ca_chain": f"{self.vault_base_path}/{ca_chain_path}"
         }
+
+    def generate_all(self):
+        return self.store_materials(self.build_signer_materials())
@@ -0,0 +1,130 @@
+import os
+import time
+import threading
+import logging
+from collections import deque
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.hazmat.primitives import serialization
+from ..utils.processPool import submit_to_process_pool
+from ..utils.metrics import gauge
+
+logger = logging.getLogger(__name__)
+
+KEY_POOL_DEPTH = int(os.getenv("KEY_POOL_DEPTH", "6"))
+KEY_POOL_WORKERS = int(os.getenv("KEY_POOL_WORKERS", "2"))
+KEY_SIZE = 2048
+
+
+def generate_rsa_key(key_size=KEY_SIZE):
+    return rsa.generate_private_key(public_exponent=65537, key_size=key_size)
+
+
+def generate_rsa_key_der(key_size=KEY_SIZE):
+    """Runs in a worker process; DER bytes pickle cheaply back to the parent."""
+    return generate_rsa_key(key_size).private_bytes(
+        encoding=serialization.Encoding.DER,
+        format=serialization.PrivateFormat.PKCS8,
+        encryption_algorithm=serialization.NoEncryption()
+    )
+
+
+class RSAKeyPool:
+    """
+    Keeps up to `depth` RSA keys pre-generated on worker processes so key
+    generation is off the request path. Keys only live in memory until taken.
+    """
+
+    def __init__(self, depth=KEY_POOL_DEPTH, key_size=KEY_SIZE, workers=KEY_POOL_WORKERS):
+        self.depth = depth
+        self.key_size = key_size
+        self.workers = workers
+        self._keys = deque()
+        self._lock = threading.Lock()
+        self._inflight = 0
+        self._started_at = None
+        self.generated = 0
+        self.failed = 0
+        self.pool_hits = 0
+        self.on_demand = 0
+        self.total_wait_ms = 0.0
+
+    def start(self):
+        """Begin filling the pool; safe to call more than once."""
+        if self.depth <= 0:
+            return
+        with self._lock:
+            if self._started_at is None:
+                self._started_at = time.monotonic()
+        self._refill()
+
+    def _refill(self):
+        with self._lock:
+            needed = self.depth - len(self._keys) - self._inflight
+            if needed <= 0:
+                return
+            self._inflight += needed
+        try:
+            for _ in range(needed):
+                submit_to_process_pool("keygen", generate_rsa_key_der, self.key_size,
+                                       max_workers=self.workers).add_done_callback(self._on_generated)
+        except Exception:
+            logger.exception("Key pool refill failed; keys will be generated on demand")
+            with self._lock:
+                self._inflight = 0
+
+    def _on_generated(self, future):
+        try:
+            key = serialization.load_der_private_key(future.result(), password=None)
+        except Exception:
+            logger.exception("Background key generation failed")
+            with self._lock:
+                self._inflight -= 1
+                self.failed += 1
+            return
+        with self._lock:
+            self._inflight -= 1
+            self._keys.append(key)
+            self.generated += 1
+
+    def available(self):
+        with self._lock:
+            return len(self._keys)
+
+    def take(self):
+        """Return a pooled key, or generate one inline when the pool is empty."""
+        start = time.perf_counter()
+        with self._lock:
+            key = self._keys.popleft() if self._keys else None
+        self.start()
+
+        from_pool = key is not None
+        if not from_pool:
+            key = generate_rsa_key(self.key_size)
+        wait_ms = (time.perf_counter() - start) * 1000
+        with self._lock:
+            if from_pool:
+                self.pool_hits += 1
+            else:
+                self.on_demand += 1
+            self.total_wait_ms += wait_ms
+        return key
+
+    def stats(self):
+        with self._lock:
+            served = self.pool_hits + self.on_demand
+            elapsed = time.monotonic() - self._started_at if self._started_at else 0.0
+            return {
+                "depth": len(self._keys),
+                "target_depth": self.depth,
+                "inflight": self._inflight,
+                "generated": self.generated,
+                "failed": self.failed,
+                "pool_hits": self.pool_hits,
+                "on_demand": self.on_demand,
+                "refill_rate_per_s": self.generated / elapsed if elapsed else 0.0,
+                "avg_wait_ms": self.total_wait_ms / served if served else 0.0,
+            }
+
+
+key_pool = RSAKeyPool()
+gauge("rsa_key_pool_available", "Pre-generated RSA keys ready to hand out.", key_pool.available)
@@ -1,158 +1,364 @@
 import os
+import time
+import asyncio
 import logging
+import requests
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from PyPDF2 import PdfReader, PdfWriter
 from pyhanko import stamp
-from pyhanko.pdf_utils import images
 from pyhanko.pdf_utils.incremental_writer import IncrementalPdfFileWriter
 from pyhanko.sign import fields, signers
-from ..utils.fileUtills import (
-    download_pdf_from_url,
-    findCertAvailability,
-    load_certs_from_vault_to_temp,
-    removeUnWantedFiles
-)
+from pyhanko_certvalidator.registry import SimpleCertificateStore
+from ..utils.fileUtills import credentials_from_pem, load_signer_credentials, new_pdf_buffer
+from ..utils.pdfDownloader import pdf_downloader
+from ..utils.pdfCache import pdf_cache, sha256_of_file, variant_key
+from ..utils.pdfPrecheck import free_signature_field_name, has_signatures, precheck_pdf
+from ..utils.signerProfile import get_signer_profile
+from ..utils.stampCache import StampBackground, get_stamp_image
 from ..utils.generateIdByEmail import genIdByEmail
+from ..utils.workspace import RequestWorkspace
+from ..utils.processPool import (
+    CPU_POOL_ENABLED,
+    CPU_POOL_WORKERS,
+    PROCESS_POOL_QUEUE_TIMEOUT,
+    PROCESS_POOL_TASK_TIMEOUT,
+    PoolQueueTimeout,
+    run_in_process_pool
+)
+from ..utils.metrics import counter, stage, bind_request_timings, BYTES_PROCESSED
 
 from flask import send_file
 from io import BytesIO
 
 logger = logging.getLogger(__name__)
 
+PDF_CACHE_LOOKUPS = counter("pdf_cache_lookups", "Normalized PDF cache lookups by result.", ("result",))
+SIGNATURES = counter("pdf_signatures", "Signed documents by how the source was prepared.", ("path",))
+
 
 class PDFDigitallySigner:
     def __init__(
-        self, input_pdf_url, signer_email, stamp_image_path,
-        signature_field_name='Signature',
-        signature_box=(375, 700, 575, 762),
-        vault_base_path="certs"
+        self, input_pdf_url, signer_email, stamp_image_path=None,
+        signature_field_name=None,
+        signature_box=None,
+        vault_base_path="certs",
+        workspace=None
     ):
         self.signer_email = signer_email
         self.unique_id = genIdByEmail(signer_email)
         self.input_pdf_url = input_pdf_url
-        self.input_fixed_pdf = f"outputs/final_fixed_{self.unique_id}.pdf"
-        self.input_pdf_location = f"outputs/document-signed_{self.unique_id}.pdf"
+        # Anything not passed explicitly comes from the signer's profile
+        profile = get_signer_profile(signer_email)
+        stamp_image_path = stamp_image_path or profile.stamp_image_path
+        signature_field_name = signature_field_name or profile.signature_field_name
+        signature_box = signature_box or profile.signature_box
+        self.input_fixed_pdf = None  # spooled buffer (or cache file) holding the normalized PDF
+        self.cache_status = None  # "miss", "url-hit" or "content-hit" once converted
+        self.sign_path = None  # "direct", "rewrite" or "cached" once converted
+        self.rewrite_reason = None
+        self.cache_key = None
         self.stamp_image_path = stamp_image_path
         self.signature_field_name = signature_field_name
         self.signature_box = signature_box
         self.vault_base_path = vault_base_path
+        # Large buffers spill into the request's own workspace, never a path shared with other requests
+        self.workspace = workspace
+
+    def _spill_dir(self):
+        return self.workspace.open().path if self.workspace is not None else None
+
+    def _download(self, etag=None, last_modified=None):
+        """Return (DownloadedPdf, error)."""
+        try:
+            return pdf_downloader.fetch(self.input_pdf_url, spill_dir=self._spill_dir(),
+                                        etag=etag, last_modified=last_modified), None
+        except ValueError as e:
+            return None, {"type": "error", "message": str(e)}
+        except Exception as e:
+            logger.exception("Error downloading PDF")
+            # Unreachable hosts, timeouts and 5xx/408/429 may succeed later; other failures will not
+            status = e.response.status_code if isinstance(e, requests.HTTPError) and e.response is not None else None
+            retryable = (isinstance(e, (requests.ConnectionError, requests.Timeout))
+                         or (status is not None and (status >= 500 or status in (408, 429))))
+            return None, {"type": "error", "message": "Failed to download PDF from URL.", "retryable": retryable}
+
+    def _use_cached(self, cached):
+        self.sign_path = "cached"
+        self.close()
+        self.input_fixed_pdf = cached
+        return {"type": "success", "message": "Successfully converted PDF to signing mode."}
 
     def convert_to_standard_pdf(self):
-        # accept remote URL or local path
+        with stage("convert"):
+            result = self._convert()
+        if self.cache_status:
+            PDF_CACHE_LOOKUPS.inc(result=self.cache_status)
+        return result
+
+    def _convert(self):
+        # accept remote URL or local path; remote PDFs are streamed into memory
+        download = None
         if self.input_pdf_url.startswith("http://") or self.input_pdf_url.startswith("https://"):
-            downloaded_path = download_pdf_from_url(self.input_pdf_url)
-            if not downloaded_path:
-                return {"type": "error", "message": "Failed to download PDF from URL."}
-            self.input_pdf_url = downloaded_path
+            # An unchanged URL is answered with a 304 and served from the cache without a body
+            known = pdf_cache.lookup_url(self.input_pdf_url, (self.signature_field_name,))
+            if known is not None:
+                download, error = self._download(known.etag, known.last_modified)
+                if error:
+                    return error
+                if download.not_modified:
+                    cached = pdf_cache.open(known.key)
+                    if cached is not None:
+                        self.cache_key = known.key
+                        self.cache_status = "url-hit"
+                        return self._use_cached(cached)
+                    download = None
+            if download is None:
+                download, error = self._download()
+                if error:
+                    return error
+            source, content_sha256 = download.buffer, download.sha256
+        else:
+            try:
+                source = open(self.input_pdf_url, "rb")
+            except OSError as e:
+                return {"type": "error", "message": f"Cannot open PDF: {str(e)}"}
+            content_sha256 = sha256_of_file(source) if pdf_cache.enabled else None
+        # Entries are kept per signature field name, like the URL index
+        cache_key = variant_key(content_sha256, self.signature_field_name)
+        self.cache_key = cache_key
+
+        # Identical bytes from another URL (or a changed ETag) still skip normalization
+        cached = pdf_cache.open(cache_key)
+        if cached is not None:
+            source.close()
+            self._remember_url(download, cache_key)
+            self.cache_status = "content-hit"
+            return self._use_cached(cached)
+        self.cache_status = "miss"
+
+        # Clean inputs are signed incrementally as they are; only problem files get rebuilt
+        with stage("precheck"):
+            clean, self.rewrite_reason = precheck_pdf(source)
+        if clean:
+            pdf_cache.store(cache_key, source)
+            self._remember_url(download, cache_key)
+            self.sign_path = "direct"
+            self.close()
+            self.input_fixed_pdf = source
+            return {"type": "success", "message": "PDF is already in signing mode."}
 
+        if has_signatures(source):
+            # A full rewrite would break the ByteRange of every signature already in the file
+            source.close()
+            return {"type": "error", "code": 409,
+                    "message": f"PDF already has signatures and cannot be signed again without rewriting it "
+                               f"({self.rewrite_reason}), which would invalidate them."}
+
+        logger.info("Rewriting %s before signing: %s", self.input_pdf_url, self.rewrite_reason)
         try:
-            reader = PdfReader(self.input_pdf_url)
-            writer = PdfWriter()
-            for page in reader.pages:
-                writer.add_page(page)
-            os.makedirs(os.path.dirname(self.input_fixed_pdf), exist_ok=True)
-            with open(self.input_fixed_pdf, "wb") as f:
-                writer.write(f)
+            with source:
+                fixed = self._rewrite(source)
+            pdf_cache.store(cache_key, fixed)
+            self._remember_url(download, cache_key)
+            self.sign_path = "rewrite"
+            self.close()
+            self.input_fixed_pdf = fixed
             return {"type": "success", "message": "Successfully converted PDF to signing mode."}
         except Exception as e:
             logger.exception("PDF conversion error")
             return {"type": "error", "message": f"Cannot convert PDF: {str(e)}"}
 
-    def sign_pdf(self):
-        # 1) Ensure certs exist in Vault; generate if missing
-        availability, missing = findCertAvailability(self.signer_email, vault_base_path=self.vault_base_path)
-        if availability is None:
-            return {"type": "error", "message": "Internal error checking cert availability."}
+    def _rewrite(self, source):
+        """Rebuild `source` page by page with PyPDF2 into a new spooled buffer."""
+        fixed = new_pdf_buffer(self._spill_dir())
+        try:
+            with stage("rewrite"):
+                reader = PdfReader(source)
+                writer = PdfWriter()
+                for page in reader.pages:
+                    writer.add_page(page)
+                writer.write(fixed)
+            fixed.seek(0)
+            return fixed
+        except Exception:
+            fixed.close()
+            raise
 
-        if not availability:
+    def _remember_url(self, download, cache_key):
+        if download is not None:
+            pdf_cache.remember_url(self.input_pdf_url, download.etag, download.last_modified, cache_key,
+                                   (self.signature_field_name,))
+
+    def load_credentials(self):
+        """Return (credentials, error); generates keys for a first-time signer."""
+        # 1) Load certs from the credential cache (one Vault read on a miss); generate if missing
+        try:
+            with stage("credentials"):
+                credentials, missing = load_signer_credentials(self.signer_email, vault_base_path=self.vault_base_path)
+        except Exception:
+            logger.exception("Failed to load signer credentials")
+            return None, {"type": "error", "message": "Internal error checking cert availability."}
+
+        if credentials is None:
             from ..controllers.keyManage_controller import generateKeys
             logger.info("Certs missing in Vault (%s). Generating keys: %s", self.signer_email, missing)
             gen_response, status = generateKeys()
             if isinstance(gen_response, tuple) and status != 201:
-                return {"type": "error", "message": "Failed to generate keys before signing."}
+                return None, {"type": "error", "message": "Failed to generate keys before signing."}
 
-        # 2) Load certs from Vault into temp files
+        # 2) Get the in-memory signer built from the cached key material
         try:
-            temp_paths = load_certs_from_vault_to_temp(self.signer_email, vault_base_path=self.vault_base_path)
-            private_key_path = temp_paths["private_key"]
-            cert_path = temp_paths["cert"]
-            ca_chain_paths = [temp_paths["ca_chain"]]
+            if credentials is None:
+                credentials, missing = load_signer_credentials(self.signer_email, vault_base_path=self.vault_base_path)
+                if credentials is None:
+                    raise FileNotFoundError(f"Missing {', '.join(missing)} in Vault for {self.signer_email}")
+            credentials.get_signer()
         except Exception as e:
-            logger.exception("Failed to load certs from Vault into temp files")
-            return {"type": "error", "message": f"Failed to load certs: {str(e)}"}
-
-        if not os.path.isfile(self.input_fixed_pdf):
-            # cleanup temp certs
-            removeUnWantedFiles(private_key_path)
-            removeUnWantedFiles(cert_path)
-            removeUnWantedFiles(ca_chain_paths[0])
+            logger.exception("Failed to load certs from Vault")
+            return None, {"type": "error", "message": f"Failed to load certs: {str(e)}"}
+
+        return credentials, None
+
+    def sign_to_buffer(self, credentials=None):
+        """
+        Sign the normalized PDF and return a BytesIO, or an error dict.
+        Pass credentials loaded up front to sign outside a request context.
+        """
+        if credentials is None:
+            credentials, error = self.load_credentials()
+            if error:
+                return error
+        pdfSigner = credentials.get_signer()
+
+        if self.input_fixed_pdf is None:
             return {"type": "error", "message": "PDF Not Found."}
 
         try:
-            pdfSigner = signers.SimpleSigner.load(
-                private_key_path,
-                cert_path,
-                ca_chain_files=ca_chain_paths
-            )
+            try:
+                signed_pdf_io = self._sign(pdfSigner)
+            except Exception:
+                # A cached entry may be an unmodified source too, so it gets the same fallback,
+                # unless rewriting would invalidate signatures already in the file
+                if self.sign_path not in ("direct", "cached") or has_signatures(self.input_fixed_pdf):
+                    raise
+                # The pre-check passed but pyHanko still refused the file: rebuild it once and retry
+                logger.warning("Direct signing failed for %s, rewriting", self.input_pdf_url, exc_info=True)
+                fixed = self._rewrite(self.input_fixed_pdf)
+                pdf_cache.store(self.cache_key, fixed)
+                self.close()
+                self.input_fixed_pdf = fixed
+                self.sign_path, self.rewrite_reason = "rewrite", "sign-failed"
+                signed_pdf_io = self._sign(pdfSigner)
 
-            with open(self.input_fixed_pdf, 'rb') as inf:
-                w = IncrementalPdfFileWriter(inf)
+            # Release the normalized source buffer after signing
+            self.close()
+            SIGNATURES.inc(path=self.sign_path or "unknown")
+            return signed_pdf_io
 
-                fields.append_signature_field(
-                    w,
-                    sig_field_spec=fields.SigFieldSpec(
-                        self.signature_field_name,
-                        box=self.signature_box
-                    )
-                )
+        except Exception as e:
+            logger.exception("Signing failed")
+            self.close()
+            return {"type": "error", "message": f"PDF signing failed: {str(e)}"}
 
-                meta = signers.PdfSignatureMetadata(
-                    field_name=self.signature_field_name,
-                    location=os.getenv("SIGN_LOCATION", "Uva Wellassa University"),
-                    contact_info=self.signer_email,
-                    name=self.signer_email,
-                    reason="Document Approval"
-                )
+    def _prepare_signing(self, pdfSigner):
+        """Incremental writer with the signature field added, and the PdfSigner for it."""
+        self.input_fixed_pdf.seek(0)
+        w = IncrementalPdfFileWriter(self.input_fixed_pdf)
+        # A second approver gets "Signature_2" rather than a rewrite of the first signature
+        self.signature_field_name = free_signature_field_name(w.root, self.signature_field_name)
+
+        fields.append_signature_field(
+            w,
+            sig_field_spec=fields.SigFieldSpec(
+                self.signature_field_name,
+                box=self.signature_box
+            )
+        )
 
-                stamp_text = f"Signed by: {self.signer_email}\nTime: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
+        meta = signers.PdfSignatureMetadata(
+            field_name=self.signature_field_name,
+            location=os.getenv("SIGN_LOCATION", "Uva Wellassa University"),
+            contact_info=self.signer_email,
+            name=self.signer_email,
+            reason="Document Approval"
+        )
 
-                pdf_signer = signers.PdfSigner(
-                    meta,
-                    signer=pdfSigner,
-                    stamp_style=stamp.TextStampStyle(
-                        stamp_text=stamp_text,
-                        background=images.PdfImage(self.stamp_image_path)
-                    )
-                )
+        stamp_text = f"Signed by: {self.signer_email}\nTime: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
 
-                signed_pdf_io = BytesIO()
-                pdf_signer.sign_pdf(w, output=signed_pdf_io)
-                signed_pdf_io.seek(0)
-
-            # Cleanup temp files after signing
-            removeUnWantedFiles(self.input_fixed_pdf)
-            if self.input_pdf_url.startswith("temp_download/") or self.input_pdf_url.startswith("temp_"):
-                removeUnWantedFiles(self.input_pdf_url)
-            removeUnWantedFiles(private_key_path)
-            removeUnWantedFiles(cert_path)
-            for ca in ca_chain_paths:
-                removeUnWantedFiles(ca)
-
-            # Return signed PDF as Flask response
-            return send_file(
-                signed_pdf_io,
-                mimetype='application/pdf',
-                as_attachment=True,
-                download_name='signed_document.pdf'
+        pdf_signer = signers.PdfSigner(
+            meta,
+            signer=pdfSigner,
+            stamp_style=stamp.TextStampStyle(
+                stamp_text=stamp_text,
+                # The image is decoded once per process; only the text is laid out here
+                background=StampBackground(get_stamp_image(self.stamp_image_path))
             )
+        )
+        return w, pdf_signer
 
-        except Exception as e:
-            logger.exception("Signing failed")
-            removeUnWantedFiles(private_key_path)
-            removeUnWantedFiles(cert_path)
-            for ca in ca_chain_paths:
-                removeUnWantedFiles(ca)
-            return {"type": "error", "message": f"PDF signing failed: {str(e)}"}
+    def _sign(self, pdfSigner):
+        w, pdf_signer = self._prepare_signing(pdfSigner)
+        signed_pdf_io = BytesIO()
+        with stage("sign"):
+            pdf_signer.sign_pdf(w, output=signed_pdf_io)
+        BYTES_PROCESSED.inc(signed_pdf_io.getbuffer().nbytes, kind="signed")
+        signed_pdf_io.seek(0)
+        return signed_pdf_io
+
+    def presign(self, credentials, output, bytes_reserved=None):
+        """
+        Phase one of deferred signing: add the field and stamp, reserve room
+        for the signature and write the prepared document to `output`.
+        Returns the PreparedByteRangeDigest and digest algorithm; the CMS
+        signature over `document_digest` can then be made anywhere.
+        """
+        if self.input_fixed_pdf is None:
+            raise ValueError("PDF Not Found.")
+        # Only the certificates are needed here; the private key is never touched
+        external_signer = signers.ExternalSigner(
+            signing_cert=credentials.signing_cert,
+            cert_registry=SimpleCertificateStore.from_certs(credentials.ca_chain),
+            signature_value=bytes(credentials.signing_cert.public_key.byte_size)
+        )
+        try:
+            w, pdf_signer = self._prepare_signing(external_signer)
+            with stage("presign"):
+                prepared_digest, tbs_document, _ = asyncio.run(pdf_signer.async_digest_doc_for_signing(
+                    w, bytes_reserved=bytes_reserved, output=output
+                ))
+            return prepared_digest, tbs_document.md_algorithm
+        finally:
+            self.close()
+
+    def sign_pdf(self):
+        signed_pdf_io = self.sign_to_buffer()
+        if isinstance(signed_pdf_io, dict):
+            return signed_pdf_io
+
+        # Return signed PDF as Flask response
+        response = send_file(
+            signed_pdf_io,
+            mimetype='application/pdf',
+            as_attachment=True,
+            download_name='signed_document.pdf'
+        )
+        response.headers.update(self.path_headers())
+        return response
+
+    def path_headers(self):
+        """Response headers describing how the source PDF was prepared."""
+        headers = {"X-PDF-Sign-Path": self.sign_path or "unknown"}
+        if self.cache_status:
+            headers["X-PDF-Cache"] = self.cache_status
+        if self.sign_path == "rewrite" and self.rewrite_reason:
+            headers["X-PDF-Rewrite-Reason"] = self.rewrite_reason
+        return headers
+
+    def close(self):
+        if self.input_fixed_pdf is not None:
+            self.input_fixed_pdf.close()
+            self.input_fixed_pdf = None
 
     def run(self):
         res1 = self.convert_to_standard_pdf()
@@ -160,3 +366,92 @@ class PDFDigitallySigner:
             return res1, None
         res2 = self.sign_pdf()
         return res1, res2
+
+
+def sign_document_in_worker(source, signer_email, secrets, signer_options=None):
+    """
+    Convert and sign one document in a worker process with the PEM `secrets`
+    the caller loaded (see SignerCredentials.pem_secrets), so the worker
+    never signs with keys rotated in another process. Returns a picklable
+    dict with the signed bytes; stage timings are recorded as metrics,
+    which run_in_process_pool hands back to the caller.
+    """
+    failed_stage = "convert"
+    with RequestWorkspace("sign") as workspace:
+        signer = PDFDigitallySigner(input_pdf_url=source, signer_email=signer_email,
+                                    workspace=workspace, **(signer_options or {}))
+        try:
+            result = signer.convert_to_standard_pdf()
+            if result["type"] != "error":
+                # A failed conversion is the caller's document; anything later is ours
+                failed_stage = "sign"
+                with stage("credentials"):
+                    credentials = credentials_from_pem(signer_email, secrets, signer.vault_base_path)
+                result = signer.sign_to_buffer(credentials)
+        finally:
+            signer.close()
+
+    outcome = {"headers": signer.path_headers()}
+    if isinstance(result, dict):
+        outcome.update(status="error", failed_stage=failed_stage, message=result["message"], code=result.get("code"),
+                       signed_pdf=None)
+    else:
+        outcome.update(status="success", message="Signed", signed_pdf=result.getvalue())
+    return outcome
+
+
+SIGN_BATCH_WORKERS = int(os.getenv("SIGN_BATCH_WORKERS", "4"))
+
+
+def sign_pdf_batch(sources, signer_email, credentials, workspace, stamp_image_path=None,
+                   max_workers=SIGN_BATCH_WORKERS, deadline=None, **signer_options):
+    """
+    Sign many PDFs for one signer, each on the "cpu" process pool (inline
+    when the pool is off), at most `max_workers` at a time.
+
+    `credentials` are loaded once by the caller and shared by every document.
+    Signed files are written into `workspace` instead of being held in
+    memory; each result dict carries its `signed_path`, in source order.
+    Documents not finished by `deadline` (a time.monotonic() value) fail on
+    their own, so a large batch still answers within the server's timeout.
+    """
+    secrets = credentials.pem_secrets()
+    if stamp_image_path is not None:
+        signer_options["stamp_image_path"] = stamp_image_path
+
+    def sign_one(index, source):
+        start = time.perf_counter()
+        item = {"index": index, "source": source, "sign_path": None, "signed_path": None}
+        remaining = None if deadline is None else deadline - time.monotonic()
+        try:
+            if remaining is not None and remaining <= 0:
+                raise TimeoutError("Batch time limit reached before this document was signed")
+            if CPU_POOL_ENABLED:
+                outcome, _ = run_in_process_pool(
+                    "cpu", sign_document_in_worker, source, signer_email, secrets, signer_options,
+                    max_workers=CPU_POOL_WORKERS,
+                    queue_timeout=PROCESS_POOL_QUEUE_TIMEOUT if remaining is None
+                    else min(PROCESS_POOL_QUEUE_TIMEOUT, remaining),
+                    timeout=PROCESS_POOL_TASK_TIMEOUT if remaining is None
+                    else min(PROCESS_POOL_TASK_TIMEOUT, remaining)
+                )
+            else:
+                outcome = sign_document_in_worker(source, signer_email, secrets, signer_options)
+        except (PoolQueueTimeout, TimeoutError) as e:
+            outcome = {"status": "error", "message": str(e), "headers": {}}
+        except Exception as e:
+            logger.exception("Batch item %s failed", index)
+            outcome = {"status": "error", "message": str(e), "headers": {}}
+
+        item["sign_path"] = outcome["headers"].get("X-PDF-Sign-Path")
+        if outcome["status"] == "success":
+            item["signed_path"] = workspace.file_path(f"{index:04d}_signed_document.pdf")
+            with open(item["signed_path"], "wb") as f:
+                f.write(outcome["signed_pdf"])
+        item.update(status=outcome["status"], message=outcome["message"],
+                    elapsed_ms=round((time.perf_counter() - start) * 1000, 2))
+        return item
+
+    workspace.open()
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        return list(pool.map(bind_request_timings(sign_one), range(len(sources)), sources))
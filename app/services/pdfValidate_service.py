@@ -1,89 +1,200 @@
 import os
-from pyhanko.keys import load_cert_from_pemder
+import time
+import logging
+import hvac
 from pyhanko_certvalidator import ValidationContext
 from pyhanko.pdf_utils.reader import PdfFileReader
-from pyhanko.sign.validation import validate_pdf_signature
+from pyhanko.sign.validation import SignatureCoverageLevel, validate_pdf_signature
+from ..dto.PDFSignatureInfo import PDFSignatureInfo
 
-from ..utils import (
-    genIdByEmail,
-    extract_name_from_pdf,
-    removeUnWantedFiles,
-    load_certs_from_vault_to_temp
-)
+from ..utils.fileUtills import removeUnWantedFiles, load_trust_roots, shared_ca_enabled
+from ..utils.credentialCache import validation_context_cache, CachedValidationContext
+from ..utils.workspace import RequestWorkspace
+from ..utils.metrics import stage, BYTES_PROCESSED
 
+logger = logging.getLogger(__name__)
 
-def save_uploaded_file(file):
-    """Save uploaded file to a local temp path."""
-    local_path = f"outputs/temp_uploaded_{genIdByEmail(file.filename)}.pdf"
-    file.save(local_path)
-    return local_path
 
+def save_uploaded_file(file, workspace):
+    """Save uploaded file (or raw PDF bytes) into the request's workspace."""
+    local_path = workspace.file_path("uploaded.pdf")
+    if isinstance(file, (bytes, bytearray)):
+        with open(local_path, "wb") as f:
+            f.write(file)
+    else:
+        file.save(local_path)
+    return local_path
 
-class PDFVerifier:
-    def __init__(self, signed_pdf_file):
-        """Initialize PDFVerifier with uploaded file."""
-        self.signed_pdf_path = save_uploaded_file(signed_pdf_file)
 
+def build_signature_info(sig, status, verbose=False, error=None) -> PDFSignatureInfo:
+    """Fill the DTO from pyHanko's status object; a signature with an error is never trusted."""
+    subject = status.signing_cert.subject.native
+    trust_anchor = None
+    if status.validation_path is not None:
+        trust_anchor = status.validation_path.trust_anchor.authority.name.human_friendly
+
+    return PDFSignatureInfo(
+        signer_email=subject.get("email_address"),
+        signer_common_name=subject.get("common_name"),
+        signer_organization=subject.get("organization_name"),
+        trust_anchor=trust_anchor,
+        is_trusted=bool(status.trusted) and error is None,
+        is_signature_valid=bool(status.intact and status.valid),
+        signature_mechanism=status.pkcs7_signature_mechanism,
+        signing_time=status.signer_reported_dt.isoformat() if status.signer_reported_dt else None,
+        covers_entire_file=status.coverage == SignatureCoverageLevel.ENTIRE_FILE,
+        bottom_line=f"The signature is judged {'' if status.bottom_line and error is None else 'IN'}VALID.",
+        field_name=str(sig.field_name),
+        byte_range=[int(offset) for offset in sig.byte_range],
+        # Rendering the full report is costly, so it is only done on request
+        details_text=status.pretty_print_details() if verbose else None,
+        error=error
+    )
+
+
+def load_known_trust_roots(signer_emails, vault_base_path="certs"):
+    """Return (trust roots, unknown emails): signers without roots in Vault are reported, not raised."""
+    found, unknown = {}, []
+    for email in dict.fromkeys(signer_emails):
+        # Without a shared CA an unnamed signature has no roots to look up
+        if email is None and not shared_ca_enabled():
+            continue
         try:
-            # Extract signer email from PDF
-            response = extract_name_from_pdf(self.signed_pdf_path)
+            roots = load_trust_roots(email, vault_base_path)
+        except (hvac.exceptions.InvalidPath, FileNotFoundError):
+            unknown.append(email)
+            continue
+        found[roots.signer_id] = roots
+    return list(found.values()), unknown
+
+
+def get_validation_context(signer_emails, vault_base_path="certs"):
+    """
+    Shared, pre-built ValidationContext trusting the roots of every known
+    signer given. Returns (context, unknown emails).
+    """
+    # Signers sharing an organizational CA collapse to a single trust root
+    trust_roots, unknown = load_known_trust_roots(signer_emails, vault_base_path)
+    # The KV version is part of the key, so rotated roots never reuse an old context
+    key = "+".join(sorted(f"{roots.signer_id}@{roots.version}" for roots in trust_roots))
+    cached = validation_context_cache.get(key, vault_base_path)
+    if cached is not None:
+        return cached.context, unknown
+
+    # An empty list trusts nothing; None would fall back to the OS trust store
+    vc = ValidationContext(
+        trust_roots=[roots.root_cert for roots in trust_roots],
+        other_certs=[cert for roots in trust_roots for cert in roots.ca_chain]
+    )
+    validation_context_cache.put(CachedValidationContext(signer_id=key, context=vc), vault_base_path)
+    return vc, unknown
 
-            if not isinstance(response, dict):
-                raise ValueError("Invalid response format from extract_name_from_pdf.")
 
-            if response.get("error"):
-                raise ValueError(response.get("message") or "Signer information not found.")
+class PDFVerifier:
+    def __init__(self, signed_pdf_file, workspace=None):
+        """Initialize PDFVerifier with uploaded file."""
+        # Without a caller-owned workspace the verifier owns one and removes it when done
+        self.owns_workspace = workspace is None
+        self.workspace = workspace if workspace is not None else RequestWorkspace("validate")
+        self.signed_pdf_path = save_uploaded_file(signed_pdf_file, self.workspace)
+        self.vault_base_path = "certs"
+        self._doc = None
 
-            self.signer_email = response.get("message")
-            if not self.signer_email:
-                raise ValueError("No signer email found in PDF.")
+        try:
+            # Parse the PDF once; every signature and its signer come from this reader
+            self._doc = open(self.signed_pdf_path, "rb")
+            BYTES_PROCESSED.inc(os.fstat(self._doc.fileno()).st_size, kind="validated")
+            with stage("parse"):
+                self.reader = PdfFileReader(self._doc)
+                self.signatures = self.reader.embedded_signatures
+
+            if not self.signatures:
+                raise ValueError("No embedded digital signature found in the PDF.")
+            # Signatures without a /Name are validated too, as signed by an unknown signer
+            self.signer_emails = [self.signer_email_of(sig) for sig in self.signatures]
 
         except Exception as e:
-            self.safe_cleanup(self.signed_pdf_path)
-            raise RuntimeError(f"Failed to extract signer email: {e}")
+            self.cleanup()
+            if isinstance(e, ValueError):
+                raise
+            raise RuntimeError(f"Failed to read signatures from PDF: {e}")
 
-        self.unique_id = genIdByEmail(self.signer_email)
-        self.vault_base_path = "certs"
+    @staticmethod
+    def signer_email_of(sig):
+        name = sig.sig_object.get("/Name")
+        return str(name) if name else None
 
-    def load_root_cert(self):
+    def load_root_cert(self, signer_email):
         """Load root CA cert from Vault."""
         try:
-            temp_paths = load_certs_from_vault_to_temp(self.signer_email)
-            # ca_chain_path = temp_paths.get("ca_chain")
-            cert_path = temp_paths.get("root_cert")
-
-            if not cert_path:
-                raise FileNotFoundError("CA chain certificate not found in Vault.")
-
-            root_cert = load_cert_from_pemder(cert_path)
-
-            # Clean up temporary CA chain file
-            self.safe_cleanup(cert_path)
-            return root_cert
-
+            return load_trust_roots(signer_email, self.vault_base_path).root_cert
         except Exception as e:
             raise RuntimeError(f"Failed to load root cert from Vault: {e}")
 
-    def validate_signature(self):
-        """Validate the PDF's digital signature."""
-        root_cert = self.load_root_cert()
-        vc = ValidationContext(trust_roots=[root_cert])
-
-        with open(self.signed_pdf_path, "rb") as doc:
-            reader = PdfFileReader(doc)
-            if not reader.embedded_signatures:
-                raise ValueError("No embedded digital signature found in the PDF.")
-
-            sig = reader.embedded_signatures[0]
-            return validate_pdf_signature(sig, vc, skip_diff=True)
+    def build_validation_contexts(self):
+        """
+        {signer email: (context, unknown emails)} with one ValidationContext per
+        signer, trusting only that signer's roots, so a signature cannot be
+        trusted through another signer's CA.
+        """
+        try:
+            return {
+                email: get_validation_context([email], self.vault_base_path)
+                for email in dict.fromkeys(self.signer_emails)
+            }
+        except Exception as e:
+            raise RuntimeError(f"Failed to load root cert from Vault: {e}")
 
-    def print_signature_status(self):
-        """Run validation and return human-readable result."""
+    def validate_signatures(self):
+        """
+        Validate every embedded signature on its own. Returns (signature,
+        status, error) triples; status is None when the signature could not
+        be checked at all, and error says why it cannot be trusted.
+        """
+        with stage("trust_roots"):
+            contexts = self.build_validation_contexts()
+        results = []
+        with stage("validate"):
+            for sig, email in zip(self.signatures, self.signer_emails):
+                vc, unknown = contexts[email]
+                if email is None:
+                    error = "Unknown signer: the signature names no signer"
+                elif email in unknown:
+                    error = f"Unknown signer: no trust root in Vault for {email}"
+                else:
+                    error = None
+                try:
+                    status = validate_pdf_signature(sig, vc, skip_diff=True)
+                except Exception as e:
+                    logger.warning("Signature %s could not be validated: %s", sig.field_name, e)
+                    status, error = None, f"Signature could not be validated: {e}"
+                results.append((sig, status, error))
+        return results
+
+    def signature_infos(self, verbose=False):
+        """Run validation and return one PDFSignatureInfo per signature."""
         try:
-            status = self.validate_signature()
-            return status.pretty_print_details()
+            return [
+                build_signature_info(sig, status, verbose, error) if status is not None
+                else PDFSignatureInfo(
+                    signer_email=email,
+                    field_name=str(sig.field_name),
+                    bottom_line="The signature is judged INVALID.",
+                    error=error
+                )
+                for (sig, status, error), email in zip(self.validate_signatures(), self.signer_emails)
+            ]
         finally:
-            self.safe_cleanup(self.signed_pdf_path)
+            self.cleanup()
+
+    def cleanup(self):
+        """Remove the saved upload, and the workspace if the verifier created it."""
+        if self._doc is not None:
+            self._doc.close()
+            self._doc = None
+        self.safe_cleanup(self.signed_pdf_path)
+        if self.owns_workspace:
+            self.workspace.cleanup()
 
     @staticmethod
     def safe_cleanup(path):
@@ -92,3 +203,23 @@ class PDFVerifier:
             removeUnWantedFiles(path)
         except Exception as cleanup_err:
             print(f"[WARNING] Failed to remove temp file {path}: {cleanup_err}")
+
+
+def validate_pdf_bytes(pdf_bytes, filename, verbose=False):
+    """
+    Validate one PDF given as bytes. Runs in a worker process, so it only
+    takes and returns picklable values.
+    """
+    start = time.perf_counter()
+    result = {"filename": filename}
+    try:
+        with RequestWorkspace("validate") as workspace:
+            verifier = PDFVerifier(signed_pdf_file=pdf_bytes, workspace=workspace)
+            infos = verifier.signature_infos(verbose)
+            result.update(status="success", signatures=[info.to_dict() for info in infos])
+    except ValueError as e:
+        result.update(status="failed", error=str(e))
+    except Exception as e:
+        result.update(status="error", error=str(e))
+    result["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 2)
+    return result
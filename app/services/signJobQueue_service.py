@@ -0,0 +1,345 @@
+import os
+import time
+import uuid
+import sqlite3
+import threading
+import logging
+import hvac
+import requests
+from contextlib import contextmanager
+from ..utils.workspace import RequestWorkspace
+from ..utils.fileUtills import load_signer_credentials
+from ..utils.metrics import gauge
+from .pdfDigitallySign_service import PDFDigitallySigner
+
+logger = logging.getLogger(__name__)
+
+# "memory" only suits a single process; gunicorn.conf.py defaults to "sqlite"
+SIGN_JOB_BACKEND = os.getenv("SIGN_JOB_BACKEND", "memory")
+SIGN_JOB_DB = os.getenv("SIGN_JOB_DB", os.path.join("instance", "sign_jobs.sqlite"))
+SIGN_JOB_WORKERS = int(os.getenv("SIGN_JOB_WORKERS", "2"))
+SIGN_JOB_MAX_RETRIES = int(os.getenv("SIGN_JOB_MAX_RETRIES", "2"))
+SIGN_JOB_RETRY_DELAY = float(os.getenv("SIGN_JOB_RETRY_DELAY", "5"))
+SIGN_JOB_RESULT_TTL = float(os.getenv("SIGN_JOB_RESULT_TTL", "3600"))
+# A job still 'running' this long after its last update lost its worker and is claimed again
+SIGN_JOB_LEASE = float(os.getenv("SIGN_JOB_LEASE", "600"))
+# How often a running job refreshes its lease, so a slow but live job is never claimed twice
+SIGN_JOB_HEARTBEAT = float(os.getenv("SIGN_JOB_HEARTBEAT", str(SIGN_JOB_LEASE / 4)))
+
+JOB_FIELDS = ("id", "signer_email", "pdf_url", "status", "attempts", "error",
+              "result", "created_at", "updated_at", "available_at")
+
+
+class TransientJobError(Exception):
+    """A failure that may succeed on retry, e.g. the PDF host was unreachable."""
+
+
+# Worth retrying: the network, or Vault being unavailable. Bad URLs, invalid
+# PDFs and missing credentials fail the same way every time.
+TRANSIENT_ERRORS = (
+    TransientJobError,
+    requests.ConnectionError,
+    requests.Timeout,
+    hvac.exceptions.VaultDown,
+    hvac.exceptions.InternalServerError,
+    hvac.exceptions.BadGateway,
+    hvac.exceptions.RateLimitExceeded,
+    TimeoutError,
+)
+
+
+def new_job(signer_email, pdf_url):
+    now = time.time()
+    return {
+        "id": uuid.uuid4().hex, "signer_email": signer_email, "pdf_url": pdf_url,
+        "status": "pending", "attempts": 0, "error": None, "result": None,
+        "created_at": now, "updated_at": now, "available_at": now,
+    }
+
+
+class InMemoryJobStore:
+    """Jobs live in this process only; lost on restart."""
+
+    def __init__(self):
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def add(self, job):
+        with self._lock:
+            self._jobs[job["id"]] = dict(job)
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def update(self, job_id, **fields):
+        with self._lock:
+            self._jobs[job_id].update(fields, updated_at=time.time())
+
+    def touch(self, job_id, attempts):
+        """Renew the lease of a running job, unless another worker has claimed it since."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job and job["status"] == "running" and job["attempts"] == attempts:
+                job["updated_at"] = time.time()
+
+    def claim(self, lease=SIGN_JOB_LEASE):
+        """Atomically move the oldest runnable pending (or lease-expired running) job to running."""
+        now = time.time()
+        with self._lock:
+            runnable = [job for job in self._jobs.values()
+                        if (job["status"] == "pending" and job["available_at"] <= now)
+                        or (job["status"] == "running" and job["updated_at"] < now - lease)]
+            if not runnable:
+                return None
+            job = min(runnable, key=lambda j: j["created_at"])
+            job.update(status="running", attempts=job["attempts"] + 1, updated_at=now)
+            return dict(job)
+
+    def counts(self):
+        with self._lock:
+            counts = {}
+            for job in self._jobs.values():
+                counts[job["status"]] = counts.get(job["status"], 0) + 1
+            return counts
+
+    def purge(self, older_than):
+        with self._lock:
+            for job_id in [job_id for job_id, job in self._jobs.items()
+                           if job["status"] in ("done", "failed") and job["updated_at"] < older_than]:
+                del self._jobs[job_id]
+
+
+class SQLiteJobStore:
+    """Jobs persisted in a local SQLite file, shared by every worker process on the host."""
+
+    def __init__(self, path=SIGN_JOB_DB):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sign_jobs ("
+                "id TEXT PRIMARY KEY, signer_email TEXT, pdf_url TEXT, status TEXT, attempts INTEGER, "
+                "error TEXT, result BLOB, created_at REAL, updated_at REAL, available_at REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS sign_jobs_status ON sign_jobs (status, available_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS sign_jobs_lease ON sign_jobs (status, updated_at)")
+
+    def _open(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    @contextmanager
+    def _connect(self):
+        conn = self._open()
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def add(self, job):
+        with self._connect() as conn:
+            conn.execute(
+                f"INSERT INTO sign_jobs ({', '.join(JOB_FIELDS)}) VALUES ({', '.join('?' * len(JOB_FIELDS))})",
+                [job[field] for field in JOB_FIELDS]
+            )
+
+    def get(self, job_id):
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM sign_jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def update(self, job_id, **fields):
+        fields["updated_at"] = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                f"UPDATE sign_jobs SET {', '.join(f'{name} = ?' for name in fields)} WHERE id = ?",
+                [*fields.values(), job_id]
+            )
+
+    def touch(self, job_id, attempts):
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE sign_jobs SET updated_at = ? WHERE id = ? AND status = 'running' AND attempts = ?",
+                (time.time(), job_id, attempts)
+            )
+
+    def claim(self, lease=SIGN_JOB_LEASE):
+        now = time.time()
+        conn = self._open()
+        try:
+            # IMMEDIATE takes the write lock up front so two processes never claim the same job
+            conn.execute("BEGIN IMMEDIATE")
+            # Rows left 'running' by a crashed process are reclaimed once their lease runs out
+            row = conn.execute(
+                "SELECT * FROM sign_jobs WHERE (status = 'pending' AND available_at <= ?) "
+                "OR (status = 'running' AND updated_at < ?) ORDER BY created_at LIMIT 1", (now, now - lease)
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "UPDATE sign_jobs SET status = 'running', attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                (now, row["id"])
+            )
+            conn.execute("COMMIT")
+            job = dict(row)
+            job.update(status="running", attempts=job["attempts"] + 1)
+            return job
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def counts(self):
+        with self._connect() as conn:
+            rows = conn.execute("SELECT status, COUNT(*) FROM sign_jobs GROUP BY status").fetchall()
+        return {status: count for status, count in rows}
+
+    def purge(self, older_than):
+        with self._connect() as conn:
+            conn.execute(
+                "DELETE FROM sign_jobs WHERE status IN ('done', 'failed') AND updated_at < ?", (older_than,)
+            )
+
+
+class SignJobQueue:
+    """
+    Runs sign jobs on a fixed number of worker threads (the concurrency
+    limit). Attempts that failed on a transient error are retried up to
+    `max_retries` times after `retry_delay` seconds; other failures are final.
+    A running job renews its lease every `heartbeat` seconds.
+    """
+
+    def __init__(self, store, workers=SIGN_JOB_WORKERS, max_retries=SIGN_JOB_MAX_RETRIES,
+                 retry_delay=SIGN_JOB_RETRY_DELAY, stamp_image_path=None, heartbeat=SIGN_JOB_HEARTBEAT):
+        self.store = store
+        self.workers = workers
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.heartbeat = heartbeat
+        self.stamp_image_path = stamp_image_path
+        self._wakeup = threading.Condition()
+        self._threads = []
+        self._lock = threading.Lock()
+        self.retries = 0
+
+    def start(self):
+        with self._lock:
+            if self._threads:
+                return
+            for index in range(max(1, self.workers)):
+                thread = threading.Thread(target=self._worker, name=f"sign-job-{index}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, signer_email, pdf_url):
+        self.start()
+        job = new_job(signer_email, pdf_url)
+        self.store.add(job)
+        with self._wakeup:
+            self._wakeup.notify()
+        return job["id"]
+
+    def get(self, job_id):
+        self.store.purge(time.time() - SIGN_JOB_RESULT_TTL)
+        return self.store.get(job_id)
+
+    def _worker(self):
+        while True:
+            job = self.store.claim()
+            if job is None:
+                # Poll as well, so jobs queued by other processes (SQLite) or waiting out a retry delay get picked up
+                with self._wakeup:
+                    self._wakeup.wait(timeout=1.0)
+                continue
+            if job["attempts"] > self.max_retries + 1:
+                # Reclaimed after its worker died more often than it may be retried
+                self.store.update(job["id"], status="failed",
+                                  error=job["error"] or "Sign job was abandoned by its worker")
+                continue
+            self._run(job)
+
+    def _keep_lease(self, job, finished):
+        while not finished.wait(self.heartbeat):
+            try:
+                self.store.touch(job["id"], job["attempts"])
+            except Exception:
+                logger.warning("Could not renew the lease of sign job %s", job["id"], exc_info=True)
+
+    def _run(self, job):
+        workspace = RequestWorkspace("job")
+        signer = PDFDigitallySigner(
+            input_pdf_url=job["pdf_url"],
+            signer_email=job["signer_email"],
+            stamp_image_path=self.stamp_image_path,
+            workspace=workspace
+        )
+        finished = threading.Event()
+        threading.Thread(target=self._keep_lease, args=(job, finished),
+                         name=f"sign-job-lease-{job['id'][:8]}", daemon=True).start()
+        try:
+            result = signer.convert_to_standard_pdf()
+            if result["type"] != "error":
+                credentials, missing = load_signer_credentials(job["signer_email"], signer.vault_base_path)
+                if credentials is None:
+                    raise RuntimeError(f"Missing {', '.join(missing)} in Vault for {job['signer_email']}")
+                result = signer.sign_to_buffer(credentials)
+            if isinstance(result, dict):
+                raise (TransientJobError if result.get("retryable") else RuntimeError)(result["message"])
+            self.store.update(job["id"], status="done", error=None, result=result.getvalue())
+        except Exception as e:
+            logger.exception("Sign job %s failed (attempt %s)", job["id"], job["attempts"])
+            if isinstance(e, TRANSIENT_ERRORS) and job["attempts"] <= self.max_retries:
+                with self._lock:
+                    self.retries += 1
+                self.store.update(job["id"], status="pending", error=str(e),
+                                  available_at=time.time() + self.retry_delay)
+            else:
+                self.store.update(job["id"], status="failed", error=str(e))
+        finally:
+            finished.set()
+            signer.close()
+            workspace.cleanup()
+
+    def stats(self):
+        counts = self.store.counts()
+        with self._lock:
+            retries = self.retries
+        return {
+            "backend": type(self.store).__name__,
+            "workers": self.workers,
+            "queue_depth": counts.get("pending", 0),
+            "running": counts.get("running", 0),
+            "done": counts.get("done", 0),
+            "failed": counts.get("failed", 0),
+            "retries": retries,
+        }
+
+
+_sign_job_queue = None
+_sign_job_queue_lock = threading.Lock()
+
+
+def get_sign_job_queue():
+    global _sign_job_queue
+    if _sign_job_queue is None:
+        with _sign_job_queue_lock:
+            if _sign_job_queue is None:
+                store = SQLiteJobStore() if SIGN_JOB_BACKEND == "sqlite" else InMemoryJobStore()
+                _sign_job_queue = SignJobQueue(store)
+    return _sign_job_queue
+
+
+def _job_queue_states():
+    # Reported once the queue exists; a scrape should not start its workers
+    if _sign_job_queue is None:
+        return {}
+    stats = _sign_job_queue.stats()
+    return {("queued",): stats["queue_depth"], ("running",): stats["running"]}
+
+
+gauge("sign_jobs", "Async sign jobs waiting or running.", _job_queue_states, ("state",))
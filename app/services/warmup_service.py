@@ -0,0 +1,150 @@
+import os
+import time
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from ..utils.processPool import CPU_POOL_ENABLED, CPU_POOL_WORKERS, preload_modules, warm_process_pool
+
+logger = logging.getLogger(__name__)
+
+# Signers whose credentials and trust roots are loaded before the worker reports ready
+WARMUP_SIGNERS = [email.strip() for email in os.getenv("WARMUP_SIGNERS", "").split(",") if email.strip()]
+# Vault connections opened up front (bounded by VAULT_POOL_SIZE)
+WARMUP_VAULT_CONNECTIONS = int(os.getenv("WARMUP_VAULT_CONNECTIONS", "2"))
+# Loaded lazily by the routes; imported here (or before fork by gunicorn.conf.py)
+APP_MODULES = (
+    "app.controllers.documentSign_controller",
+    "app.controllers.documentValidate_controller",
+    "app.controllers.keyManage_controller",
+    "app.controllers.documentHandle_controller",
+)
+
+
+class WarmupState:
+    """
+    Progress of the per-process warm-up. A failed step is logged and
+    reported but does not block readiness; the work it would have done
+    simply happens on the first request instead.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.steps = {}
+        self.started_at = None
+        self.finished_at = None
+
+    def begin(self):
+        with self._lock:
+            if self.started_at is not None:
+                return False
+            self.started_at = time.time()
+            return True
+
+    def record(self, name, status, elapsed_ms, error=None):
+        with self._lock:
+            self.steps[name] = {"status": status, "ms": round(elapsed_ms, 2), "error": error}
+
+    def finish(self):
+        with self._lock:
+            self.finished_at = time.time()
+
+    @property
+    def ready(self):
+        return self.finished_at is not None
+
+    def to_dict(self):
+        with self._lock:
+            failed = [name for name, step in self.steps.items() if step["status"] == "failed"]
+            if self.finished_at is None:
+                status = "warming" if self.started_at is not None else "not-started"
+            else:
+                status = "degraded" if failed else "ready"
+            return {
+                "status": status,
+                "pid": os.getpid(),
+                "elapsed_s": round((self.finished_at or time.time()) - self.started_at, 3) if self.started_at else 0.0,
+                "steps": {name: dict(step) for name, step in self.steps.items()},
+            }
+
+
+warmup_state = WarmupState()
+
+
+# Each step imports what it warms, so /health and /ready stay light
+
+
+def _warm_stamps():
+    from ..utils.signerProfile import profile_stamp_paths
+    from ..utils.stampCache import preload_stamps
+    preload_stamps(profile_stamp_paths())
+
+
+def _warm_vault():
+    from ..utils.vaultClient import vault_call
+    with ThreadPoolExecutor(max_workers=max(1, WARMUP_VAULT_CONNECTIONS)) as pool:
+        authenticated = list(pool.map(
+            lambda _: vault_call("warmup", lambda client: client.is_authenticated()),
+            range(max(1, WARMUP_VAULT_CONNECTIONS))
+        ))
+    if not all(authenticated):
+        raise EnvironmentError("Vault authentication failed")
+
+
+def _warm_credentials():
+    from ..utils.fileUtills import load_signer_credentials, load_trust_roots
+    for email in WARMUP_SIGNERS:
+        _, missing = load_signer_credentials(email)
+        if missing:
+            logger.warning("Warm-up: %s is missing %s", email, ", ".join(missing))
+            continue
+        load_trust_roots(email)
+
+
+def _start_key_pool():
+    from .keyPool_service import key_pool
+    key_pool.start()
+
+
+def _warm_process_pool():
+    if CPU_POOL_ENABLED:
+        warm_process_pool("cpu", CPU_POOL_WORKERS)
+
+
+WARMUP_STEPS = (
+    ("imports", lambda: preload_modules(APP_MODULES)),
+    ("stamps", _warm_stamps),
+    ("vault", _warm_vault),
+    ("credentials", _warm_credentials),
+    ("process_pool", _warm_process_pool),
+    # Last, so background key generation does not slow the pool's start-up
+    ("key_pool", _start_key_pool),
+)
+
+
+def warm_up():
+    """
+    Run every warm-up step in this process. Call it once per worker, after
+    any fork: sockets, threads and process pools do not survive a fork.
+    """
+    if not warmup_state.begin():
+        return warmup_state.to_dict()
+    for name, step in WARMUP_STEPS:
+        start = time.perf_counter()
+        try:
+            step()
+        except Exception as e:
+            logger.exception("Warm-up step %s failed", name)
+            warmup_state.record(name, "failed", (time.perf_counter() - start) * 1000, str(e))
+        else:
+            warmup_state.record(name, "ok", (time.perf_counter() - start) * 1000)
+    warmup_state.finish()
+    summary = warmup_state.to_dict()
+    logger.info("Warm-up %s in %ss", summary["status"], summary["elapsed_s"])
+    return summary
+
+
+def start_warm_up():
+    """Warm up on a background thread so health checks are answered meanwhile."""
+    thread = threading.Thread(target=warm_up, name="warm-up", daemon=True)
+    thread.start()
+    return thread
@@ -1,5 +1,28 @@
-from .jwtTokenHandler import *
-from .getDetailsFromValidateToken import *
-from .generateIdByEmail import *
-from .fileUtills import *
-from .pdfMetaDataExtractor import *
+from .lazyModule import lazy_exports
+
+# Submodules are imported on first attribute access instead of all at once,
+# so importing one helper does not load pyHanko, hvac and PyPDF2 for it.
+# Code inside the app imports from the submodule directly.
+__getattr__ = lazy_exports(__name__, {
+    "jwtTokenHandler": ("VerifiedTokenCache", "token_cache", "bearer_token", "jwtTokenValidator"),
+    "getDetailsFromValidateToken": ("tokenData", "getTokenData"),
+    "generateIdByEmail": ("genIdByEmail",),
+    "vaultClient": ("get_vault_client", "reset_vault_client", "vault_call", "read_secret", "read_secret_metadata",
+                    "write_secret", "vault_stats"),
+    "credentialCache": ("SignerCredentials", "TrustRoots", "CachedValidationContext", "CredentialCache",
+                        "credential_cache", "trust_root_cache", "validation_context_cache", "invalidate_signer"),
+    "fileUtills": ("checkFileAvailability", "removeUnWantedFiles", "new_pdf_buffer", "findCertAvailability",
+                   "load_certs_from_vault", "load_cert_from_vault", "shared_ca_enabled", "load_org_ca",
+                   "reset_org_ca", "secret_version", "load_trust_roots", "load_signer_credentials",
+                   "credentials_from_pem"),
+    "pdfDownloader": ("DownloadedPdf", "PdfDownloader", "pdf_downloader", "download_pdf_to_buffer",
+                      "download_pdf_from_url"),
+    "pdfCache": ("UrlEntry", "sha256_of_file", "variant_key", "NormalizedPdfCache", "pdf_cache"),
+    "pdfPrecheck": ("free_signature_field_name", "has_signatures", "precheck_pdf"),
+    "signerProfile": ("SignerProfile", "get_signer_profile", "profile_stamp_paths"),
+    "stampCache": ("EncodedStampImage", "StampBackground", "get_stamp_image", "preload_stamps"),
+    "pdfMetaDataExtractor": ("extract_name_from_pdf",),
+    "workspace": ("RequestWorkspace",),
+    "processPool": ("PoolQueueTimeout", "preload_modules", "get_process_pool", "warm_process_pool",
+                    "run_in_process_pool", "submit_to_process_pool", "shutdown_process_pools"),
+})
@@ -0,0 +1,234 @@
+import os
+import time
+import threading
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from asn1crypto import keys, x509
+from cryptography import x509 as crypto_x509
+from cryptography.hazmat.primitives import serialization
+from pyhanko.keys import load_certs_from_pemder_data, load_private_key_from_pemder_data
+from pyhanko.sign import signers
+from pyhanko_certvalidator.registry import SimpleCertificateStore
+from .metrics import counter, gauge
+
+logger = logging.getLogger(__name__)
+
+CACHE_LOOKUPS = counter("credential_cache_lookups", "Credential, trust root and validation context cache lookups.",
+                        ("cache", "result"))
+
+# Secrets needed to sign and to build the trust root for a signer
+SIGNER_SECRET_NAMES = ("private_key", "cert", "ca_chain", "root_cert")
+
+
+class MismatchedCredentials(ValueError):
+    """The key, cert and chain read from Vault belong to different key generations."""
+
+
+def check_signing_material(signing_key, signing_cert, ca_chain, root_cert):
+    """
+    Raise MismatchedCredentials unless the key belongs to the cert, the cert
+    was issued by ca_chain[0] and the chain ends in the root. Secrets are
+    read one at a time, so a read racing a rotation can mix generations.
+    """
+    private_key = serialization.load_der_private_key(signing_key.dump(), password=None)
+    public_key = private_key.public_key().public_bytes(
+        serialization.Encoding.DER, serialization.PublicFormat.SubjectPublicKeyInfo
+    )
+    if public_key != signing_cert.public_key.dump():
+        raise MismatchedCredentials("Private key does not match the signer certificate")
+    if not ca_chain or ca_chain[-1].dump() != root_cert.dump():
+        raise MismatchedCredentials("CA chain does not end in the root certificate")
+    try:
+        crypto_x509.load_der_x509_certificate(signing_cert.dump()).verify_directly_issued_by(
+            crypto_x509.load_der_x509_certificate(ca_chain[0].dump())
+        )
+    except Exception as e:
+        raise MismatchedCredentials(f"Signer certificate was not issued by the CA chain: {e}")
+
+
+@dataclass
+class SignerCredentials:
+    signer_id: str
+    private_key_pem: str
+    cert_pem: str
+    ca_chain_pem: str
+    root_cert_pem: str
+    signing_key: keys.PrivateKeyInfo = field(repr=False)
+    signing_cert: x509.Certificate = field(repr=False)
+    ca_chain: List[x509.Certificate] = field(repr=False)
+    root_cert: x509.Certificate = field(repr=False)
+    # KV version of the last secret a rotation writes; None when handed over by another process
+    version: Optional[int] = None
+    loaded_at: float = field(default_factory=time.monotonic)
+    _signer: Optional[signers.SimpleSigner] = field(default=None, init=False, repr=False)
+    _signer_lock: threading.Lock = field(default_factory=threading.Lock, init=False, repr=False)
+
+    @classmethod
+    def from_pem(cls, signer_id, secrets, version=None):
+        """
+        Parse the PEM secrets read from Vault into signing material. Raises
+        MismatchedCredentials when they do not belong together.
+        """
+        root_certs = list(load_certs_from_pemder_data(secrets["root_cert"].encode("utf-8")))
+        if len(root_certs) != 1:
+            raise ValueError(f"Expected exactly one root cert for {signer_id}")
+        credentials = cls(
+            signer_id=signer_id,
+            private_key_pem=secrets["private_key"],
+            cert_pem=secrets["cert"],
+            ca_chain_pem=secrets["ca_chain"],
+            root_cert_pem=secrets["root_cert"],
+            signing_key=load_private_key_from_pemder_data(secrets["private_key"].encode("utf-8"), passphrase=None),
+            signing_cert=next(load_certs_from_pemder_data(secrets["cert"].encode("utf-8"))),
+            ca_chain=list(load_certs_from_pemder_data(secrets["ca_chain"].encode("utf-8"))),
+            root_cert=root_certs[0],
+            version=version,
+        )
+        check_signing_material(credentials.signing_key, credentials.signing_cert,
+                               credentials.ca_chain, credentials.root_cert)
+        return credentials
+
+    def pem_secrets(self):
+        """The PEM secrets these credentials were parsed from, e.g. to hand to a pool worker."""
+        return {
+            "private_key": self.private_key_pem,
+            "cert": self.cert_pem,
+            "ca_chain": self.ca_chain_pem,
+            "root_cert": self.root_cert_pem,
+        }
+
+    def get_signer(self) -> signers.SimpleSigner:
+        """Build the pyHanko signer once from the in-memory key material."""
+        if self._signer is None:
+            with self._signer_lock:
+                if self._signer is None:
+                    self._signer = signers.SimpleSigner(
+                        signing_cert=self.signing_cert,
+                        signing_key=self.signing_key,
+                        cert_registry=SimpleCertificateStore.from_certs(self.ca_chain)
+                    )
+        return self._signer
+
+
+@dataclass
+class TrustRoots:
+    """Public material needed to verify a signer: root cert and CA chain only."""
+    signer_id: str
+    root_cert: x509.Certificate = field(repr=False)
+    ca_chain: List[x509.Certificate] = field(repr=False)
+    # KV version of the signer's ca_chain when read; None for the organizational CA
+    version: Optional[int] = None
+    loaded_at: float = field(default_factory=time.monotonic)
+
+
+@dataclass
+class CachedValidationContext:
+    signer_id: str  # "+"-joined signer ids and KV versions the context trusts
+    context: object = field(repr=False)
+    loaded_at: float = field(default_factory=time.monotonic)
+
+
+class CredentialCache:
+    """
+    Process-wide TTL/LRU cache of signer credentials keyed by signer id.
+
+    Entries are only invalidated in the process that rotates the keys.
+    Other processes compare an entry's KV version with Vault's on a hit
+    (see load_signer_credentials and load_trust_roots), and pool workers
+    are handed the caller's PEM secrets (see credentials_from_pem).
+    """
+
+    def __init__(self, name, ttl=300, maxsize=256):
+        self.name = name
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(signer_id, vault_base_path):
+        return f"{vault_base_path}/{signer_id}"
+
+    def get(self, signer_id, vault_base_path="certs") -> Optional[SignerCredentials]:
+        key = self._key(signer_id, vault_base_path)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry.loaded_at < self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                CACHE_LOOKUPS.inc(cache=self.name, result="hit")
+                return entry
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            CACHE_LOOKUPS.inc(cache=self.name, result="miss")
+            return None
+
+    def put(self, credentials: SignerCredentials, vault_base_path="certs"):
+        key = self._key(credentials.signer_id, vault_base_path)
+        with self._lock:
+            self._entries[key] = credentials
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, signer_id, vault_base_path="certs"):
+        with self._lock:
+            removed = self._entries.pop(self._key(signer_id, vault_base_path), None)
+        if removed is not None:
+            logger.debug("Invalidated cached credentials for %s", signer_id)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+
+credential_cache = CredentialCache(
+    "credentials",
+    ttl=float(os.getenv("CREDENTIAL_CACHE_TTL", "300")),
+    maxsize=int(os.getenv("CREDENTIAL_CACHE_SIZE", "256"))
+)
+
+trust_root_cache = CredentialCache(
+    "trust_roots",
+    ttl=float(os.getenv("TRUST_ROOT_CACHE_TTL", "600")),
+    maxsize=int(os.getenv("TRUST_ROOT_CACHE_SIZE", "1024"))
+)
+
+# A ValidationContext pins its validation time when built, so keep these short-lived
+validation_context_cache = CredentialCache(
+    "validation_context",
+    ttl=float(os.getenv("VALIDATION_CONTEXT_TTL", "60")),
+    maxsize=int(os.getenv("VALIDATION_CONTEXT_CACHE_SIZE", "256"))
+)
+
+
+gauge("credential_cache_entries", "Entries held per credential cache.",
+      lambda: {(cache.name,): cache.stats()["size"]
+               for cache in (credential_cache, trust_root_cache, validation_context_cache)},
+      ("cache",))
+
+
+def invalidate_signer(signer_id, vault_base_path="certs"):
+    """Drop everything cached for a signer after its keys change."""
+    credential_cache.invalidate(signer_id, vault_base_path)
+    trust_root_cache.invalidate(signer_id, vault_base_path)
+    # Contexts may trust several signers at once; rotation is rare, so drop them all
+    validation_context_cache.clear()
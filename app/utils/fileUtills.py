@@ -1,25 +1,31 @@
 import os
-import requests
-import uuid
+import time
 import tempfile
 import hvac
 import logging
-from firebase_admin import storage
+import threading
+from pyhanko.keys import load_certs_from_pemder_data
 from .generateIdByEmail import genIdByEmail
+from .vaultClient import read_secret, read_secret_metadata
+from .metrics import stage
+from .credentialCache import (
+    SIGNER_SECRET_NAMES, MismatchedCredentials, SignerCredentials, TrustRoots, credential_cache, trust_root_cache
+)
 
 logger = logging.getLogger(__name__)
 
+# "per_signer" gives every signer its own Root/Intermediate CA; "shared" issues
+# every signer cert from one organizational intermediate stored at ORG_CA_PATH
+CA_MODE = os.getenv("CA_MODE", "per_signer")
+ORG_CA_PATH = os.getenv("ORG_CA_PATH", "organization-ca")
+ORG_CA_SECRET_NAMES = ("root_cert", "intermediate_cert", "intermediate_key", "ca_chain")
+# Key rotation writes a signer's secrets one at a time, ca_chain last; a read
+# that straddles a rotation is retried this many times
+ROTATION_READ_ATTEMPTS = int(os.getenv("ROTATION_READ_ATTEMPTS", "3"))
+ROTATION_RETRY_DELAY = float(os.getenv("ROTATION_RETRY_DELAY", "0.2"))
 
-# Vault client factory (use env vars)
-def get_vault_client():
-    vault_addr = os.getenv("VAULT_ADDR", "http://127.0.0.1:8200")
-    vault_token = os.getenv("VAULT_TOKEN")
-    if not vault_token:
-        raise EnvironmentError("VAULT_TOKEN environment variable not set")
-    client = hvac.Client(url=vault_addr, token=vault_token)
-    if not client.is_authenticated():
-        raise EnvironmentError("Vault authentication failed")
-    return client
+_org_ca = {}
+_org_ca_lock = threading.Lock()
 
 
 def checkFileAvailability(path):
@@ -41,26 +47,21 @@ def removeUnWantedFiles(path):
     return False
 
 
-def download_pdf_from_url(url):
-    try:
-        unique_filename = f"temp_{uuid.uuid4().hex}.pdf"
-        response = requests.get(url, timeout=30)
-        response.raise_for_status()
-        os.makedirs("temp_download", exist_ok=True)
-        file_path = os.path.join("temp_download", unique_filename)
-        with open(file_path, 'wb') as f:
-            f.write(response.content)
-        return file_path
-    except Exception as e:
-        logger.exception("Error downloading PDF: %s", e)
-        return None
+PDF_MAX_BYTES = int(os.getenv("PDF_MAX_BYTES", str(50 * 1024 * 1024)))
+PDF_SPOOL_THRESHOLD = int(os.getenv("PDF_SPOOL_THRESHOLD", str(8 * 1024 * 1024)))
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+
+def new_pdf_buffer(spill_dir=None):
+    """In-memory buffer that only spills to an anonymous temp file above PDF_SPOOL_THRESHOLD."""
+    return tempfile.SpooledTemporaryFile(max_size=PDF_SPOOL_THRESHOLD, mode="w+b", dir=spill_dir)
+
 
 # Check certificate availability
 def findCertAvailability(signer_email, vault_base_path="certs"):
     if not signer_email:
         return None, "signer_email required"
 
-    client = get_vault_client()
     signerId = genIdByEmail(signer_email)
 
     cert_files = {
@@ -73,12 +74,15 @@ def findCertAvailability(signer_email, vault_base_path="certs"):
     }
 
     missing = []
+    if shared_ca_enabled():
+        # Only the signer's own key and cert live under its path
+        cert_files = {"privateKey": "private_key", "cert": "cert"}
+        if load_org_ca(vault_base_path) is None:
+            missing.append(ORG_CA_PATH)
+
     for key, value in cert_files.items():
         try:
-            secret = client.secrets.kv.v2.read_secret_version(
-                path=f"{signerId}/{value}",
-                mount_point=vault_base_path
-            )
+            secret = read_secret(f"{signerId}/{value}", vault_base_path)
             pem_val = secret.get("data", {}).get("data", {}).get("value")
             if not pem_val:
                 missing.append(value)
@@ -92,31 +96,185 @@ def findCertAvailability(signer_email, vault_base_path="certs"):
         return False, missing
     return True, []
 
-# Load certificates to temporary files
-def load_certs_from_vault_to_temp(signer_email, vault_base_path="certs"):
-    client = get_vault_client()
+# Load certificates from Vault without touching disk
+def load_certs_from_vault(signer_email, name, vault_base_path="certs"):
     signerId = genIdByEmail(signer_email)
-    keys = ["private_key", "cert", "ca_chain", "root_cert", "root_key"]
+    secret = read_secret(f"{signerId}/{name}", vault_base_path)
+    pem = secret.get("data", {}).get("data", {}).get("value")
+    if not pem:
+        raise FileNotFoundError(f"Missing {name} in Vault at {vault_base_path}/{signerId}/{name}")
+    return list(load_certs_from_pemder_data(pem.encode("utf-8")))
+
+
+def load_cert_from_vault(signer_email, name="root_cert", vault_base_path="certs"):
+    return load_certs_from_vault(signer_email, name, vault_base_path)[0]
+
+
+def shared_ca_enabled():
+    return CA_MODE == "shared"
+
+
+def load_org_ca(vault_base_path="certs"):
+    """
+    PEM material of the shared organizational CA, read from Vault once per
+    process. Returns None until the CA has been bootstrapped.
+    """
+    org_ca = _org_ca.get(vault_base_path)
+    if org_ca is None:
+        with _org_ca_lock:
+            org_ca = _org_ca.get(vault_base_path)
+            if org_ca is None:
+                try:
+                    secret = read_secret(ORG_CA_PATH, vault_base_path)
+                except hvac.exceptions.InvalidPath:
+                    return None
+                data = secret.get("data", {}).get("data", {})
+                if not all(data.get(name) for name in ORG_CA_SECRET_NAMES):
+                    return None
+                org_ca = {name: data[name] for name in ORG_CA_SECRET_NAMES}
+                _org_ca[vault_base_path] = org_ca
+    return org_ca
+
+
+def reset_org_ca():
+    with _org_ca_lock:
+        _org_ca.clear()
+
+
+def secret_version(signerId, name, vault_base_path="certs"):
+    """Current KV version of one of a signer's secrets, or None if it does not exist."""
+    try:
+        metadata = read_secret_metadata(f"{signerId}/{name}", vault_base_path)
+    except hvac.exceptions.InvalidPath:
+        return None
+    return metadata.get("data", {}).get("current_version")
 
-    temp_paths = {}
-    for key in keys:
+
+def _read_signer_trust_roots(signer_email, signerId, vault_base_path):
+    for attempt in range(1, ROTATION_READ_ATTEMPTS + 1):
+        # ca_chain is written last, so its version stamps the whole set
+        secret = read_secret(f"{signerId}/ca_chain", vault_base_path)
+        pem = secret.get("data", {}).get("data", {}).get("value")
+        if not pem:
+            raise FileNotFoundError(f"Missing ca_chain in Vault at {vault_base_path}/{signerId}/ca_chain")
+        ca_chain = list(load_certs_from_pemder_data(pem.encode("utf-8")))
+        root_cert = load_cert_from_vault(signer_email, "root_cert", vault_base_path)
+        if ca_chain and ca_chain[-1].dump() == root_cert.dump():
+            return TrustRoots(signer_id=signerId, root_cert=root_cert, ca_chain=ca_chain,
+                              version=secret.get("data", {}).get("metadata", {}).get("version"))
+        logger.info("Trust roots for %s changed while being read (attempt %s)", signerId, attempt)
+        time.sleep(ROTATION_RETRY_DELAY)
+    raise RuntimeError(f"Root cert and CA chain for {signerId} do not match in Vault")
+
+
+# Load a signer's trust roots through the cache; private keys are never read
+def load_trust_roots(signer_email, vault_base_path="certs"):
+    """
+    Cached trust roots for a signer. A hit is checked against the KV version
+    of the signer's ca_chain, so keys rotated by another process are picked
+    up on the next lookup instead of after the cache TTL.
+    """
+    # With a shared CA every signer has the same trust root, cached once
+    signerId = ORG_CA_PATH if shared_ca_enabled() else genIdByEmail(signer_email)
+    cached = trust_root_cache.get(signerId, vault_base_path)
+    if cached is not None and (cached.version is None
+                               or cached.version == secret_version(signerId, "ca_chain", vault_base_path)):
+        return cached
+
+    if shared_ca_enabled():
+        org_ca = load_org_ca(vault_base_path)
+        if org_ca is None:
+            raise FileNotFoundError(f"Organizational CA not found in Vault at {vault_base_path}/{ORG_CA_PATH}")
+        trust_roots = TrustRoots(
+            signer_id=signerId,
+            root_cert=next(load_certs_from_pemder_data(org_ca["root_cert"].encode("utf-8"))),
+            ca_chain=list(load_certs_from_pemder_data(org_ca["ca_chain"].encode("utf-8")))
+        )
+    else:
+        trust_roots = _read_signer_trust_roots(signer_email, signerId, vault_base_path)
+    trust_root_cache.put(trust_roots, vault_base_path)
+    return trust_roots
+
+
+# Load signer credentials through the process-wide cache
+def load_signer_credentials(signer_email, vault_base_path="certs"):
+    """
+    Return (credentials, missing). On a cache miss every secret is read from
+    Vault once; missing secrets are reported instead of raising so the caller
+    can provision keys. A hit costs one KV metadata read, so keys rotated by
+    another process are never used again. Other Vault errors propagate.
+    """
+    if not signer_email:
+        return None, ["signer_email required"]
+
+    signerId = genIdByEmail(signer_email)
+    # The last secret store_materials writes stamps the whole set
+    stamp = "cert" if shared_ca_enabled() else "ca_chain"
+    cached = credential_cache.get(signerId, vault_base_path)
+    if cached is not None and cached.version == secret_version(signerId, stamp, vault_base_path):
+        return cached, []
+
+    for attempt in range(1, ROTATION_READ_ATTEMPTS + 1):
+        secrets, missing, version = _read_signer_secrets(signerId, stamp, vault_base_path)
+        if missing:
+            return None, missing
         try:
-            secret = client.secrets.kv.v2.read_secret_version(
-                path=f"{signerId}/{key}",
-                mount_point=vault_base_path
-            )
+            # Parsing the private key and chain is the "SimpleSigner.load" cost
+            with stage("signer_load"):
+                credentials = SignerCredentials.from_pem(signerId, secrets, version)
+        except MismatchedCredentials as e:
+            # Read while the keys were being rotated; never cache the mix
+            if attempt == ROTATION_READ_ATTEMPTS:
+                raise
+            logger.info("Credentials for %s changed while being read (attempt %s): %s", signerId, attempt, e)
+            time.sleep(ROTATION_RETRY_DELAY)
+            continue
+        credential_cache.put(credentials, vault_base_path)
+        return credentials, []
+
+
+def _read_signer_secrets(signerId, stamp, vault_base_path):
+    """Return (secrets, missing, KV version of `stamp`) for one pass over the signer's secrets."""
+    secrets = {}
+    missing = []
+    version = None
+    secret_names = SIGNER_SECRET_NAMES
+    if shared_ca_enabled():
+        # Chain and root come from the organizational CA, not the signer's path
+        secret_names = ("private_key", "cert")
+        org_ca = load_org_ca(vault_base_path)
+        if org_ca is None:
+            missing.append(ORG_CA_PATH)
+        else:
+            secrets.update(ca_chain=org_ca["ca_chain"], root_cert=org_ca["root_cert"])
+
+    for key in secret_names:
+        try:
+            secret = read_secret(f"{signerId}/{key}", vault_base_path)
             pem = secret.get("data", {}).get("data", {}).get("value")
-            if not pem:
-                raise FileNotFoundError(f"Missing {key} in Vault at {vault_base_path}/{signerId}/{key}")
+        except hvac.exceptions.InvalidPath:
+            pem = None
+        if pem:
+            secrets[key] = pem
+            if key == stamp:
+                version = secret.get("data", {}).get("metadata", {}).get("version")
+        else:
+            missing.append(key)
+    return secrets, missing, version
 
-            tf = tempfile.NamedTemporaryFile(delete=False, suffix=".pem")
-            tf.write(pem.encode("utf-8"))
-            tf.flush()
-            tf.close()
-            temp_paths[key] = tf.name
 
-        except Exception as e:
-            logger.exception("Failed to load %s for %s: %s", key, signer_email, e)
-            raise
+def credentials_from_pem(signer_email, secrets, vault_base_path="certs"):
+    """
+    Credentials for PEM secrets the caller already loaded, as a pool worker
+    gets them. The worker's cached entry is reused only while it holds the
+    same secrets, so keys rotated since it was cached are never used.
+    """
+    signerId = genIdByEmail(signer_email)
+    cached = credential_cache.get(signerId, vault_base_path)
+    if cached is not None and cached.pem_secrets() == secrets:
+        return cached
 
-    return temp_paths
+    with stage("signer_load"):
+        credentials = SignerCredentials.from_pem(signerId, secrets)
+    credential_cache.put(credentials, vault_base_path)
+    return credentials
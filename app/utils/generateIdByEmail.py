@@ -11,7 +11,3 @@ def genIdByEmail(input_value, length=32):
         id_chars.append(CHAR_SET[byte % len(CHAR_SET)])
 
     return ''.join(id_chars)
-
-
-unique_id = genIdByEmail("kasun@exampleasdasdasd.com")  # Input that never changes
-print("Unique ID:", unique_id)
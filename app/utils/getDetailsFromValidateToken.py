@@ -1,16 +1,26 @@
-from flask import request, jsonify
-from app.utils import jwtTokenValidator
+from flask import request, jsonify, g
+from .jwtTokenHandler import jwtTokenValidator
+
+
+def tokenData(payload):
+    """Caller details from a verified payload, or None if it lacks the claims the API needs."""
+    if not payload.get("userName") or not payload.get("email"):
+        return None
+    return {"userName": payload["userName"], "signer_email": payload["email"], "status": True}
 
 
 def getTokenData():
+    # Authenticated routes were already checked once by the JWT middleware
+    token_data = g.get("token_data")
+    if token_data is not None:
+        return token_data
+
     auth_header = request.headers.get('Authorization')
     validateResponse = jwtTokenValidator(auth_header)
 
     if validateResponse["status"]:
-        userName = validateResponse["payload"]["userName"]
-        signer_email = validateResponse["payload"]["email"]
-
-        return {"userName": userName, "signer_email": signer_email,
-                "status": validateResponse["status"]}
-    else:
-        return jsonify(validateResponse), 404
+        g.token_data = tokenData(validateResponse["payload"])
+        if g.token_data is not None:
+            return g.token_data
+        validateResponse = {"error": "Token is missing userName or email", "status": False}
+    return jsonify(validateResponse), 404
@@ -1,18 +1,118 @@
-import jwt
 import os
+import re
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from .metrics import counter
 
 SECRET_KEY = os.getenv("SECRET_KEY", "a-string-secret-at-least-256-bits-long")
 
+# Verified tokens kept per process; an entry never outlives the token's exp
+JWT_CACHE_SIZE = int(os.getenv("JWT_CACHE_SIZE", "1024"))
+JWT_CACHE_TTL = float(os.getenv("JWT_CACHE_TTL", "300"))
+# Longer bearer values are rejected without being decoded
+JWT_MAX_LENGTH = int(os.getenv("JWT_MAX_LENGTH", "4096"))
+
+TOKEN_CACHE_LOOKUPS = counter("jwt_cache_lookups", "Verified-token cache lookups.", ("result",))
+
+# header.payload.signature, each base64url without padding
+_JWT_SHAPE = re.compile(r"^[A-Za-z0-9_-]+\.[A-Za-z0-9_-]+\.[A-Za-z0-9_-]+$")
+
+
+class VerifiedTokenCache:
+    """
+    Process-wide LRU cache of verified token payloads, keyed by a digest of
+    the token so raw bearer tokens are not kept in memory. Entries expire at
+    the token's `exp` or after `ttl` seconds, whichever comes first.
+    """
+
+    def __init__(self, ttl=300, maxsize=1024):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._entries = OrderedDict()  # digest -> (payload, expires_at)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(token):
+        return hashlib.sha256(token.encode("utf-8")).digest()
+
+    def get(self, token):
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.time() < entry[1]:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                TOKEN_CACHE_LOOKUPS.inc(result="hit")
+                return entry[0]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            TOKEN_CACHE_LOOKUPS.inc(result="miss")
+            return None
+
+    def put(self, token, payload):
+        if self.maxsize <= 0:
+            return
+        expires_at = time.time() + self.ttl
+        if isinstance(payload.get("exp"), (int, float)):
+            expires_at = min(expires_at, payload["exp"])
+        key = self._key(token)
+        with self._lock:
+            self._entries[key] = (payload, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+
+token_cache = VerifiedTokenCache(ttl=JWT_CACHE_TTL, maxsize=JWT_CACHE_SIZE)
+
+
+def bearer_token(auth_header):
+    """Return (token, error) from an Authorization header without decoding the token."""
+    if not auth_header:
+        return None, "Authorization header missing"
+    parts = auth_header.split(" ")
+    if len(parts) != 2 or parts[0].lower() != "bearer" or not parts[1]:
+        return None, "Malformed Authorization header"
+    if len(parts[1]) > JWT_MAX_LENGTH or not _JWT_SHAPE.match(parts[1]):
+        return None, "Malformed bearer token"
+    return parts[1], None
+
 
 def jwtTokenValidator(auth_header):
-    jwtToken = auth_header.split(" ")[1]
-    if not jwtToken:
-        return {"error": "Authorization header missing"}
+    jwtToken, error = bearer_token(auth_header)
+    if error:
+        return {"error": error, "status": False}
+
+    payload = token_cache.get(jwtToken)
+    if payload is not None:
+        return {"message": "Access granted", "status": True, "payload": payload}
 
+    # PyJWT pulls in cryptography, so it is loaded on the first decode rather than by create_app()
+    import jwt
     try:
-        # Decode without verifying to inspect the payload (debug only)
         decoded = jwt.decode(jwtToken, SECRET_KEY, algorithms=["HS256"], options={"verify_signature": True})
-        # Check the payload structure
+        token_cache.put(jwtToken, decoded)
         return {"message": "Access granted", "status": True, "payload": decoded}
     except jwt.ExpiredSignatureError:
         return {"error": "Token expired", "status": False}
@@ -0,0 +1,26 @@
+import sys
+import importlib
+
+
+def lazy_exports(package, exports):
+    """
+    Module-level __getattr__ for `package` that imports a submodule only
+    when one of its names is first used. `exports` maps each submodule to
+    the names the package re-exports from it; the submodules themselves
+    are reachable as attributes too. Any other name raises AttributeError
+    without importing anything.
+    """
+    owners = {name: submodule for submodule, names in exports.items() for name in names}
+
+    def __getattr__(name):
+        if name in exports:
+            return importlib.import_module(f"{package}.{name}")
+        submodule = owners.get(name)
+        if submodule is None:
+            raise AttributeError(f"module {package!r} has no attribute {name!r}")
+        value = getattr(importlib.import_module(f"{package}.{submodule}"), name)
+        # Later lookups find the name on the package without coming back here
+        setattr(sys.modules[package], name, value)
+        return value
+
+    return __getattr__
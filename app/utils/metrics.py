@@ -0,0 +1,416 @@
+import os
+import json
+import uuid
+import bisect
+import atexit
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Include the per-stage breakdown as a Server-Timing header on responses
+SERVER_TIMING_ENABLED = os.getenv("SERVER_TIMING_ENABLED", "1").lower() in ("1", "true", "yes")
+
+logger = logging.getLogger(__name__)
+
+# Directory shared by the worker processes of one server: each writes its
+# metrics there every METRICS_FLUSH_INTERVAL seconds and /metrics merges
+# them. Empty reports only the process that answers the scrape
+METRICS_DIR = os.getenv("METRICS_DIR", "")
+METRICS_FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", "5"))
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+# Stage timings of the request being served in this context
+_request_timings = ContextVar("request_timings", default=None)
+# Set while a pool worker runs a task: recorded metrics are also kept here for the parent to replay
+_captured_events = ContextVar("captured_events", default=None)
+
+
+def _label_key(labelnames, labels):
+    if set(labels) != set(labelnames):
+        raise ValueError(f"Expected labels {labelnames}, got {tuple(labels)}")
+    return tuple(str(labels[name]) for name in labelnames)
+
+
+def _format_labels(labelnames, key, extra=None):
+    pairs = list(zip(labelnames, key)) + list(extra or ())
+    if not pairs:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def _capture(name, labels, value):
+    events = _captured_events.get()
+    if events is not None:
+        events.append((name, labels, value))
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+        _capture(self.name, labels, amount)
+
+    def _replay(self, labels, value):
+        self.inc(value, **labels)
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._values)
+
+    @staticmethod
+    def merge(total, values):
+        for key, value in values.items():
+            total[key] = total.get(key, 0) + value
+
+    def samples(self, values=None, extra=()):
+        values = self.snapshot() if values is None else values
+        for key, value in sorted(values.items()):
+            yield f"{self.name}_total{_format_labels(self.labelnames, key, extra)} {value:g}"
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # label key -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = _label_key(self.labelnames, labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+        _capture(self.name, labels, value)
+
+    def _replay(self, labels, value):
+        self.observe(value, **labels)
+
+    def snapshot(self):
+        with self._lock:
+            return {key: list(values) for key, values in self._series.items()}
+
+    @staticmethod
+    def merge(total, series):
+        for key, values in series.items():
+            current = total.get(key)
+            total[key] = list(values) if current is None else [a + b for a, b in zip(current, values)]
+
+    def samples(self, series=None, extra=()):
+        series = self.snapshot() if series is None else series
+        for key, values in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), values[:-1]):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                yield f"{self.name}_bucket{_format_labels(self.labelnames, key, [*extra, ('le', le)])} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, key, extra)} {values[-1]:.6f}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, key, extra)} {cumulative}"
+
+
+class Gauge:
+    """
+    Read at scrape time from `fn`, which returns a number or {label tuple: number}.
+    Gauges describe one process, so merged across workers each keeps a `pid` label.
+    """
+    kind = "gauge"
+
+    def __init__(self, name, documentation, fn, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.fn = fn
+
+    def snapshot(self):
+        value = self.fn()
+        values = value if isinstance(value, dict) else {(): value}
+        return {tuple(str(v) for v in key): number for key, number in values.items()}
+
+    def samples(self, values=None, extra=()):
+        values = self.snapshot() if values is None else values
+        for key, number in sorted(values.items()):
+            yield f"{self.name}{_format_labels(self.labelnames, key, extra)} {number:g}"
+
+
+def _register(metric):
+    with _registry_lock:
+        existing = _registry.get(metric.name)
+        if existing is not None:
+            return existing
+        _registry[metric.name] = metric
+        return metric
+
+
+def counter(name, documentation, labelnames=()):
+    """Return the counter `name`, creating it on first use. Exposed as `<name>_total`."""
+    return _register(Counter(name, documentation, labelnames))
+
+
+def histogram(name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+    return _register(Histogram(name, documentation, labelnames, buckets))
+
+
+def gauge(name, documentation, fn, labelnames=()):
+    return _register(Gauge(name, documentation, fn, labelnames))
+
+
+def _snapshot_path(pid):
+    return os.path.join(METRICS_DIR, f"{pid}.json")
+
+
+def write_snapshot():
+    """Write this process's metrics to METRICS_DIR for the other workers' scrapes."""
+    with _registry_lock:
+        metrics = list(_registry.values())
+    snapshot = {}
+    for metric in metrics:
+        try:
+            values = metric.snapshot()
+        except Exception:
+            continue  # a gauge that cannot be read right now
+        snapshot[metric.name] = [[list(key), value] for key, value in values.items()]
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    path = _snapshot_path(os.getpid())
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(snapshot, f)
+    os.replace(tmp_path, path)
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass  # exists, owned by someone else
+    return True
+
+
+def _read_snapshots():
+    """{pid: {metric name: {label key: value}}} of every process that wrote to METRICS_DIR."""
+    snapshots = {}
+    try:
+        names = os.listdir(METRICS_DIR)
+    except OSError:
+        return snapshots
+    for name in names:
+        pid, ext = os.path.splitext(name)
+        if ext != ".json" or not pid.isdigit():
+            continue
+        try:
+            with open(os.path.join(METRICS_DIR, name), "r", encoding="utf-8") as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            continue
+        snapshots[int(pid)] = {
+            metric: {tuple(key): value for key, value in values} for metric, values in snapshot.items()
+        }
+    return snapshots
+
+
+def _merged_samples(metric, snapshots):
+    if metric.kind == "gauge":
+        # Only live processes: a gauge of an exited worker no longer describes anything
+        for pid, snapshot in sorted(snapshots.items()):
+            if metric.name in snapshot and _process_alive(pid):
+                yield from metric.samples(snapshot[metric.name], [("pid", str(pid))])
+        return
+    # Counters and histograms of exited workers still count, so the totals never go backwards
+    total = {}
+    for snapshot in snapshots.values():
+        metric.merge(total, snapshot.get(metric.name, {}))
+    yield from metric.samples(total)
+
+
+def render_metrics():
+    """
+    Metrics in the Prometheus text exposition format: this process's, or
+    with METRICS_DIR set, those of every worker sharing the directory.
+    """
+    snapshots = None
+    if METRICS_DIR:
+        try:
+            write_snapshot()
+        except OSError:
+            logger.exception("Could not write metrics to %s", METRICS_DIR)
+        snapshots = _read_snapshots()
+    with _registry_lock:
+        metrics = sorted(_registry.values(), key=lambda metric: metric.name)
+    lines = []
+    for metric in metrics:
+        exposed = metric.name + "_total" if metric.kind == "counter" else metric.name
+        lines.append(f"# HELP {exposed} {metric.documentation}")
+        lines.append(f"# TYPE {exposed} {metric.kind}")
+        try:
+            lines.extend(metric.samples() if snapshots is None else _merged_samples(metric, snapshots))
+        except Exception as e:
+            lines.append(f"# {metric.name} unavailable: {e}")
+    return "\n".join(lines) + "\n"
+
+
+_flusher_pid = None
+
+
+def _flush_metrics(final=False):
+    # Pool workers forked from this process inherit the atexit hook but not the flusher
+    if _flusher_pid != os.getpid():
+        return
+    try:
+        write_snapshot()
+    except OSError:
+        if final:
+            return
+        logger.exception("Could not write metrics to %s", METRICS_DIR)
+
+
+def _flush_loop():
+    while True:
+        time.sleep(METRICS_FLUSH_INTERVAL)
+        _flush_metrics()
+
+
+def start_metrics_flusher():
+    """
+    Write this process's metrics to METRICS_DIR periodically and at exit.
+    Call once per server worker, after any fork; a no-op without METRICS_DIR.
+    """
+    global _flusher_pid
+    if not METRICS_DIR or _flusher_pid == os.getpid():
+        return
+    _flusher_pid = os.getpid()
+    _flush_metrics()
+    atexit.register(_flush_metrics, True)
+    threading.Thread(target=_flush_loop, name="metrics-flush", daemon=True).start()
+
+
+def clear_snapshots():
+    """Remove the snapshots of a previous server run; called by the master before forking."""
+    if not METRICS_DIR or not os.path.isdir(METRICS_DIR):
+        return
+    for name in os.listdir(METRICS_DIR):
+        if name.endswith((".json", ".tmp")):
+            try:
+                os.remove(os.path.join(METRICS_DIR, name))
+            except OSError:
+                pass
+
+
+STAGE_SECONDS = histogram(
+    "pdf_stage_duration_seconds", "Time spent in each stage of signing, validation and key issuance.", ("stage",)
+)
+BYTES_PROCESSED = counter("pdf_bytes", "Bytes of PDF downloaded, signed or validated.", ("kind",))
+
+
+class StageTimings:
+    """Per-request stage durations in milliseconds; repeated stages add up."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self._stages = {}
+        self._lock = threading.Lock()
+
+    def add(self, name, elapsed_ms):
+        with self._lock:
+            self._stages[name] = self._stages.get(name, 0.0) + elapsed_ms
+
+    def items(self):
+        with self._lock:
+            return list(self._stages.items())
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def server_timing(self):
+        total_ms = self.elapsed() * 1000
+        return ", ".join(
+            [f"{name};dur={elapsed_ms:.1f}" for name, elapsed_ms in self.items()] + [f"total;dur={total_ms:.1f}"]
+        )
+
+
+def begin_request_timings():
+    timings = StageTimings()
+    return timings, _request_timings.set(timings)
+
+
+def end_request_timings(token):
+    _request_timings.reset(token)
+
+
+def current_request_timings():
+    return _request_timings.get()
+
+
+def bind_request_timings(fn):
+    """Wrap fn so that pool threads running it add their stages to the calling request."""
+    timings = _request_timings.get()
+
+    def run(*args, **kwargs):
+        token = _request_timings.set(timings)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _request_timings.reset(token)
+    return run
+
+
+def record_stage(name, seconds):
+    """Add a finished stage to the stage histogram and to the current request's timings."""
+    STAGE_SECONDS.observe(seconds, stage=name)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.add(name, seconds * 1000)
+
+
+@contextmanager
+def stage(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - start)
+
+
+def call_capturing_metrics(fn, args, kwargs):
+    """Run fn in a pool worker and return (result, events) so the parent can record them."""
+    events = []
+    token = _captured_events.set(events)
+    try:
+        return fn(*args, **kwargs), events
+    finally:
+        _captured_events.reset(token)
+
+
+def replay_metrics(events):
+    """Record metrics captured in a worker process in this process (and request)."""
+    for name, labels, value in events:
+        if name == STAGE_SECONDS.name:
+            record_stage(labels["stage"], value)
+            continue
+        metric = _registry.get(name)
+        if metric is not None:
+            metric._replay(labels, value)
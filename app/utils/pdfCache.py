@@ -0,0 +1,217 @@
+import os
+import json
+import uuid
+import shutil
+import hashlib
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional
+from .metrics import gauge
+
+logger = logging.getLogger(__name__)
+
+PDF_CACHE_DIR = os.getenv("PDF_CACHE_DIR", os.path.join("cache", "pdf"))
+PDF_CACHE_MAX_BYTES = int(os.getenv("PDF_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+# Seconds between directory rescans; a store that may push the cache past its cap rescans at once
+PDF_CACHE_SCAN_INTERVAL = float(os.getenv("PDF_CACHE_SCAN_INTERVAL", "30"))
+# Bump when the normalization output changes so stale entries are never served
+NORMALIZE_VERSION = "1"
+
+
+@dataclass
+class UrlEntry:
+    etag: Optional[str]
+    last_modified: Optional[str]
+    key: str
+
+
+def sha256_of_file(fileobj, chunk_size=64 * 1024):
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: fileobj.read(chunk_size), b""):
+        digest.update(chunk)
+    fileobj.seek(0)
+    return digest.hexdigest()
+
+
+def variant_key(content_sha256, *variant):
+    """Cache key for one preparation of the content, e.g. per signature field name."""
+    if not content_sha256:
+        return None
+    return hashlib.sha256(":".join((content_sha256, *map(str, variant))).encode("utf-8")).hexdigest()
+
+
+class NormalizedPdfCache:
+    """
+    Normalized PDFs on local disk, keyed by the SHA-256 of the source bytes.
+    A URL index maps a remote URL and variant to its validators and content
+    key, so an unchanged URL costs one conditional GET. PDFs and index files
+    count towards `max_bytes` and are evicted least recently used first.
+
+    Several processes share the directory, so eviction rescans it and goes
+    by file mtime (which hits keep fresh) instead of trusting a per-process
+    index. A store rescans at most every `scan_interval` seconds, or sooner
+    when the bytes stored since the last scan may exceed the cap.
+    """
+
+    def __init__(self, root=PDF_CACHE_DIR, max_bytes=PDF_CACHE_MAX_BYTES, scan_interval=PDF_CACHE_SCAN_INTERVAL):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.scan_interval = scan_interval
+        self._entries = None  # PDF count at the last scan
+        self._size = 0  # bytes at the last scan, plus what this process stored since
+        self._scanned_at = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    def _path(self, key):
+        return os.path.join(self.root, key[:2], f"{key}-v{NORMALIZE_VERSION}.pdf")
+
+    def _url_path(self, url, variant):
+        # The same URL prepared for another signature field is a different entry
+        digest = hashlib.sha256(":".join((url, *map(str, variant))).encode("utf-8")).hexdigest()
+        return os.path.join(self.root, "urls", digest + ".json")
+
+    def _scan(self):
+        """(mtime, path, size) of every cached PDF and URL index file on disk, least recently used first."""
+        found = []
+        suffixes = (f"-v{NORMALIZE_VERSION}.pdf", ".json")
+        if os.path.isdir(self.root):
+            for dirpath, _, filenames in os.walk(self.root):
+                for name in filenames:
+                    if name.endswith(suffixes):
+                        path = os.path.join(dirpath, name)
+                        try:
+                            stat = os.stat(path)
+                        except OSError:
+                            continue  # evicted by another process mid-scan
+                        found.append((stat.st_mtime, path, stat.st_size))
+        found.sort()
+        return found
+
+    def _evict(self, keep):
+        found = self._scan()
+        size = sum(entry_size for _, _, entry_size in found)
+        # Once over the cap, free a tenth more so a full cache is not rescanned on every store
+        target = self.max_bytes if size <= self.max_bytes else self.max_bytes * 0.9
+        removed = set()
+        for _, path, entry_size in found:
+            if size <= target or len(found) - len(removed) <= 1:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+                removed.add(path)
+            except FileNotFoundError:
+                pass  # another process evicted it first
+            except OSError:
+                continue
+            size -= entry_size
+        with self._lock:
+            self._entries = sum(1 for _, path, _ in found if path.endswith(".pdf") and path not in removed)
+            self._size = size
+            self._scanned_at = time.monotonic()
+            self.evictions += sum(1 for path in removed if path.endswith(".pdf"))
+
+    def _stored(self, path, size):
+        """Account for a file this process wrote, and evict if a rescan is due."""
+        with self._lock:
+            self._size += size
+            due = (self._scanned_at is None or self._size > self.max_bytes
+                   or time.monotonic() - self._scanned_at >= self.scan_interval)
+        if due:
+            self._evict(keep=path)
+
+    def lookup_url(self, url, variant=()):
+        if not self.enabled:
+            return None
+        path = self._url_path(url, variant)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = UrlEntry(**json.load(f))
+        except (OSError, ValueError, TypeError):
+            return None
+        try:
+            os.utime(path)  # keeps an index in use from being evicted before its PDF
+        except OSError:
+            pass
+        return entry
+
+    def remember_url(self, url, etag, last_modified, key, variant=()):
+        if not self.enabled or not (etag or last_modified):
+            return
+        path = self._url_path(url, variant)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"etag": etag, "last_modified": last_modified, "key": key}, f)
+            size = f.tell()
+        os.replace(tmp_path, path)
+        self._stored(path, size)
+
+    def open(self, key):
+        """Return an open binary file for a cached normalized PDF, or None."""
+        if not self.enabled or not key:
+            return None
+        path = self._path(key)
+        try:
+            f = open(path, "rb")
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        with self._lock:
+            self.hits += 1
+        return f
+
+    def store(self, key, fileobj):
+        """Copy a normalized PDF into the cache; `fileobj` is rewound afterwards."""
+        if not self.enabled or not key:
+            return
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            fileobj.seek(0)
+            with open(tmp_path, "wb") as f:
+                shutil.copyfileobj(fileobj, f)
+                size = f.tell()
+            fileobj.seek(0)
+            os.replace(tmp_path, path)
+        except OSError:
+            logger.exception("Could not write %s to the PDF cache", key)
+            fileobj.seek(0)
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+        self._stored(path, size)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": self._entries,
+                "bytes": self._size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+pdf_cache = NormalizedPdfCache()
+
+gauge("pdf_cache_bytes", "Bytes of normalized PDFs and URL index files held in the on-disk cache.", lambda: pdf_cache.stats()["bytes"] or 0)
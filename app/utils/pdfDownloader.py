@@ -0,0 +1,228 @@
+import os
+import uuid
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+import requests
+from requests.adapters import HTTPAdapter
+from .fileUtills import PDF_MAX_BYTES, PDF_SPOOL_THRESHOLD, DOWNLOAD_CHUNK_SIZE, new_pdf_buffer
+from .metrics import counter, stage, BYTES_PROCESSED
+
+logger = logging.getLogger(__name__)
+
+DOWNLOADS = counter("pdf_downloads", "Source PDF downloads by result.", ("result",))
+
+DOWNLOAD_POOL_SIZE = int(os.getenv("DOWNLOAD_POOL_SIZE", "10"))
+DOWNLOAD_TIMEOUT = int(os.getenv("DOWNLOAD_TIMEOUT", "30"))
+# Bodies kept in memory for conditional GETs; only PDFs small enough to stay unspooled are kept
+DOWNLOAD_CACHE_BYTES = int(os.getenv("DOWNLOAD_CACHE_BYTES", str(64 * 1024 * 1024)))
+DOWNLOAD_CACHE_ENTRY_MAX = int(os.getenv("DOWNLOAD_CACHE_ENTRY_MAX", str(PDF_SPOOL_THRESHOLD)))
+
+# The PDF header may follow a little leading garbage, which readers tolerate
+PDF_MAGIC = b"%PDF-"
+PDF_MAGIC_WINDOW = 1024
+
+
+@dataclass
+class DownloadedPdf:
+    buffer: object  # spooled buffer positioned at 0
+    size: int
+    sha256: Optional[str]
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    not_modified: bool = False  # served from the conditional-GET cache after a 304
+
+
+@dataclass
+class _CachedBody:
+    etag: Optional[str]
+    last_modified: Optional[str]
+    body: bytes
+    sha256: str
+
+
+class PdfDownloader:
+    """
+    Streams remote PDFs over one pooled session into size-capped spooled
+    buffers. Bodies that carry an ETag or Last-Modified are remembered so a
+    repeat download of the same URL becomes a conditional GET.
+    """
+
+    def __init__(self, pool_size=DOWNLOAD_POOL_SIZE, timeout=DOWNLOAD_TIMEOUT,
+                 cache_bytes=DOWNLOAD_CACHE_BYTES, cache_entry_max=DOWNLOAD_CACHE_ENTRY_MAX):
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.cache_bytes = cache_bytes
+        self.cache_entry_max = cache_entry_max
+        self._session = None
+        self._cache = OrderedDict()
+        self._cached_bytes = 0
+        self._lock = threading.Lock()
+        self.downloads = 0
+        self.not_modified = 0
+        self.bytes_downloaded = 0
+        self.rejected = 0
+
+    @property
+    def session(self):
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size)
+                    session.mount("http://", adapter)
+                    session.mount("https://", adapter)
+                    self._session = session
+        return self._session
+
+    def _cached(self, url):
+        with self._lock:
+            entry = self._cache.get(url)
+            if entry is not None:
+                self._cache.move_to_end(url)
+            return entry
+
+    def _remember(self, url, entry):
+        with self._lock:
+            previous = self._cache.pop(url, None)
+            if previous is not None:
+                self._cached_bytes -= len(previous.body)
+            self._cache[url] = entry
+            self._cached_bytes += len(entry.body)
+            while self._cached_bytes > self.cache_bytes and self._cache:
+                _, evicted = self._cache.popitem(last=False)
+                self._cached_bytes -= len(evicted.body)
+
+    def _forget(self, url):
+        with self._lock:
+            previous = self._cache.pop(url, None)
+            if previous is not None:
+                self._cached_bytes -= len(previous.body)
+
+    def _reject(self, message):
+        with self._lock:
+            self.rejected += 1
+        DOWNLOADS.inc(result="rejected")
+        raise ValueError(message)
+
+    def fetch(self, url, max_bytes=PDF_MAX_BYTES, spill_dir=None, etag=None, last_modified=None):
+        """
+        Download `url` into a new buffer; raises ValueError for oversized or
+        non-PDF bodies. When the caller passes its own validators and the
+        server answers 304, no body is fetched and `buffer` is None.
+        """
+        with stage("download"):
+            return self._fetch(url, max_bytes, spill_dir, etag, last_modified)
+
+    def _fetch(self, url, max_bytes, spill_dir, etag, last_modified):
+        caller_validators = bool(etag or last_modified)
+        cached = None if caller_validators else self._cached(url)
+        if cached is not None:
+            etag, last_modified = cached.etag, cached.last_modified
+        headers = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+
+        buffer = new_pdf_buffer(spill_dir)
+        try:
+            with self.session.get(url, headers=headers, timeout=self.timeout, stream=True) as response:
+                if response.status_code == 304 and caller_validators:
+                    buffer.close()
+                    with self._lock:
+                        self.not_modified += 1
+                    DOWNLOADS.inc(result="not_modified")
+                    return DownloadedPdf(None, 0, None, etag, last_modified, not_modified=True)
+                if response.status_code == 304 and cached is not None:
+                    if len(cached.body) > max_bytes:
+                        self._reject(f"PDF exceeds the {max_bytes} byte limit")
+                    buffer.write(cached.body)
+                    buffer.seek(0)
+                    with self._lock:
+                        self.not_modified += 1
+                    DOWNLOADS.inc(result="not_modified")
+                    return DownloadedPdf(buffer, len(cached.body), cached.sha256, cached.etag,
+                                         cached.last_modified, not_modified=True)
+                response.raise_for_status()
+
+                content_length = response.headers.get("Content-Length")
+                if content_length and content_length.isdigit() and int(content_length) > max_bytes:
+                    self._reject(f"PDF exceeds the {max_bytes} byte limit")
+
+                digest = hashlib.sha256()
+                head = b""
+                received = 0
+                for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                    received += len(chunk)
+                    if received > max_bytes:
+                        self._reject(f"PDF exceeds the {max_bytes} byte limit")
+                    if head is not None:
+                        head += chunk[:PDF_MAGIC_WINDOW]
+                        if len(head) >= PDF_MAGIC_WINDOW:
+                            if PDF_MAGIC not in head[:PDF_MAGIC_WINDOW]:
+                                self._reject("Downloaded file is not a PDF")
+                            head = None
+                    digest.update(chunk)
+                    buffer.write(chunk)
+                if head is not None and PDF_MAGIC not in head:
+                    self._reject("Downloaded file is not a PDF")
+
+                etag = response.headers.get("ETag")
+                last_modified = response.headers.get("Last-Modified")
+
+            buffer.seek(0)
+            result = DownloadedPdf(buffer, received, digest.hexdigest(), etag, last_modified)
+            if (etag or last_modified) and received <= self.cache_entry_max:
+                self._remember(url, _CachedBody(etag, last_modified, buffer.read(), result.sha256))
+                buffer.seek(0)
+            else:
+                self._forget(url)
+            with self._lock:
+                self.downloads += 1
+                self.bytes_downloaded += received
+            DOWNLOADS.inc(result="ok")
+            BYTES_PROCESSED.inc(received, kind="downloaded")
+            return result
+        except Exception:
+            buffer.close()
+            raise
+
+    def stats(self):
+        with self._lock:
+            return {
+                "downloads": self.downloads,
+                "not_modified": self.not_modified,
+                "bytes_downloaded": self.bytes_downloaded,
+                "rejected": self.rejected,
+                "cached_urls": len(self._cache),
+                "cached_bytes": self._cached_bytes,
+            }
+
+
+pdf_downloader = PdfDownloader()
+
+
+def download_pdf_to_buffer(url, max_bytes=PDF_MAX_BYTES, spill_dir=None):
+    """Stream a remote PDF into a size-capped spooled buffer positioned at 0."""
+    return pdf_downloader.fetch(url, max_bytes=max_bytes, spill_dir=spill_dir).buffer
+
+
+def download_pdf_from_url(url):
+    try:
+        unique_filename = f"temp_{uuid.uuid4().hex}.pdf"
+        os.makedirs("temp_download", exist_ok=True)
+        file_path = os.path.join("temp_download", unique_filename)
+        with pdf_downloader.fetch(url).buffer as source, open(file_path, 'wb') as f:
+            while True:
+                chunk = source.read(DOWNLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                f.write(chunk)
+        return file_path
+    except Exception as e:
+        logger.exception("Error downloading PDF: %s", e)
+        return None
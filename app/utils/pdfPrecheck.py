@@ -0,0 +1,84 @@
+import logging
+from pyhanko.pdf_utils.reader import PdfFileReader
+from pyhanko.sign.fields import enumerate_sig_fields
+
+logger = logging.getLogger(__name__)
+
+
+def _field_names(acroform):
+    names = set()
+    for field in (acroform["/Fields"] if "/Fields" in acroform else []):
+        try:
+            name = field.get_object().get("/T")
+        except Exception:
+            continue
+        if name is not None:
+            names.add(str(name))
+    return names
+
+
+def free_signature_field_name(root, requested="Signature"):
+    """
+    `requested`, or the first of `requested`_2, _3, ... not yet used in the
+    catalog's form. An existing field may hold an earlier signature, so it
+    is never reused or rewritten.
+    """
+    names = _field_names(root["/AcroForm"]) if "/AcroForm" in root else set()
+    name, number = requested, 1
+    while name in names:
+        number += 1
+        name = f"{requested}_{number}"
+    return name
+
+
+def has_signatures(stream, chunk_size=1024 * 1024):
+    """
+    Whether `stream` carries a filled signature field. Rewriting such a file
+    would invalidate those signatures. The stream is rewound before returning.
+    """
+    try:
+        stream.seek(0)
+        return any(True for _ in enumerate_sig_fields(PdfFileReader(stream, strict=False), filled_status=True))
+    except Exception:
+        # Not even readable leniently: look for a signature's /ByteRange in the raw bytes
+        stream.seek(0)
+        tail = b""
+        for chunk in iter(lambda: stream.read(chunk_size), b""):
+            if b"/ByteRange" in tail + chunk:
+                return True
+            tail = chunk[-16:]
+        return False
+    finally:
+        stream.seek(0)
+
+
+def precheck_pdf(stream):
+    """
+    Decide whether pyHanko can sign `stream` incrementally as it is.
+    Only the xref sections, trailer and catalog are read, never the pages.
+    Returns (clean, reason); reason names what forced a rewrite. The stream
+    is rewound before returning.
+    """
+    try:
+        stream.seek(0)
+        # Strict mode refuses broken xref tables and dangling references
+        reader = PdfFileReader(stream, strict=True)
+        if reader.encrypted:
+            return False, "encrypted"
+        if "/XRefStm" in reader.trailer:
+            return False, "hybrid-xref"
+
+        root = reader.root
+        if "/Pages" not in root:
+            return False, "no-pages"
+        if "/AcroForm" in root:
+            # Indexing (unlike .get) resolves the indirect reference
+            acroform = root["/AcroForm"]
+            if "/XFA" in acroform:
+                return False, "xfa-form"
+        return True, None
+    except Exception as e:
+        logger.debug("PDF pre-check failed: %s", e)
+        return False, "unreadable"
+    finally:
+        stream.seek(0)
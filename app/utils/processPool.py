@@ -0,0 +1,155 @@
+import os
+import time
+import atexit
+import importlib
+import threading
+import logging
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from .metrics import call_capturing_metrics, replay_metrics, record_stage
+
+logger = logging.getLogger(__name__)
+
+# "spawn" keeps workers from inheriting the parent's Vault/HTTP sockets and locks
+PROCESS_POOL_START_METHOD = os.getenv("PROCESS_POOL_START_METHOD", "spawn")
+# Sign, verify and keygen run on the shared "cpu" pool so one instance can use every core
+CPU_POOL_ENABLED = os.getenv("CPU_POOL_ENABLED", "1").lower() in ("1", "true", "yes")
+CPU_POOL_WORKERS = int(os.getenv("CPU_POOL_WORKERS", str(os.cpu_count() or 1)))
+# Seconds a task may wait for a free worker, and seconds it may take overall
+PROCESS_POOL_QUEUE_TIMEOUT = float(os.getenv("PROCESS_POOL_QUEUE_TIMEOUT", "30"))
+PROCESS_POOL_TASK_TIMEOUT = float(os.getenv("PROCESS_POOL_TASK_TIMEOUT", "120"))
+# Imported by every worker as it starts, so the first task does not pay for them
+WARMUP_MODULES = (
+    "cryptography.hazmat.primitives.asymmetric.rsa",
+    "PyPDF2",
+    "pyhanko.sign.signers",
+    "pyhanko.sign.validation",
+    "pyhanko_certvalidator",
+)
+
+_pools = {}
+_slots = {}  # one semaphore permit per worker, so run_in_process_pool can time out while queued
+_pools_lock = threading.Lock()
+
+
+class PoolQueueTimeout(TimeoutError):
+    """No worker became free within the queue timeout; the task was not started."""
+
+
+def preload_modules(modules=WARMUP_MODULES):
+    """Import the heavy modules now; used by pool workers and the WSGI master before fork."""
+    for module in modules:
+        try:
+            importlib.import_module(module)
+        except ImportError:
+            logger.warning("Warm-up could not import %s", module)
+
+
+def _timed_call(fn, args, kwargs):
+    started = time.time()
+    start = time.perf_counter()
+    result, events = call_capturing_metrics(fn, args, kwargs)
+    return result, events, started, (time.perf_counter() - start) * 1000
+
+
+def get_process_pool(name, max_workers=None):
+    """Return the named process pool, creating it on first use."""
+    pool = _pools.get(name)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(name)
+            if pool is None:
+                workers = max_workers or os.cpu_count() or 1
+                logger.info("Starting process pool %s with %s workers", name, workers)
+                pool = ProcessPoolExecutor(
+                    max_workers=workers,
+                    mp_context=multiprocessing.get_context(PROCESS_POOL_START_METHOD),
+                    initializer=preload_modules,
+                    initargs=(WARMUP_MODULES,)
+                )
+                _pools[name] = pool
+                _slots[name] = threading.BoundedSemaphore(workers)
+    return pool
+
+
+def warm_process_pool(name, max_workers=None):
+    """Start every worker of the named pool now; returns the worker pids."""
+    workers = max_workers or os.cpu_count() or 1
+    pool = get_process_pool(name, workers)
+    return sorted(set(pool.map(_ping_each, range(workers))))
+
+
+def _ping_each(_):
+    # Long enough that one worker cannot answer every ping, so all of them start
+    time.sleep(0.05)
+    return os.getpid()
+
+
+def run_in_process_pool(name, fn, *args, max_workers=None, queue_timeout=PROCESS_POOL_QUEUE_TIMEOUT,
+                        timeout=PROCESS_POOL_TASK_TIMEOUT, **kwargs):
+    """
+    Run fn(*args, **kwargs) on the named pool and wait for it. Returns
+    (result, timings) where timings holds queue_ms, run_ms and total_ms.
+    Metrics and stages the task recorded are replayed into this process.
+    Raises PoolQueueTimeout if no worker became free within queue_timeout.
+    """
+    queued_at = time.time()
+    start = time.perf_counter()
+    pool = get_process_pool(name, max_workers)
+    slots = _slots[name]
+    if not slots.acquire(timeout=queue_timeout):
+        raise PoolQueueTimeout(f"No {name} worker available within {queue_timeout:g}s")
+    try:
+        future = pool.submit(_timed_call, fn, args, kwargs)
+    except Exception:
+        slots.release()
+        raise
+    future.add_done_callback(lambda _: slots.release())
+    try:
+        result, events, started, run_ms = future.result(timeout=timeout)
+    except FutureTimeoutError:
+        # A worker cannot be interrupted; its slot frees up once the task finishes
+        raise TimeoutError(f"{name} task exceeded {timeout:g}s")
+    total_ms = (time.perf_counter() - start) * 1000
+    # Waiting for a slot plus the hand-off to the worker process
+    queue_ms = max(0.0, (started - queued_at) * 1000)
+    record_stage("queue", queue_ms / 1000)
+    replay_metrics(events)
+    return result, {
+        "queue_ms": round(queue_ms, 2),
+        "run_ms": round(run_ms, 2),
+        "total_ms": round(total_ms, 2),
+    }
+
+
+def submit_to_process_pool(name, fn, *args, max_workers=None, **kwargs):
+    """
+    Start fn(*args, **kwargs) on the named pool without waiting for it, for
+    background work such as key generation. Returns a future of its result;
+    metrics the task recorded are replayed into this process as it finishes.
+    """
+    pool = get_process_pool(name, max_workers)
+    future = Future()
+
+    def _done(task):
+        try:
+            result, events = task.result()
+        except BaseException as e:
+            future.set_exception(e)
+            return
+        replay_metrics(events)
+        future.set_result(result)
+
+    pool.submit(call_capturing_metrics, fn, args, kwargs).add_done_callback(_done)
+    return future
+
+
+def shutdown_process_pools(wait=True):
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.shutdown(wait=wait, cancel_futures=True)
+
+
+atexit.register(shutdown_process_pools, False)
@@ -0,0 +1,70 @@
+import os
+import json
+import logging
+import threading
+from dataclasses import dataclass, replace
+from typing import Tuple
+
+logger = logging.getLogger(__name__)
+
+# Optional JSON file: {"default": {...}, "signers": {"<email>": {...}}}
+SIGNER_PROFILES_FILE = os.getenv("SIGNER_PROFILES_FILE", os.path.join("instance", "signer_profiles.json"))
+
+
+@dataclass(frozen=True)
+class SignerProfile:
+    signature_field_name: str = "Signature"
+    signature_box: Tuple[int, int, int, int] = (375, 700, 575, 762)
+    stamp_image_path: str = "static/imgs/stamp.png"
+
+    def updated(self, overrides):
+        overrides = {key: value for key, value in (overrides or {}).items() if key in PROFILE_KEYS}
+        if "signature_box" in overrides:
+            box = tuple(int(v) for v in overrides["signature_box"])
+            if len(box) != 4:
+                raise ValueError(f"signature_box needs 4 coordinates: {box}")
+            overrides["signature_box"] = box
+        return replace(self, **overrides)
+
+
+PROFILE_KEYS = ("signature_field_name", "signature_box", "stamp_image_path")
+
+_profiles = None
+_profiles_mtime = None
+_profiles_lock = threading.Lock()
+
+
+def _load_profiles():
+    """Parse the profiles file, re-reading it only when it changes on disk."""
+    global _profiles, _profiles_mtime
+    try:
+        mtime = os.path.getmtime(SIGNER_PROFILES_FILE)
+    except OSError:
+        mtime = None
+    with _profiles_lock:
+        if _profiles is not None and mtime == _profiles_mtime:
+            return _profiles
+        default, signers = SignerProfile(), {}
+        if mtime is not None:
+            try:
+                with open(SIGNER_PROFILES_FILE, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                default = default.updated(data.get("default"))
+                signers = {
+                    email.lower(): default.updated(overrides)
+                    for email, overrides in data.get("signers", {}).items()
+                }
+            except Exception:
+                logger.exception("Invalid signer profiles in %s; using defaults", SIGNER_PROFILES_FILE)
+        _profiles, _profiles_mtime = (default, signers), mtime
+        return _profiles
+
+
+def get_signer_profile(signer_email):
+    default, signers = _load_profiles()
+    return signers.get((signer_email or "").lower(), default)
+
+
+def profile_stamp_paths():
+    default, signers = _load_profiles()
+    return [default.stamp_image_path] + [profile.stamp_image_path for profile in signers.values()]
@@ -0,0 +1,103 @@
+import uuid
+import logging
+import threading
+from PIL import Image
+from pyhanko.pdf_utils import generic
+from pyhanko.pdf_utils.content import PdfContent, ResourceType
+from pyhanko.pdf_utils.images import pil_image
+from pyhanko.pdf_utils.layout import BoxConstraints
+
+logger = logging.getLogger(__name__)
+
+_stamps = {}
+_stamps_lock = threading.Lock()
+
+
+class _XObjectRecorder:
+    """Stands in for a PDF writer so pyHanko's image encoding runs once, outside any document."""
+
+    def __init__(self):
+        self.objects = []
+
+    def add_object(self, obj):
+        self.objects.append(obj)
+        return len(self.objects) - 1
+
+
+class EncodedStampImage:
+    """
+    A stamp background decoded with Pillow and Flate-compressed once. Each
+    signed document only gets a copy of the already encoded image XObject
+    (plus its soft mask, if the image has alpha).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with Image.open(path) as img:
+            img.load()
+            self.width, self.height = img.width, img.height
+            recorder = _XObjectRecorder()
+            pil_image(img, recorder)
+        # (dictionary entries, encoded bytes) per object; /SMask holds the index of an earlier object
+        self._objects = []
+        for obj in recorder.objects:
+            encoded = obj.encoded_data
+            entries = {key: value for key, value in obj.items() if key != "/Length"}
+            self._objects.append((entries, encoded))
+
+    def embed(self, writer):
+        """Add the image XObject to `writer` and return its reference."""
+        refs = []
+        for entries, encoded in self._objects:
+            dict_data = dict(entries)
+            if "/SMask" in dict_data:
+                dict_data[generic.pdf_name("/SMask")] = refs[dict_data["/SMask"]]
+            refs.append(writer.add_object(generic.StreamObject(dict_data, encoded_data=encoded)))
+        return refs[-1]
+
+
+class StampBackground(PdfContent):
+    """
+    Per-document PdfContent drawing a cached EncodedStampImage; cheap to
+    create, so one is made per signature instead of sharing mutable state.
+    """
+
+    def __init__(self, encoded, box=None):
+        super().__init__(box=box or BoxConstraints(encoded.width, encoded.height))
+        self.encoded = encoded
+        self.name = uuid.uuid4().hex
+        self._image_ref = None
+
+    def render(self):
+        if self._image_ref is None or self._image_ref.get_pdf_handler() is not self.writer:
+            self._image_ref = self.encoded.embed(self.writer)
+        img_ref_name = "/Img" + self.name
+        self.set_resource(
+            category=ResourceType.XOBJECT,
+            name=generic.pdf_name(img_ref_name),
+            value=self._image_ref
+        )
+        return b"q %g 0 0 %g 0 0 cm %s Do Q" % (
+            self.box.width, self.box.height, img_ref_name.encode("ascii")
+        )
+
+
+def get_stamp_image(path):
+    """Encoded stamp image for `path`, decoded on first use and kept for the process lifetime."""
+    stamp = _stamps.get(path)
+    if stamp is None:
+        with _stamps_lock:
+            stamp = _stamps.get(path)
+            if stamp is None:
+                stamp = _stamps[path] = EncodedStampImage(path)
+                logger.debug("Cached stamp image %s (%dx%d)", path, stamp.width, stamp.height)
+    return stamp
+
+
+def preload_stamps(paths):
+    """Decode stamp images up front so the first signature does not pay for it."""
+    for path in dict.fromkeys(paths):
+        try:
+            get_stamp_image(path)
+        except Exception:
+            logger.exception("Could not preload stamp image %s", path)
@@ -0,0 +1,144 @@
+import os
+import time
+import threading
+import logging
+import hvac
+import requests
+from requests.adapters import HTTPAdapter
+from .metrics import counter, record_stage
+
+logger = logging.getLogger(__name__)
+
+VAULT_REQUESTS = counter("vault_requests", "Vault API calls by operation and outcome.", ("operation", "outcome"))
+
+_client = None
+_client_lock = threading.Lock()
+_stats_lock = threading.Lock()
+_stats = {"calls": 0, "errors": 0, "reauths": 0, "total_ms": 0.0, "max_ms": 0.0, "operations": {}}
+
+
+def _build_session():
+    pool_size = int(os.getenv("VAULT_POOL_SIZE", "10"))
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def _create_client():
+    vault_addr = os.getenv("VAULT_ADDR", "http://127.0.0.1:8200")
+    vault_token = os.getenv("VAULT_TOKEN")
+    if not vault_token:
+        raise EnvironmentError("VAULT_TOKEN environment variable not set")
+    logger.debug("Creating shared Vault client for %s", vault_addr)
+    return hvac.Client(
+        url=vault_addr,
+        token=vault_token,
+        timeout=int(os.getenv("VAULT_TIMEOUT", "30")),
+        session=_build_session()
+    )
+
+
+# Shared Vault client; authentication is only re-checked when Vault answers 403
+def get_vault_client():
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = _create_client()
+    return _client
+
+
+def reset_vault_client():
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.adapter.close()
+        _client = None
+
+
+def _reauthenticate(client):
+    # Pick up a rotated token from the environment before giving up
+    with _client_lock:
+        client.token = os.getenv("VAULT_TOKEN", client.token)
+        if not client.is_authenticated():
+            raise EnvironmentError("Vault authentication failed")
+    with _stats_lock:
+        _stats["reauths"] += 1
+
+
+def _record(operation, elapsed_ms, failed):
+    VAULT_REQUESTS.inc(operation=operation, outcome="error" if failed else "ok")
+    record_stage("vault", elapsed_ms / 1000)
+    with _stats_lock:
+        _stats["calls"] += 1
+        _stats["total_ms"] += elapsed_ms
+        _stats["max_ms"] = max(_stats["max_ms"], elapsed_ms)
+        op = _stats["operations"].setdefault(operation, {"calls": 0, "errors": 0, "total_ms": 0.0})
+        op["calls"] += 1
+        op["total_ms"] += elapsed_ms
+        if failed:
+            _stats["errors"] += 1
+            op["errors"] += 1
+
+
+def vault_call(operation, fn):
+    """Run fn(client) against the shared client, renewing auth once on 403."""
+    client = get_vault_client()
+    for attempt in (1, 2):
+        start = time.perf_counter()
+        try:
+            result = fn(client)
+        except hvac.exceptions.Forbidden:
+            _record(operation, (time.perf_counter() - start) * 1000, True)
+            if attempt == 2:
+                raise
+            logger.info("Vault returned 403 for %s, re-authenticating", operation)
+            _reauthenticate(client)
+            continue
+        except hvac.exceptions.InvalidPath:
+            # A missing secret is an answer, not a client error
+            _record(operation, (time.perf_counter() - start) * 1000, False)
+            raise
+        except Exception:
+            _record(operation, (time.perf_counter() - start) * 1000, True)
+            raise
+        _record(operation, (time.perf_counter() - start) * 1000, False)
+        return result
+
+
+def read_secret(path, mount_point):
+    return vault_call("read", lambda client: client.secrets.kv.v2.read_secret_version(
+        path=path,
+        mount_point=mount_point
+    ))
+
+
+def read_secret_metadata(path, mount_point):
+    return vault_call("metadata", lambda client: client.secrets.kv.v2.read_secret_metadata(
+        path=path,
+        mount_point=mount_point
+    ))
+
+
+def write_secret(path, secret, mount_point, cas=None):
+    return vault_call("write", lambda client: client.secrets.kv.v2.create_or_update_secret(
+        path=path,
+        secret=secret,
+        cas=cas,
+        mount_point=mount_point
+    ))
+
+
+def vault_stats():
+    with _stats_lock:
+        calls = _stats["calls"]
+        return {
+            "calls": calls,
+            "errors": _stats["errors"],
+            "reauths": _stats["reauths"],
+            "avg_ms": _stats["total_ms"] / calls if calls else 0.0,
+            "max_ms": _stats["max_ms"],
+            "operations": {name: dict(op) for name, op in _stats["operations"].items()},
+        }
@@ -0,0 +1,51 @@
+import os
+import uuid
+import shutil
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+WORKSPACE_ROOT = os.getenv("WORKSPACE_ROOT", "outputs")
+
+
+class RequestWorkspace:
+    """
+    Scratch directory unique to one request.
+
+    Every file a request needs on disk lives under its own directory, so
+    concurrent requests never share a path, and the whole directory is
+    removed on exit whether the request succeeded or not.
+    """
+
+    def __init__(self, prefix="req", root=None):
+        self.request_id = uuid.uuid4().hex
+        self.path = os.path.join(root or WORKSPACE_ROOT, f"{prefix}_{self.request_id}")
+        self._created = False
+        # Batch sign and pre-sign share one workspace across pool threads
+        self._lock = threading.Lock()
+
+    def open(self):
+        with self._lock:
+            if not self._created:
+                os.makedirs(self.path, exist_ok=False)
+                self._created = True
+        return self
+
+    def file_path(self, name):
+        return os.path.join(self.open().path, os.path.basename(name))
+
+    def cleanup(self):
+        with self._lock:
+            if not self._created:
+                return
+            shutil.rmtree(self.path, ignore_errors=True)
+            self._created = False
+        logger.debug("Removed workspace: %s", self.path)
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.cleanup()
+        return False
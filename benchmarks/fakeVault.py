@@ -0,0 +1,125 @@
+"""
+In-process stand-in for Vault's KV v2 engine, covering the calls the
+service makes through hvac: read_secret_version, read_secret_metadata,
+create_or_update_secret (including check-and-set) and the token lookup
+behind is_authenticated().
+Secrets live in memory and are gone when the process exits.
+"""
+import json
+import threading
+from datetime import datetime, timezone
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit
+
+
+class FakeVault:
+    def __init__(self, token="bench-token", host="127.0.0.1", port=0):
+        self.token = token
+        self._secrets = {}  # (mount, path) -> list of versions, oldest first
+        self._lock = threading.Lock()
+        self.requests = 0
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-vault", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def read(self, mount, path):
+        with self._lock:
+            versions = self._secrets.get((mount, path))
+            return (len(versions), versions[-1]) if versions else (0, None)
+
+    def write(self, mount, path, data, cas=None):
+        """Store a new version; returns it, or None when `cas` does not match."""
+        with self._lock:
+            versions = self._secrets.setdefault((mount, path), [])
+            if cas is not None and cas != len(versions):
+                return None
+            versions.append(data)
+            return len(versions)
+
+    def _handler(self):
+        vault = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, status, body=None):
+                payload = json.dumps(body if body is not None else {}).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _route(self):
+                """(mount, secret path, "data" or "metadata") for a KV v2 URL, None for token lookup."""
+                with vault._lock:
+                    vault.requests += 1
+                if self.headers.get("X-Vault-Token") != vault.token:
+                    self._reply(403, {"errors": ["permission denied"]})
+                    return False, None
+                parts = urlsplit(self.path).path.strip("/").split("/")
+                if parts == ["v1", "auth", "token", "lookup-self"]:
+                    return True, None
+                if len(parts) < 4 or parts[0] != "v1" or parts[2] not in ("data", "metadata"):
+                    self._reply(404, {"errors": []})
+                    return False, None
+                return True, (parts[1], "/".join(parts[3:]), parts[2])
+
+            def do_GET(self):
+                ok, target = self._route()
+                if not ok:
+                    return
+                if target is None:
+                    return self._reply(200, {"data": {"id": "bench", "policies": ["root"]}})
+                mount, path, kind = target
+                version, data = vault.read(mount, path)
+                if data is None:
+                    return self._reply(404, {"errors": []})
+                if kind == "metadata":
+                    return self._reply(200, {"data": {"current_version": version, "oldest_version": 1,
+                                                      "versions": {str(version): _metadata(version)}}})
+                self._reply(200, {"data": {"data": data, "metadata": _metadata(version)}})
+
+            def do_POST(self):
+                ok, target = self._route()
+                if not ok:
+                    return
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length) or b"{}")
+                if target is None or target[2] != "data" or "data" not in body:
+                    return self._reply(400, {"errors": ["no data provided"]})
+                version = vault.write(*target[:2], body["data"], cas=body.get("options", {}).get("cas"))
+                if version is None:
+                    return self._reply(400, {"errors": ["check-and-set parameter did not match the current version"]})
+                self._reply(200, {"data": _metadata(version)})
+
+            do_PUT = do_POST
+
+        return Handler
+
+
+def _metadata(version):
+    return {
+        "version": version,
+        "created_time": datetime.now(timezone.utc).isoformat(),
+        "deletion_time": "",
+        "destroyed": False,
+        "custom_metadata": None,
+    }
@@ -0,0 +1,80 @@
+"""
+Benchmark inputs: byte-for-byte reproducible PDFs of a given page count,
+and a local HTTP server to download them from.
+"""
+import os
+import functools
+import threading
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+
+LINES_PER_PAGE = 40
+
+
+def _page_content(number):
+    lines = [b"BT /F1 10 Tf 14 TL 56 780 Td"]
+    for line in range(1, LINES_PER_PAGE + 1):
+        lines.append(b"(Page %d, line %d: the quick brown fox jumps over the lazy dog.) Tj T*" % (number, line))
+    lines.append(b"ET")
+    return b"\n".join(lines)
+
+
+def build_pdf(pages):
+    """A text-only PDF with `pages` A4 pages; the same page count always gives the same bytes."""
+    page_ids = [4 + 2 * index for index in range(pages)]
+    objects = {
+        1: b"<< /Type /Catalog /Pages 2 0 R >>",
+        2: b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(b"%d 0 R" % i for i in page_ids), pages),
+        3: b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    }
+    for number, page_id in enumerate(page_ids, start=1):
+        content = _page_content(number)
+        objects[page_id] = (
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % (page_id + 1)
+        )
+        objects[page_id + 1] = b"<< /Length %d >>\nstream\n%s\nendstream" % (len(content), content)
+
+    out = bytearray(b"%PDF-1.7\n%\xe2\xe3\xcf\xd3\n")
+    offsets = []
+    for object_id in range(1, len(objects) + 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (object_id, objects[object_id])
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+def write_pdf(directory, pages):
+    """Write the fixture into `directory` and return its file name."""
+    name = f"doc-{pages}p.pdf"
+    with open(os.path.join(directory, name), "wb") as f:
+        f.write(build_pdf(pages))
+    return name
+
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+class FileServer:
+    """Serves `directory` over HTTP on a free local port."""
+
+    def __init__(self, directory, host="127.0.0.1", port=0):
+        self._server = ThreadingHTTPServer((host, port), functools.partial(_QuietHandler, directory=directory))
+        self._server.daemon_threads = True
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, name="fixture-server", daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
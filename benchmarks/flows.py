@@ -0,0 +1,251 @@
+"""
+Sign, validate and key-generation benchmark against an in-process fake
+Vault and a local HTTP server, on generated 1, 50 and 500 page PDFs.
+
+    python benchmarks/flows.py                       # run all, compare with baselines
+    python benchmarks/flows.py --only sign_50p keygen --iterations 20
+    python benchmarks/flows.py --update-baselines    # store this machine's numbers
+
+Each scenario runs in a fresh interpreter, so its peak RSS is its own.
+Reports throughput, p50/p99 latency and peak RSS of the server process
+and of its pool workers. Exits non-zero when a request fails, or when
+p50, throughput or peak RSS is worse than the stored baseline by more
+than --tolerance; baselines recorded on another machine are not compared.
+The PDF caches are off unless set in the environment,
+so every sign downloads, normalizes and signs the document.
+"""
+import os
+import io
+import sys
+import json
+import math
+import time
+import argparse
+import platform
+import resource
+import subprocess
+import threading
+import tempfile
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BASELINES_PATH = os.path.join(BENCH_DIR, "baselines.json")
+
+Scenario = namedtuple("Scenario", "flow pages iterations")
+
+SCENARIOS = {
+    "sign_1p": Scenario("sign", 1, 30),
+    "sign_50p": Scenario("sign", 50, 20),
+    "sign_500p": Scenario("sign", 500, 10),
+    "validate_1p": Scenario("validate", 1, 30),
+    "validate_50p": Scenario("validate", 50, 20),
+    "validate_500p": Scenario("validate", 500, 10),
+    "keygen": Scenario("keygen", 0, 10),
+}
+
+# Gated against the baseline; True when a higher value is worse
+GATED = {"p50_ms": True, "throughput_per_s": False, "peak_rss_mb": True}
+
+SIGNER = "bench.signer@example.com"
+KEYGEN_SIGNER = "bench.keygen@example.com"
+
+
+def _rss_mb(who):
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(who).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _percentile(sorted_values, fraction):
+    return sorted_values[max(0, math.ceil(fraction * len(sorted_values)) - 1)]
+
+
+def run_scenario(name, iterations, concurrency, warmup):
+    """Runs inside the child interpreter and returns the scenario's results."""
+    sys.path.insert(0, ROOT)
+    sys.path.insert(0, BENCH_DIR)
+    from fakeVault import FakeVault
+    from fixtures import FileServer, write_pdf
+
+    scenario = SCENARIOS[name]
+    scratch = tempfile.TemporaryDirectory(prefix="bench-")
+    vault = FakeVault().start()
+    os.environ.update(VAULT_ADDR=vault.url, VAULT_TOKEN=vault.token)
+    os.environ.setdefault("WORKSPACE_ROOT", os.path.join(scratch.name, "outputs"))
+    os.environ.setdefault("PDF_CACHE_DIR", os.path.join(scratch.name, "cache"))
+    os.environ.setdefault("PDF_CACHE_MAX_BYTES", "0")
+    os.environ.setdefault("DOWNLOAD_CACHE_BYTES", "0")
+
+    import jwt
+    from app import create_app
+    from app.utils.jwtTokenHandler import SECRET_KEY
+    from app.utils.processPool import shutdown_process_pools
+
+    app = create_app()
+    local = threading.local()
+
+    def post(path, email, **kwargs):
+        if not hasattr(local, "client"):
+            local.client = app.test_client()
+        token = jwt.encode({"userName": "Bench", "email": email, "exp": int(time.time()) + 3600},
+                           SECRET_KEY, algorithm="HS256")
+        return local.client.post(path, headers={"Authorization": f"Bearer {token}"}, **kwargs)
+
+    def expect(response, *codes):
+        if response.status_code not in codes:
+            raise RuntimeError(f"HTTP {response.status_code}: {response.get_data(as_text=True)[:200]}")
+        return response
+
+    if scenario.flow == "keygen":
+        def request():
+            return expect(post("/api/keys/generateKeys", KEYGEN_SIGNER), 200, 201)
+    else:
+        server = FileServer(scratch.name).start()
+        pdf_url = f"{server.url}/{write_pdf(scratch.name, scenario.pages)}"
+        expect(post("/api/keys/generateKeys", SIGNER), 200, 201)
+
+        def sign():
+            return expect(post("/api/pdf/signPdf", SIGNER, json={"pdf_url": pdf_url}), 200)
+
+        if scenario.flow == "sign":
+            request = sign
+        else:
+            signed = sign().data
+
+            def request():
+                return expect(post("/api/pdf/validatePdf", SIGNER, content_type="multipart/form-data",
+                                   data={"pdfFile": (io.BytesIO(signed), "signed.pdf")}), 200)
+
+    for _ in range(warmup):
+        request()
+
+    def timed(_):
+        start = time.perf_counter()
+        try:
+            request()
+            return (time.perf_counter() - start) * 1000, None
+        except Exception as e:
+            return (time.perf_counter() - start) * 1000, str(e)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        outcomes = list(executor.map(timed, range(iterations)))
+    wall = time.perf_counter() - start
+
+    shutdown_process_pools(wait=True)
+    latencies = sorted(ms for ms, _ in outcomes)
+    errors = [error for _, error in outcomes if error]
+    return {
+        "iterations": iterations,
+        "concurrency": concurrency,
+        "errors": len(errors),
+        "first_error": errors[0] if errors else None,
+        "throughput_per_s": round(iterations / wall, 2),
+        "p50_ms": round(_percentile(latencies, 0.50), 1),
+        "p99_ms": round(_percentile(latencies, 0.99), 1),
+        "peak_rss_mb": _rss_mb(resource.RUSAGE_SELF),
+        "worker_peak_rss_mb": _rss_mb(resource.RUSAGE_CHILDREN),
+        "vault_requests": vault.requests,
+    }
+
+
+def measure(name, iterations, concurrency, warmup):
+    completed = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child", name, "--iterations", str(iterations),
+         "--concurrency", str(concurrency), "--warmup", str(warmup)],
+        cwd=ROOT, capture_output=True, text=True
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f"{name} crashed:\n{completed.stderr[-2000:]}")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def load_baselines():
+    if not os.path.exists(BASELINES_PATH):
+        return {"scenarios": {}}
+    with open(BASELINES_PATH) as f:
+        return json.load(f)
+
+
+def machine_description():
+    return f"{platform.machine()} {os.cpu_count()} cpus, Python {platform.python_version()}"
+
+
+def save_baselines(baselines, results):
+    # Numbers from another machine must not be relabelled as this one's
+    same_machine = baselines.get("machine") == machine_description()
+    scenarios = dict(baselines.get("scenarios", {})) if same_machine else {}
+    scenarios.update({
+        name: {key: result[key] for key in ("iterations", "concurrency", "p50_ms", "p99_ms",
+                                            "throughput_per_s", "peak_rss_mb", "worker_peak_rss_mb")}
+        for name, result in results.items()
+    })
+    with open(BASELINES_PATH, "w") as f:
+        json.dump({
+            "machine": machine_description(),
+            "scenarios": dict(sorted(scenarios.items())),
+        }, f, indent=2)
+        f.write("\n")
+
+
+def regressions(name, result, baseline, tolerance):
+    found = []
+    for key, higher_is_worse in GATED.items():
+        expected, actual = baseline.get(key), result[key]
+        if not expected:
+            continue
+        change = (actual - expected) / expected
+        if (change if higher_is_worse else -change) > tolerance:
+            found.append(f"{name}: {key} {actual} vs baseline {expected} ({change:+.0%})")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--only", nargs="+", choices=sorted(SCENARIOS), help="Scenarios to run (default: all).")
+    parser.add_argument("--iterations", type=int, default=None, help="Timed requests per scenario.")
+    parser.add_argument("--concurrency", type=int, default=1, help="Requests in flight at once.")
+    parser.add_argument("--warmup", type=int, default=2, help="Untimed requests before measuring.")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="Allowed regression, as a fraction.")
+    parser.add_argument("--update-baselines", action="store_true", help="Store these results as the baselines.")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_scenario(args.child, args.iterations, args.concurrency, args.warmup)))
+        return 0
+
+    baselines = load_baselines()
+    results, failures = {}, []
+    compare = not args.update_baselines
+    if compare and baselines.get("scenarios") and baselines.get("machine") != machine_description():
+        print(f"Baselines were recorded on {baselines.get('machine')}, not {machine_description()}; not compared. "
+              f"Run --update-baselines on this host to gate against it.")
+        compare = False
+    print(f"{'scenario':<15}{'req/s':>9}{'p50 ms':>10}{'p99 ms':>10}{'rss MB':>9}{'workers MB':>12}")
+    for name in args.only or SCENARIOS:
+        result = measure(name, args.iterations or SCENARIOS[name].iterations, args.concurrency, args.warmup)
+        results[name] = result
+        print(f"{name:<15}{result['throughput_per_s']:>9}{result['p50_ms']:>10}{result['p99_ms']:>10}"
+              f"{result['peak_rss_mb']:>9}{result['worker_peak_rss_mb']:>12}", flush=True)
+        if result["errors"]:
+            failures.append(f"{name}: {result['errors']} failed requests, e.g. {result['first_error']}")
+        baseline = baselines.get("scenarios", {}).get(name)
+        if baseline and compare:
+            if baseline.get("concurrency") != args.concurrency:
+                print(f"  {name}: baseline was recorded at concurrency {baseline.get('concurrency')}, not compared")
+            else:
+                failures.extend(regressions(name, result, baseline, args.tolerance))
+
+    if args.update_baselines and not failures:
+        save_baselines(baselines, results)
+        print(f"Baselines written to {os.path.relpath(BASELINES_PATH, ROOT)}")
+    for failure in failures:
+        print("FAIL: " + failure, file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,79 @@
+"""
+Cold-start benchmark: time `import app` and `create_app()` in fresh
+interpreters, and list which heavy dependencies they pulled in.
+
+    python benchmarks/startup.py --runs 10 --max-ms 600
+
+Exits non-zero when the median import + create time exceeds --max-ms or
+a heavy module is loaded by create_app() (it should stay lazy).
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Must not be imported by create_app(); routes load them on first use
+HEAVY_MODULES = ("pyhanko", "pyhanko_certvalidator", "PyPDF2", "hvac", "firebase_admin", "cryptography", "PIL")
+
+PROBE = """
+import sys, time, json
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+app.create_app()
+created = time.perf_counter()
+print(json.dumps({
+    "import_ms": (imported - start) * 1000,
+    "create_ms": (created - imported) * 1000,
+    "modules": len(sys.modules),
+    "heavy": [name for name in %r if name in sys.modules],
+}))
+""" % (HEAVY_MODULES,)
+
+
+def measure_once():
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE], cwd=ROOT, check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def run(runs):
+    samples = [measure_once() for _ in range(runs)]
+    totals = [s["import_ms"] + s["create_ms"] for s in samples]
+    return {
+        "runs": runs,
+        "import_ms_p50": round(statistics.median(s["import_ms"] for s in samples), 1),
+        "create_ms_p50": round(statistics.median(s["create_ms"] for s in samples), 1),
+        "total_ms_p50": round(statistics.median(totals), 1),
+        "total_ms_max": round(max(totals), 1),
+        "modules": samples[-1]["modules"],
+        "heavy_modules_loaded": sorted({name for s in samples for name in s["heavy"]}),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-ms", type=float, default=None, help="Fail if the median total exceeds this.")
+    args = parser.parse_args()
+
+    result = run(args.runs)
+    print(json.dumps(result, indent=2))
+
+    failed = False
+    if result["heavy_modules_loaded"]:
+        print("FAIL: create_app() imported " + ", ".join(result["heavy_modules_loaded"]), file=sys.stderr)
+        failed = True
+    if args.max_ms is not None and result["total_ms_p50"] > args.max_ms:
+        print(f"FAIL: median start-up {result['total_ms_p50']}ms > {args.max_ms}ms", file=sys.stderr)
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
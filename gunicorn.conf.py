@@ -0,0 +1,71 @@
+# gunicorn settings for `gunicorn -c gunicorn.conf.py wsgi:app`
+import gc
+import os
+import multiprocessing
+
+bind = os.getenv("BIND", "0.0.0.0:5000")
+
+# Few processes, many threads: requests mostly wait on Vault and downloads,
+# while signing and validation run on each worker's own process pool
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "150"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "0"))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", "0"))
+
+# Import the app and its heavy dependencies once in the master so the
+# workers share those pages copy-on-write
+preload_app = True
+
+# Every worker owns a "cpu", a "keygen" and an "onboarding" pool; split the
+# cores between the workers for each of them unless set explicitly
+cores_per_worker = max(1, multiprocessing.cpu_count() // max(1, workers))
+os.environ.setdefault("CPU_POOL_WORKERS", str(cores_per_worker))
+os.environ.setdefault("KEY_POOL_WORKERS", str(min(2, cores_per_worker)))
+os.environ.setdefault("ONBOARDING_WORKERS", str(cores_per_worker))
+
+# Workers share their metrics through this directory, so any of them answers /metrics for all
+os.environ.setdefault("METRICS_DIR", os.path.join("instance", "metrics"))
+
+# Sign jobs must be visible to every worker, so the in-memory queue only works with one
+os.environ.setdefault("SIGN_JOB_BACKEND", "sqlite")
+if os.environ["SIGN_JOB_BACKEND"] == "memory" and workers > 1:
+    raise RuntimeError("SIGN_JOB_BACKEND=memory needs WEB_CONCURRENCY=1; use sqlite with several workers")
+
+accesslog = os.getenv("GUNICORN_ACCESS_LOG", "-")
+loglevel = os.getenv("GUNICORN_LOG_LEVEL", "info")
+
+PRELOAD_MODULES = ("hvac", "jwt", "firebase_admin.storage")
+
+
+def on_starting(server):
+    # Counters of the previous run's workers would otherwise be added to this run's
+    from app.utils.metrics import clear_snapshots
+    clear_snapshots()
+
+
+def when_ready(server):
+    from app.utils.processPool import WARMUP_MODULES, preload_modules
+    from app.services.warmup_service import APP_MODULES
+    # create_app() itself is light; the controllers and their stack load here
+    preload_modules(APP_MODULES + WARMUP_MODULES + PRELOAD_MODULES)
+
+    from app.utils.signerProfile import profile_stamp_paths
+    from app.utils.stampCache import preload_stamps
+    preload_stamps(profile_stamp_paths())
+    # Keep the preloaded objects out of the collector so it does not touch
+    # (and un-share) their pages in the workers
+    gc.freeze()
+    server.log.info("Preloaded application modules and stamp images")
+
+
+def post_fork(server, worker):
+    # Sockets, threads and process pools do not survive fork, so each
+    # worker warms its own; /ready answers 503 until this finishes
+    from app.services.warmup_service import start_warm_up
+    from app.utils.metrics import start_metrics_flusher
+    start_warm_up()
+    start_metrics_flusher()
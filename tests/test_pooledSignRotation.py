@@ -0,0 +1,147 @@
+"""
+Signing and validating on the "cpu" process pool must use the signer's
+current keys, even when the pool worker cached the previous ones before a
+rotation.
+
+    python -m pytest tests
+"""
+import io
+import os
+import sys
+import time
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_DIR = os.path.join(ROOT, "benchmarks")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, BENCH_DIR)
+
+SIGNER = "rotation.signer@example.com"
+
+
+@pytest.fixture(scope="module")
+def service():
+    from fakeVault import FakeVault
+    from fixtures import FileServer, write_pdf
+
+    scratch = tempfile.TemporaryDirectory(prefix="rotation-")
+    vault = FakeVault().start()
+    server = FileServer(scratch.name).start()
+    # One pool worker, so the second sign lands on the worker that cached the first keys
+    os.environ.update(
+        VAULT_ADDR=vault.url, VAULT_TOKEN=vault.token,
+        CPU_POOL_ENABLED="1", CPU_POOL_WORKERS="1", KEY_POOL_DEPTH="0",
+        WORKSPACE_ROOT=os.path.join(scratch.name, "outputs"),
+        PDF_CACHE_DIR=os.path.join(scratch.name, "cache"),
+    )
+
+    import jwt
+    from app import create_app
+    from app.utils.jwtTokenHandler import SECRET_KEY
+    from app.utils.processPool import shutdown_process_pools
+
+    client = create_app().test_client()
+    token = jwt.encode({"userName": "Rotation", "email": SIGNER, "exp": int(time.time()) + 3600},
+                       SECRET_KEY, algorithm="HS256")
+    yield {
+        "client": client,
+        "headers": {"Authorization": f"Bearer {token}"},
+        "pdf_url": f"{server.url}/{write_pdf(scratch.name, 1)}",
+    }
+
+    shutdown_process_pools(wait=True)
+    server.stop()
+    vault.stop()
+    scratch.cleanup()
+
+
+def _rotate(service):
+    response = service["client"].post("/api/keys/generateKeys", headers=service["headers"])
+    assert response.status_code == 201, response.get_data(as_text=True)
+
+
+def _sign(service):
+    response = service["client"].post("/api/pdf/signPdf", json={"pdf_url": service["pdf_url"]},
+                                      headers=service["headers"])
+    assert response.status_code == 200, response.get_data(as_text=True)
+    return response.data
+
+
+def _signing_cert_serial(service):
+    from pyhanko.pdf_utils.reader import PdfFileReader
+    return PdfFileReader(io.BytesIO(_sign(service))).embedded_signatures[0].signer_cert.serial_number
+
+
+def _validate(service, signed):
+    response = service["client"].post("/api/pdf/validatePdf", content_type="multipart/form-data",
+                                      data={"pdfFile": (io.BytesIO(signed), "signed.pdf")},
+                                      headers=service["headers"])
+    assert response.status_code == 200, response.get_data(as_text=True)
+    return response.get_json()["details"]
+
+
+def _vault_cert_serial():
+    from app.utils.fileUtills import load_signer_credentials
+    credentials, missing = load_signer_credentials(SIGNER)
+    assert not missing
+    return credentials.signing_cert.serial_number
+
+
+def test_pooled_sign_uses_keys_rotated_since_the_worker_cached_them(service):
+    _rotate(service)
+    first = _signing_cert_serial(service)
+    assert first == _vault_cert_serial()
+
+    _rotate(service)
+    second = _signing_cert_serial(service)
+
+    assert second != first
+    assert second == _vault_cert_serial()
+
+
+def test_pooled_validate_trusts_keys_rotated_since_the_worker_cached_the_roots(service):
+    _rotate(service)
+    first = _validate(service, _sign(service))
+    assert first["is_trusted"] and first["is_signature_valid"]
+
+    _rotate(service)
+    second = _validate(service, _sign(service))
+
+    assert second["error"] is None
+    assert second["is_trusted"] and second["is_signature_valid"]
+
+
+def test_keys_rotated_by_another_process_replace_cached_credentials(service):
+    from app.services.genKeyCetificates_service import CA_PROFILE, CertificateAuthorityService
+    from app.utils.fileUtills import load_signer_credentials
+
+    before, _ = load_signer_credentials(SIGNER)
+    ca = CertificateAuthorityService(**CA_PROFILE, signer_cn="Rotation", signer_email=SIGNER)
+    # Written straight to Vault, as another worker would: this process's cache is not invalidated
+    for name, pem in ca.build_signer_materials().items():
+        ca.store_in_vault(name, pem)
+
+    after, _ = load_signer_credentials(SIGNER)
+    assert after.signing_cert.serial_number != before.signing_cert.serial_number
+
+
+def test_credentials_read_mid_rotation_are_rejected(service):
+    from app.utils.credentialCache import MismatchedCredentials, credential_cache
+    from app.utils.fileUtills import load_signer_credentials
+    from app.services.genKeyCetificates_service import CA_PROFILE, CertificateAuthorityService
+
+    old, _ = load_signer_credentials(SIGNER)
+    ca = CertificateAuthorityService(**CA_PROFILE, signer_cn="Rotation", signer_email=SIGNER)
+    # A rotation that stopped after the new key: the stored cert is still the old one
+    ca.store_in_vault("private_key", ca.build_signer_materials()["private_key"])
+    ca.store_in_vault("cert", old.cert_pem.encode("utf-8"))
+
+    credential_cache.clear()
+    with pytest.raises(MismatchedCredentials):
+        load_signer_credentials(SIGNER)
+    assert credential_cache.get(old.signer_id) is None
+
+    _rotate(service)
+    assert load_signer_credentials(SIGNER)[0] is not None
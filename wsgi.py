@@ -0,0 +1,18 @@
+"""
+Production entry point. Run with the bundled gunicorn settings:
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Warm-up (Vault connections, credentials, key pool, process pool) runs in
+each worker after fork; see gunicorn.conf.py. /ready reports when it is done.
+"""
+from app import create_app
+
+app = create_app()
+
+
+if __name__ == "__main__":
+    # Development server only
+    from app.services.warmup_service import start_warm_up
+    start_warm_up()
+    app.run(debug=True)